@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from benchmarks.suite import BENCHMARKS, cleanup_bench_data, run_metadata, compare_results
+import json
+
+
+class Command(BaseCommand):
+    help = "Запуск бенчмарков: python manage.py benchmark detector_data_ranges --rows 10000000"
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help=f"Имена бенчмарков: {', '.join(BENCHMARKS)}")
+        parser.add_argument('--rows', type=int, help="Количество строк показаний")
+        parser.add_argument('--detectors', type=int, help="Количество датчиков")
+        parser.add_argument('--days', type=int, help="Глубина истории в днях")
+        parser.add_argument('--repeat', type=int, help="Количество повторов замера")
+        parser.add_argument('--cleanup', action='store_true', help="Удалить данные бенчмарков после запуска")
+        parser.add_argument('--output', help="Записать результаты и условия запуска в JSON-файл")
+        parser.add_argument('--compare', help="JSON-файл прежнего запуска (--output) для сравнения")
+        parser.add_argument('--threshold', type=float, default=1.2,
+                            help="Отношение времени к прежнему, начиная с которого замер считается регрессией")
+
+    def handle(self, *args, **options):
+        names = options['names'] or list(BENCHMARKS)
+        unknown = set(names) - set(BENCHMARKS)
+        if unknown:
+            raise CommandError(f"Неизвестные бенчмарки: {', '.join(sorted(unknown))}")
+        params = {key: value for key, value in options.items()
+                  if key in ('rows', 'detectors', 'days', 'repeat') and value is not None}
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+        results = {}
+        try:
+            for name in names:
+                self.stdout.write(f"=== {name} ===")
+                results[name] = BENCHMARKS[name](**params)
+        finally:
+            if options['cleanup']:
+                cleanup_bench_data()
+        self.stdout.write(json.dumps(results, indent=2, ensure_ascii=False, default=str))
+
+        if options['output']:
+            document = {'meta': run_metadata(dict(params, names=names)), 'results': results}
+            with open(options['output'], 'w') as f:
+                json.dump(document, f, indent=2, ensure_ascii=False, default=str)
+            self.stdout.write(f"Результаты записаны в {options['output']}")
+
+        if baseline is not None:
+            rows = compare_results(baseline, {'results': results}, options['threshold'])
+            commit = baseline.get('meta', {}).get('commit', '?')
+            self.stdout.write(f"=== Сравнение с {options['compare']} (коммит {commit}) ===")
+            for path, before, after, ratio, regression in rows:
+                mark = "  РЕГРЕССИЯ" if regression else ""
+                self.stdout.write(f"{path}: {before} -> {after} мс (x{ratio}){mark}")
+            regressions = sum(row[4] for row in rows)
+            self.stdout.write(f"Замеров: {len(rows)}, регрессий: {regressions}")
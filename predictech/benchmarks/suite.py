@@ -0,0 +1,996 @@
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from django.core.serializers import serialize
+from datetime import timedelta
+from dashboards.models import *
+from dashboards.utils import RANGE_DAYS, period_bounds, period_start
+from dashboards.tests.legacy import (legacy_training_features, legacy_forecast_features, legacy_prepare_sequences,
+                                     synthetic_house_frame, frames_identical)
+import pandas as pd
+import numpy as np
+import subprocess
+import contextlib
+import tracemalloc
+import io
+import json
+import time
+import sys
+import os
+
+# Реестр бенчмарков: имя -> функция, принимающая параметры командной строки
+BENCHMARKS = {}
+
+BENCH_TYPE_NAME = 'bench'
+BENCH_HOUSE_NAME = 'bench'
+# Префикс синтетических домов (fleet.py) бенчмарка pipeline
+BENCH_FLEET_PREFIX = 'bench'
+
+
+def benchmark(name):
+    """Регистрирует функцию бенчмарка под именем name"""
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def measure(func, repeat=5):
+    """Время выполнения func в миллисекундах: минимум, медиана и среднее по repeat запускам"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        'min_ms': round(min(timings), 3),
+        'median_ms': round(float(np.median(timings)), 3),
+        'mean_ms': round(float(np.mean(timings)), 3),
+    }
+
+
+def run_metadata(params):
+    """Условия запуска для файла результатов: коммит, версии библиотек, БД, параметры"""
+    def git(*args):
+        try:
+            return subprocess.run(['git', *args], capture_output=True, text=True, cwd=settings.BASE_DIR).stdout.strip()
+        except OSError:
+            return ""
+    import django
+    return {
+        'commit': git('rev-parse', '--short', 'HEAD'),
+        'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+        'created': timezone.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'django': django.get_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'database': connection.vendor,
+        'cpu_count': os.cpu_count(),
+        'params': params,
+    }
+
+
+def timings(results, path=()):
+    """Пары (путь, время мс) всех замеров measure во вложенных результатах.
+
+    Берётся минимум по повторам: он меньше медианы зависит от фоновой нагрузки.
+    """
+    if isinstance(results, dict):
+        if 'min_ms' in results or 'median_ms' in results:
+            yield '.'.join(path), results.get('min_ms', results.get('median_ms'))
+            return
+        for key, value in results.items():
+            yield from timings(value, path + (str(key),))
+
+
+def compare_results(baseline, current, threshold=1.2):
+    """Сравнение замеров с прежним запуском: (путь, было, стало, отношение, регрессия)"""
+    before = dict(timings(baseline.get('results', baseline)))
+    rows = []
+    for path, median in timings(current.get('results', current)):
+        if path in before and before[path]:
+            ratio = median / before[path]
+            rows.append((path, before[path], median, round(ratio, 3), ratio > threshold))
+    return rows
+
+
+def bench_detectors(count):
+    """Датчики для бенчмарков; недостающие создаются"""
+    detector_type, _ = DetectorTypes.objects.get_or_create(name=BENCH_TYPE_NAME, defaults={'units': '-'})
+    detectors = list(Detector.objects.filter(type_id=detector_type).order_by('id')[:count])
+    for i in range(len(detectors), count):
+        detectors.append(Detector.objects.create(type_id=detector_type, name=f'bench-{i}'))
+    return detectors
+
+
+def cleanup_bench_data():
+    """Удаляет датчики и дома бенчмарков вместе с их показаниями"""
+    from dashboards.fleet import delete_fleet
+    DetectorTypes.objects.filter(name=BENCH_TYPE_NAME).delete()
+    House.objects.filter(name=BENCH_HOUSE_NAME).delete()
+    delete_fleet(BENCH_FLEET_PREFIX)
+
+
+def bench_house(detectors):
+    """Дом бенчмарков с датчиками flow_xvs, flow_gvs, temp_supply, temp_return"""
+    house, _ = House.objects.get_or_create(name=BENCH_HOUSE_NAME, defaults={'address': '-'})
+    names = ['flow_xvs', 'flow_gvs', 'temp_supply', 'temp_return']
+    for detector, name in zip(detectors, names):
+        DetectorsAtHouse.objects.get_or_create(house_id=house, detector_id=detector, defaults={'name': name})
+    return house, list(DetectorsAtHouse.objects.filter(house_id=house).order_by('id'))
+
+
+def fill_detector_data(detectors, rows, days, batch_size=50000):
+    """Дозаполняет показания датчиков бенчмарка до rows строк, равномерно за последние days дней"""
+    ids = [detector.id for detector in detectors]
+    existing = DetectorData.objects.filter(detector_id__in=ids).count()
+    missing = rows - existing
+    if missing <= 0:
+        return existing
+    per_detector = missing // len(ids) + 1
+    step = days * 86400 / per_detector
+    now = timezone.now()
+    print(f"Генерация {per_detector * len(ids)} показаний...")
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            for detector_id in ids:
+                cursor.execute(
+                    'INSERT INTO dashboards_detectordata (detector_id_id, "timestamp", value) '
+                    'SELECT %s, %s - make_interval(secs => g * %s), random() FROM generate_series(0, %s - 1) g',
+                    [detector_id, now, step, per_detector],
+                )
+    else:
+        rng = np.random.default_rng(0)
+        for detector_id in ids:
+            for start in range(0, per_detector, batch_size):
+                offsets = np.arange(start, min(start + batch_size, per_detector)) * step
+                DetectorData.objects.bulk_create([
+                    DetectorData(detector_id_id=detector_id, timestamp=now - timedelta(seconds=offset), value=value)
+                    for offset, value in zip(offsets.tolist(), rng.random(len(offsets)).tolist())
+                ])
+    return existing + per_detector * len(ids)
+
+
+@benchmark('detector_data_ranges')
+def detector_data_ranges(rows=10_000_000, detectors=10, days=365, repeat=5, **options):
+    """Латентность выборок DetectorDataView по range: прежние фильтры против полуоткрытых границ"""
+    bench = bench_detectors(detectors)
+    total = fill_detector_data(bench, rows, days)
+    now = timezone.now()
+    base = DetectorData.objects.filter(detector_id=bench[0].id).order_by('-timestamp')
+    queries = {
+        'day (timestamp__day)': base.filter(timestamp__day=now.day),
+        'week (timestamp__date__gte)': base.filter(timestamp__date__gte=(now - timedelta(days=7)).date()),
+        'month (timestamp__date__gte)': base.filter(timestamp__date__gte=(now - timedelta(days=30)).date()),
+    }
+    for range_name, days_back in RANGE_DAYS.items():
+        start, end = period_bounds(days_back, now)
+        queries[f'{range_name} (half-open)'] = base.filter(timestamp__gte=start, timestamp__lt=end)
+
+    results = {}
+    for name, qs in queries.items():
+        results[name] = measure(lambda qs=qs: list(qs.values_list('timestamp', 'value')), repeat)
+        results[name]['rows'] = qs.count()
+    start, end = period_bounds(RANGE_DAYS['month'], now)
+    return {
+        'rows_total': total,
+        'rows_per_detector': total // len(bench),
+        'queries': results,
+        'plan_month_half_open': base.filter(timestamp__gte=start, timestamp__lt=end).explain(),
+    }
+
+
+@benchmark('startup')
+def startup(repeat=3, **options):
+    """Холодный запуск manage.py check и латентность первого запроса в новом процессе"""
+    manage = os.path.join(settings.BASE_DIR, 'manage.py')
+    first_request = (
+        "import time; start = time.perf_counter()\n"
+        "import django; django.setup()\n"
+        "from django.core.handlers.wsgi import WSGIHandler; handler = WSGIHandler()\n"
+        "from django.test import Client; response = Client().get('/house/')\n"
+        "print(time.perf_counter() - start, response.status_code)\n"
+    )
+    check_timings, request_timings = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, manage, 'check'], check=True, capture_output=True, cwd=settings.BASE_DIR)
+        check_timings.append((time.perf_counter() - start) * 1000)
+        output = subprocess.run([sys.executable, '-c', first_request], check=True, capture_output=True,
+                                text=True, cwd=settings.BASE_DIR).stdout.split()
+        request_timings.append(float(output[-2]) * 1000)
+    return {
+        'manage_py_check_ms': {'min_ms': round(min(check_timings), 1), 'median_ms': round(float(np.median(check_timings)), 1)},
+        'first_request_ms': {'min_ms': round(min(request_timings), 1), 'median_ms': round(float(np.median(request_timings)), 1)},
+    }
+
+
+@benchmark('features')
+def features(days=(30, 180, 365), repeat=5, **options):
+    """Построение признаков: прежний построчный .apply против векторного features.py"""
+    from dashboards.features import training_features, forecast_features
+    day_list = [days] if isinstance(days, int) else days
+    results = {}
+    for day_count in day_list:
+        frame = synthetic_house_frame(day_count * 24)
+        continuous = synthetic_house_frame(day_count * 24, quantized=False)
+        legacy, current = legacy_training_features(frame), training_features(frame)
+        results[f'{day_count}d'] = {
+            'rows': len(frame),
+            'identical_forecast': frames_identical(legacy_forecast_features(frame), forecast_features(frame)),
+            'identical_training': frames_identical(legacy, current),
+            'identical_training_continuous': frames_identical(legacy_training_features(continuous),
+                                                              training_features(continuous)),
+            'training_legacy': measure(lambda: legacy_training_features(frame), repeat),
+            'training_vectorized': measure(lambda: training_features(frame), repeat),
+            'forecast_legacy': measure(lambda: legacy_forecast_features(frame), repeat),
+            'forecast_vectorized': measure(lambda: forecast_features(frame), repeat),
+        }
+    return results
+
+
+def measure_memory(func):
+    """Пиковый объём памяти Python-аллокаций при выполнении func, МБ"""
+    tracemalloc.start()
+    try:
+        func()
+        return round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 2)
+    finally:
+        tracemalloc.stop()
+
+
+@benchmark('prediction_data')
+def prediction_data(days=30, rows=None, repeat=5, **options):
+    """Данные для predict: полная история за 30 дней против хвоста последних строк.
+
+    По умолчанию показания почасовые (rows = 4 датчика * days * 24).
+    """
+    from dashboards.loaders import load_house_frame
+    from dashboards.ml import RealDataRetrainer, prediction_data as tail_data, prediction_window
+    house, detectors_list = bench_house(bench_detectors(4))
+    total = fill_detector_data([d.detector_id for d in detectors_list], rows or len(detectors_list) * days * 24, days)
+    if not StateLabel.objects.filter(house_id=house).exists():
+        # Метки на каждое показание и прогноз на следующий час, как после predict
+        timestamps = list(DetectorData.objects.filter(detector_id=detectors_list[0].detector_id)
+                          .values_list('timestamp', flat=True))
+        StateLabel.objects.bulk_create(
+            [StateLabel(house_id=house, timestamp=timestamp, state='normal') for timestamp in timestamps]
+            + [StateLabel(house_id=house, timestamp=max(timestamps) + timedelta(hours=1), state='normal')],
+            batch_size=5000,
+        )
+    predictor = RealDataRetrainer(sequence_length=12)
+
+    def full():
+        data = load_house_frame(house.id, detectors_list)
+        return data, predictor.create_features(data)
+
+    def tail():
+        return tail_data(predictor, house.id, detectors_list)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        (full_data, full_features), (tail_rows, tail_features) = full(), tail()
+        predictor.feature_columns = [col for col in full_features.columns if col not in ('timestamp', 'label')]
+        results = {
+            'rows_total': total,
+            'rows_full': len(full_data),
+            'rows_tail': len(tail_rows),
+            'identical_window': bool(np.array_equal(prediction_window(predictor, full_features), prediction_window(predictor, tail_features)))
+            and full_data['timestamp'].max() == tail_rows['timestamp'].max(),
+            'full': measure(full, repeat),
+            'tail': measure(tail, repeat),
+        }
+        results['full']['peak_mb'] = measure_memory(full)
+        results['tail']['peak_mb'] = measure_memory(tail)
+    return results
+
+
+@benchmark('list_endpoints')
+def list_endpoints(rows=200_000, detectors=4, days=30, repeat=3, **options):
+    """Выдача /detector_data_log/ без фильтра: serialize всей таблицы против потока и страниц"""
+    from django.test import Client
+    from dashboards.pagination import stream_serialized, keyset_page, MAX_PAGE_SIZE
+    total = fill_detector_data(bench_detectors(detectors), rows, days)
+    qs = DetectorData.objects.all()
+
+    def serialized():
+        return len(serialize("json", qs))
+
+    def streamed():
+        return sum(len(part) for part in stream_serialized(qs))
+
+    def paged():
+        size, after = 0, None
+        while True:
+            page, after = keyset_page(qs, MAX_PAGE_SIZE, after)
+            size += len(serialize("json", page))
+            if after is None:
+                return size
+
+    response = Client().get('/detector_data_log/')
+    results = {
+        'rows_total': total,
+        'identical_stream': b"".join(response.streaming_content).decode() == serialize("json", qs),
+    }
+    for name, func in [('serialize', serialized), ('stream', streamed), ('keyset_pages', paged)]:
+        results[name] = measure(func, repeat)
+        results[name]['peak_mb'] = measure_memory(func)
+    return results
+
+
+@benchmark('forecast')
+def forecast(days=30, repeat=5, **options):
+    """Прогноз параметров дома: загрузка модели, прогноз последней строки против всех строк"""
+    from dashboards.forecasting import forecast_service
+    from dashboards.loaders import load_house_frame
+    house, detectors_list = bench_house(bench_detectors(4))
+    fill_detector_data([d.detector_id for d in detectors_list], len(detectors_list) * days * 24, days)
+    data = load_house_frame(house.id, detectors_list)
+
+    def cold_load():
+        forecast_service.clear()
+        forecast_service.load()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = {'rows': len(data), 'model_load': measure(cold_load, repeat)}
+        model, _ = forecast_service.load()
+        features = forecast_service.features_for(data)
+        results['forecast_house'] = measure(lambda: forecast_service.forecast_house(house.id, data), repeat)
+        results['predict_one_row'] = measure(lambda: model.predict(features.iloc[-1:]), repeat)
+        results['predict_all_rows'] = measure(lambda: model.predict(features), repeat)
+    return results
+
+
+@benchmark('events')
+def events(subscribers=(1, 100, 1000), repeat=5, **options):
+    """Раздача события подписчикам дома: стоимость publish и число запросов к БД на событие"""
+    from django.test.utils import CaptureQueriesContext
+    from dashboards.events import EventHub
+    results = {}
+    for count in subscribers:
+        hub = EventHub(queue_size=repeat + 1)
+        subscriptions = [hub.subscribe(1) for _ in range(count)]
+        event = {'house_id': 1, 'type': 'house_alert', 'data': {'name': 'bench'}}
+        with CaptureQueriesContext(connection) as queries:
+            timing = measure(lambda: hub.publish(event), repeat)
+        results[f'subscribers_{count}'] = dict(timing, queries=len(queries),
+                                               delivered=all(s.queue.qsize() == repeat for s in subscriptions))
+    return results
+
+
+@benchmark('conditional_get')
+def conditional_get(rows=40_000, days=30, repeat=5, **options):
+    """Опрос JSON-эндпоинтов без изменений данных: полный ответ против проверки ETag (304)"""
+    from django.test import Client
+    house, detectors_list = bench_house(bench_detectors(4))
+    fill_detector_data([d.detector_id for d in detectors_list], rows, days)
+    detector_id = detectors_list[0].detector_id_id
+    client = Client()
+    urls = [
+        ('dahdl', '/dahdl/', {'house_id': house.id}),
+        ('dahdl_week', '/dahdl/', {'house_id': house.id, 'range': 'week'}),
+        ('detector_data_log_week', '/detector_data_log/', {'detector_id': detector_id, 'range': 'week'}),
+        ('detector_data_log_all', '/detector_data_log/', {'detector_id': detector_id}),
+        ('detectors_at_house', '/detectors_at_house/', {'house_id': house.id}),
+        ('house', '/house/', {}),
+    ]
+
+    def body(response):
+        return b"".join(response.streaming_content) if response.streaming else response.content
+
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name, url, params in urls:
+            response = client.get(url, params)
+            etag = response['ETag']
+            full = measure(lambda: body(client.get(url, params)), repeat)
+            cpu_start = time.process_time()
+            for _ in range(repeat):
+                body(client.get(url, params))
+            full['cpu_ms'] = round((time.process_time() - cpu_start) * 1000 / repeat, 3)
+            revalidated = client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+            cached = measure(lambda: client.get(url, params, HTTP_IF_NONE_MATCH=etag), repeat)
+            cpu_start = time.process_time()
+            for _ in range(repeat):
+                client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+            cached['cpu_ms'] = round((time.process_time() - cpu_start) * 1000 / repeat, 3)
+            results[name] = {
+                'status_revalidated': revalidated.status_code,
+                'bytes_full': len(body(response)),
+                'bytes_revalidated': len(revalidated.content),
+                'full': full,
+                'revalidated': cached,
+            }
+    return results
+
+
+@benchmark('response_cache')
+def response_cache_bench(rows=40_000, days=30, repeat=5, **options):
+    """dahdl/ и detector_data_log/ при промахе и попадании в кэш ответов (бэкенд из настроек)"""
+    from django.test import Client
+    from dashboards.response_cache import response_cache
+    house, detectors_list = bench_house(bench_detectors(4))
+    fill_detector_data([d.detector_id for d in detectors_list], rows, days)
+    detector_id = detectors_list[0].detector_id_id
+    client = Client()
+    urls = [
+        ('dahdl', '/dahdl/', {'house_id': house.id}, f'house:{house.id}'),
+        ('dahdl_week', '/dahdl/', {'house_id': house.id, 'range': 'week'}, f'house:{house.id}'),
+        ('detector_data_log', '/detector_data_log/', {'detector_id': detector_id}, f'detector:{detector_id}'),
+    ]
+
+    def miss(url, params, scope):
+        response_cache.invalidate(scope)
+        return client.get(url, params).content
+
+    results = {'backend': response_cache.stats()['backend']}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name, url, params, scope in urls:
+            fresh = miss(url, params, scope)
+            results[name] = {
+                'identical': client.get(url, params).content == fresh,
+                'miss': measure(lambda: miss(url, params, scope), repeat),
+                'hit': measure(lambda: client.get(url, params).content, repeat),
+            }
+    results['stats'] = response_cache.stats()
+    return results
+
+
+@benchmark('pipeline')
+def pipeline(days=(7, 30, 90), batches=(1_000, 10_000, 50_000), repeat=3, **options):
+    """Этапы прогноза на синтетическом доме: prepare_data, create_features, prepare_sequences,
+    predict (окно и пакет всех окон), forecast и пакетная запись показаний"""
+    from dashboards.fleet import synthetic_readings, create_house, delete_fleet
+    from dashboards.forecasting import forecast_service
+    from dashboards.ingest import ingest_batch
+    from dashboards.ml import RealDataRetrainer, prediction_window
+    from dashboards.views import prepare_data
+    day_list = [days] if isinstance(days, int) else days
+    delete_fleet(BENCH_FLEET_PREFIX)
+    house = create_house(f'{BENCH_FLEET_PREFIX}-0', synthetic_readings(max(day_list) * 24, rng=np.random.default_rng(0)))
+    detectors_list = list(DetectorsAtHouse.objects.filter(house_id=house).order_by('id'))
+
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        forecast_service.load()
+        for day_count in day_list:
+            data = prepare_data(house.id, detectors_list, days_back=day_count)
+            retrainer = RealDataRetrainer(sequence_length=12)
+            features = retrainer.create_features(data)
+            X, y = retrainer.prepare_sequences(features)
+            # Для замера predict веса модели не важны: обучение не выполняется
+            retrainer.label_encoder.fit(y)
+            retrainer.model = retrainer.build_model(X.shape[2], len(retrainer.label_encoder.classes_))
+            window = prediction_window(retrainer, features).reshape(1, retrainer.sequence_length, -1)
+            retrainer.model.predict(window, verbose=0)
+            results[f'{day_count}d'] = {
+                'rows': len(data),
+                'sequences': len(X),
+                'prepare_data': measure(lambda: prepare_data(house.id, detectors_list, days_back=day_count), repeat),
+                'create_features': measure(lambda: retrainer.create_features(data), repeat),
+                'prepare_sequences': measure(lambda: retrainer.prepare_sequences(features), repeat),
+                'predict_window': measure(lambda: retrainer.model.predict(window, verbose=0), repeat),
+                'predict_all_windows': measure(lambda: retrainer.model.predict(X, batch_size=1024, verbose=0), repeat),
+                'forecast': measure(lambda: forecast_service.forecast_house(house.id, data), repeat),
+            }
+
+        # Пакеты пишутся в будущее время и удаляются, чтобы не менять историю дома
+        detector_ids = [detector.detector_id_id for detector in detectors_list]
+        future = timezone.now().replace(microsecond=0) + timedelta(days=365)
+        for size in batches:
+            payload = {
+                'detector_ids': [detector_ids[i % len(detector_ids)] for i in range(size)],
+                'timestamps': [str(future + timedelta(minutes=i // len(detector_ids))) for i in range(size)],
+                'values': np.random.default_rng(size).random(size).round(3).tolist(),
+            }
+
+            def ingest():
+                ingest_batch(payload)
+                DetectorData.objects.filter(detector_id__in=detector_ids, timestamp__gte=future).delete()
+                DetectorDataHourly.objects.filter(detector_id__in=detector_ids, hour__gte=future).delete()
+
+            results[f'ingest_{size}'] = measure(ingest, repeat)
+    return results
+
+
+def _free_port():
+    import socket
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def _server(command, port, timeout=120):
+    """Запускает сервер command и ждёт, пока он начнёт отвечать на порту port; даёт (адрес, процесс)"""
+    import urllib.request
+    process = subprocess.Popen(command, cwd=settings.BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                urllib.request.urlopen(f'http://127.0.0.1:{port}/house/', timeout=5).read()
+                break
+            except OSError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError(f"Сервер не запустился: {' '.join(command)}")
+                time.sleep(0.5)
+        yield f'http://127.0.0.1:{port}', process
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def _load(base_url, groups, duration):
+    """Клиенты groups = {вид: (число клиентов, [url])} шлют запросы подряд duration секунд.
+
+    Возвращает по видам медиану и 95-й перцентиль задержки, число запросов в секунду и ошибки.
+    """
+    import threading
+    import urllib.request
+    latencies = {kind: [] for kind in groups}
+    errors = {kind: 0 for kind in groups}
+    deadline = time.monotonic() + duration
+
+    def client(kind, urls, offset):
+        position = offset
+        while time.monotonic() < deadline:
+            url = base_url + urls[position % len(urls)]
+            position += 1
+            start = time.perf_counter()
+            try:
+                urllib.request.urlopen(url, timeout=120).read()
+            except OSError:
+                errors[kind] += 1
+                continue
+            latencies[kind].append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=client, args=(kind, urls, i))
+               for kind, (count, urls) in groups.items() for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results = {}
+    for kind, values in latencies.items():
+        results[kind] = {
+            'requests': len(values),
+            'errors': errors[kind],
+            'rps': round(len(values) / duration, 1),
+            'median_ms': round(float(np.median(values)), 1) if values else None,
+            'p95_ms': round(float(np.percentile(values, 95)), 1) if values else None,
+        }
+    return results
+
+
+@benchmark('server_load')
+def server_load(rows=40_000, days=30, repeat=1, duration=15, light_clients=8, heavy_clients=2, **options):
+    """Нагрузка на WSGI (manage.py runserver) и ASGI (uvicorn) серверы: лёгкие чтения
+    (house/, detectors_at_house/, detector/) отдельно и вместе с тяжёлыми запросами forecast/"""
+    house, detectors_list = bench_house(bench_detectors(4))
+    fill_detector_data([d.detector_id for d in detectors_list], rows, days)
+    light = [f'/house/?house_id={house.id}', f'/detectors_at_house/?house_id={house.id}',
+             f'/detector/?detector_id={detectors_list[0].detector_id_id}']
+    # forecast/ не кэшируется: каждый запрос - загрузка истории, признаки и predict
+    heavy = [f'/forecast/?house_id={house.id}']
+    servers = {
+        'wsgi': lambda port: [sys.executable, 'manage.py', 'runserver', '--noreload', f'127.0.0.1:{port}'],
+        'asgi': lambda port: [sys.executable, '-m', 'uvicorn', 'main.asgi:application',
+                              '--port', str(port), '--log-level', 'warning'],
+    }
+    results = {}
+    for name, command in servers.items():
+        port = _free_port()
+        with _server(command(port), port) as (base_url, _):
+            # Прогрев: загрузка модели прогноза и первые запросы
+            _load(base_url, {'heavy': (1, heavy), 'light': (1, light)}, 3)
+            results[name] = {}
+            for run in range(repeat):
+                suffix = f'_{run}' if repeat > 1 else ''
+                results[name]['light_only' + suffix] = _load(base_url, {'light': (light_clients, light)}, duration)
+                results[name]['mixed' + suffix] = _load(
+                    base_url, {'light': (light_clients, light), 'heavy': (heavy_clients, heavy)}, duration)
+    return results
+
+
+def _process_tree_memory(pid):
+    """Rss и Pss (МБ) процесса pid и его потомков по /proc; Pss делит общие страницы между процессами"""
+    parents = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    parents[int(entry)] = int(f.read().rsplit(')', 1)[1].split()[1])
+            except OSError:
+                continue
+    tree, frontier = [pid], [pid]
+    while frontier:
+        frontier = [child for child, parent in parents.items() if parent in frontier]
+        tree += frontier
+    totals = {'processes': len(tree), 'rss_mb': 0.0, 'pss_mb': 0.0}
+    for process in tree:
+        try:
+            with open(f'/proc/{process}/smaps_rollup') as f:
+                for line in f:
+                    name, value = line.split()[:2] if ':' in line else ('', 0)
+                    if name in ('Rss:', 'Pss:'):
+                        totals[name[:-1].lower() + '_mb'] += int(value) / 1024
+        except OSError:
+            continue
+    return {key: round(value, 1) for key, value in totals.items()}
+
+
+@benchmark('serving')
+def serving(days=20, repeat=5, workers=2, **options):
+    """Запуск серверов и первый запрос predict/: manage.py runserver против gunicorn.conf.py
+    (предзагрузка в мастере, прогрев моделей в воркерах) и память дерева процессов"""
+    import urllib.request
+    from dashboards.fleet import synthetic_readings, create_house, delete_fleet
+    from dashboards.ml import retrain_model
+    from dashboards.views import prepare_data
+    assignment = ModelForHouse.objects.order_by('-id').first()
+    trained = None
+    if assignment is None:
+        # Модель для замера обучается одну эпоху на синтетическом доме и удаляется в конце
+        delete_fleet(BENCH_FLEET_PREFIX)
+        house = create_house(f'{BENCH_FLEET_PREFIX}-0', synthetic_readings(days * 24, rng=np.random.default_rng(0)))
+        with contextlib.redirect_stdout(io.StringIO()):
+            retrain_model(prepare_data(house.id, DetectorsAtHouse.objects.filter(house_id=house), days_back=days),
+                          epochs=1, house_id=house.id)
+        assignment = ModelForHouse.objects.get(house_id=house)
+        trained = assignment.model_id
+    url = f'/predict/?house_id={assignment.house_id_id}'
+    servers = {
+        'runserver': lambda port: [sys.executable, 'manage.py', 'runserver', '--noreload', f'127.0.0.1:{port}'],
+        'gunicorn': lambda port: [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--workers', str(workers),
+                                  '--bind', f'127.0.0.1:{port}', 'main.wsgi:application'],
+    }
+
+    def request(base_url):
+        start = time.perf_counter()
+        urllib.request.urlopen(base_url + url, timeout=120).read()
+        return (time.perf_counter() - start) * 1000
+
+    results = {}
+    try:
+        for name, command in servers.items():
+            port = _free_port()
+            started = time.perf_counter()
+            with _server(command(port), port) as (base_url, process):
+                ready = (time.perf_counter() - started) * 1000
+                # Первые запросы - по одному на воркер: каждый воркер может оказаться холодным
+                first = [request(base_url) for _ in range(workers if name == 'gunicorn' else 1)]
+                steady = measure(lambda: request(base_url), repeat)
+                results[name] = {
+                    'ready_ms': round(ready, 1),
+                    'first_predict_ms': round(max(first), 1),
+                    'predict': steady,
+                    'memory': _process_tree_memory(process.pid),
+                }
+    finally:
+        if trained is not None:
+            for path in (trained.model_file.path, trained.metadata_file.path):
+                if os.path.exists(path):
+                    os.remove(path)
+            trained.delete()
+            delete_fleet(BENCH_FLEET_PREFIX)
+    return results
+
+
+@benchmark('incremental_training')
+def incremental_training(days=30, new_days=3, epochs=8, **options):
+    """Задача обучения дома с нуля за days дней против дообучения его модели на последних
+    new_days днях (модель считается обученной new_days дней назад). Каждый вариант - один запуск"""
+    from dashboards.fleet import synthetic_readings, create_house, delete_fleet
+    from dashboards.jobs import submit_job, run_queued_job
+    delete_fleet(BENCH_FLEET_PREFIX)
+    house = create_house(f'{BENCH_FLEET_PREFIX}-0', synthetic_readings(days * 24, rng=np.random.default_rng(0)))
+    last_model = SavedModel.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+    def train(incremental):
+        job = submit_job(house.id, epochs=epochs, days_back=days, incremental=incremental)
+        with contextlib.redirect_stdout(io.StringIO()):
+            timing = measure(lambda: run_queued_job(job.id), 1)
+        job.refresh_from_db()
+        result = json.loads(job.result)
+        return dict(timing, status=job.status, mode=result.get('mode'), fallback=result.get('fallback'),
+                    test_accuracy=result.get('test_accuracy'), message=result.get('message'))
+
+    results = {}
+    try:
+        results['full'] = train(False)
+        # Новыми для дообучения считаются метки за последние new_days дней
+        SavedModel.objects.filter(modelforhouse__house_id=house).update(timestamp=timezone.now() - timedelta(days=new_days))
+        results['incremental'] = train(True)
+        results['ratio'] = round(results['incremental']['min_ms'] / results['full']['min_ms'], 3)
+    finally:
+        for saved_model in SavedModel.objects.filter(id__gt=last_model):
+            for path in (saved_model.model_file.path, saved_model.metadata_file.path):
+                if os.path.exists(path):
+                    os.remove(path)
+            saved_model.delete()
+        delete_fleet(BENCH_FLEET_PREFIX)
+    return results
+
+
+@benchmark('inference_engine')
+def inference_engine(batches=(1, 10, 100, 1000, 10_000), repeat=5, **options):
+    """Предсказание модели дома: model.predict TensorFlow против NumPy (inference.NumpySequential) -
+    совпадение вероятностей, загрузка модели и время по размерам пакета окон"""
+    import tempfile
+    import tensorflow as tf
+    from dashboards.inference import NumpySequential
+    from dashboards.ml import RealDataRetrainer
+    saved_model = SavedModel.objects.order_by('-id').first()
+    with tempfile.TemporaryDirectory() as directory:
+        if saved_model is not None and os.path.exists(saved_model.model_file.path):
+            path = saved_model.model_file.path
+        else:
+            # Без обученных моделей - модель build_model со случайными весами
+            path = os.path.join(directory, 'model.keras')
+            RealDataRetrainer(sequence_length=12).build_model(34, 4).save(path)
+        keras_model = tf.keras.models.load_model(path)
+        numpy_model = NumpySequential.from_keras(path)
+        results = {
+            'model': os.path.basename(path),
+            'load': {
+                'keras': measure(lambda: tf.keras.models.load_model(path), repeat),
+                'numpy': measure(lambda: NumpySequential.from_keras(path), repeat),
+            },
+        }
+    rng = np.random.default_rng(0)
+    windows = rng.normal(size=(max(batches), *keras_model.input_shape[1:])).astype(np.float32)
+    expected = keras_model.predict(windows, batch_size=1024, verbose=0)
+    actual = numpy_model.predict(windows, batch_size=1024)
+    results['parity'] = {
+        'windows': len(windows),
+        'max_abs_diff': float(np.abs(expected - actual).max()),
+        'argmax_agreement': float((expected.argmax(axis=1) == actual.argmax(axis=1)).mean()),
+    }
+    for size in batches:
+        batch = windows[:size]
+        keras_model.predict(batch, batch_size=1024, verbose=0)
+        results[f'batch_{size}'] = {
+            'keras': measure(lambda: keras_model.predict(batch, batch_size=1024, verbose=0), repeat),
+            'numpy': measure(lambda: numpy_model.predict(batch, batch_size=1024), repeat),
+        }
+    return results
+
+
+@benchmark('sequences')
+def sequences(hours=8760, features=(34, 340), repeat=3, **options):
+    """Окна для обучения за hours часов: копии окон (прежний prepare_sequences и train_test_split
+    массивов) против окон-представлений и пакетов WindowDataset - время и пик памяти"""
+    from sklearn.model_selection import train_test_split
+    from dashboards.ml import RealDataRetrainer, _stratify
+    rng = np.random.default_rng(0)
+    results = {}
+    for feature_count in ([features] if isinstance(features, int) else features):
+        frame = pd.DataFrame(rng.normal(size=(hours, feature_count)), columns=[f'f{i}' for i in range(feature_count)])
+        frame['label'] = rng.choice(['normal', 'gradual_leak', 'sharp_leak', 'sensor_failure'], size=hours, p=[0.85, 0.05, 0.05, 0.05])
+        retrainer = RealDataRetrainer(sequence_length=12)
+
+        def legacy():
+            X_seq, y_seq = legacy_prepare_sequences(retrainer, frame)
+            y_encoded = retrainer.label_encoder.fit_transform(y_seq)
+            return train_test_split(X_seq, y_encoded, test_size=0.2, random_state=42, stratify=_stratify(y_encoded))
+
+        def current():
+            X_scaled, starts, y_seq = retrainer.prepare_windows(frame)
+            train, test = retrainer.split_windows(X_scaled, starts, retrainer.label_encoder.fit_transform(y_seq))
+            # Эпоха обучения и проверки: каждое окно копируется один раз в составе пакета
+            for dataset in (train, test):
+                for index in range(len(dataset)):
+                    dataset[index]
+
+        X_legacy, _ = legacy_prepare_sequences(retrainer, frame)
+        X_view, _ = retrainer.prepare_sequences(frame)
+        results[f'{feature_count}_features'] = {
+            'windows': len(X_view),
+            'identical': bool(np.array_equal(X_legacy.astype(np.float32), X_view)),
+            'legacy': dict(measure(legacy, repeat), peak_mb=measure_memory(legacy)),
+            'current': dict(measure(current, repeat), peak_mb=measure_memory(current)),
+        }
+    return results
+
+
+@benchmark('streaming_training')
+def streaming_training(days=(90, 365, 1095), chunk_days=30, repeat=1, **options):
+    """Данные для обучения за days дней: вся таблица в памяти (prepare_data и retrain_model)
+    против частей по chunk_days дней (iter_house_frames и retrain_streaming) - время и пик
+    памяти до обучения модели; само обучение в замер не входит"""
+    from dashboards.fleet import synthetic_readings, create_house, delete_fleet
+    from dashboards.loaders import iter_house_frames
+    from dashboards.ml import RealDataRetrainer
+    from dashboards.views import prepare_data
+    day_list = [days] if isinstance(days, int) else days
+    delete_fleet(BENCH_FLEET_PREFIX)
+    house = create_house(f'{BENCH_FLEET_PREFIX}-0', synthetic_readings(max(day_list) * 24, rng=np.random.default_rng(0)))
+    detectors_list = list(DetectorsAtHouse.objects.filter(house_id=house).order_by('id'))
+
+    def retrainer():
+        retrainer = RealDataRetrainer(sequence_length=12)
+        retrainer.fit_windows = lambda *args, **kwargs: None
+        return retrainer
+
+    results = {}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for day_count in day_list:
+                def in_memory():
+                    retrainer().retrain_model(prepare_data(house.id, detectors_list, days_back=day_count))
+
+                def streaming():
+                    retrainer().retrain_streaming(iter_house_frames(house.id, detectors_list, days_back=day_count,
+                                                                    chunk_days=chunk_days))
+
+                results[f'{day_count}d'] = {
+                    'in_memory': dict(measure(in_memory, repeat), peak_mb=measure_memory(in_memory)),
+                    'streaming': dict(measure(streaming, repeat), peak_mb=measure_memory(streaming)),
+                }
+    finally:
+        delete_fleet(BENCH_FLEET_PREFIX)
+    return results
+
+
+@benchmark('thresholds')
+def thresholds(batches=(1_000, 10_000, 50_000), breach_share=0.01, repeat=3, **options):
+    """Пакетная запись показаний с проверкой порогов DetectorTreshold: ingest_batch без порогов и с
+    порогами, проверка пакета по индексу порогов и, для сравнения, запросом порогов на каждое показание"""
+    from dashboards.fleet import synthetic_readings, create_house, delete_fleet
+    from dashboards.ingest import ingest_batch, parse_batch, validate_batch
+    from dashboards.thresholds import threshold_index
+    delete_fleet(BENCH_FLEET_PREFIX)
+    house = create_house(f'{BENCH_FLEET_PREFIX}-0', synthetic_readings(24, rng=np.random.default_rng(0)), labels=False)
+    detector_ids = list(DetectorsAtHouse.objects.filter(house_id=house).order_by('id').values_list('detector_id', flat=True))
+    future = timezone.now().replace(microsecond=0) + timedelta(days=365)
+    last_alert = HouseAlerts.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    last_global_alert = Alerts.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+    def cleanup():
+        DetectorData.objects.filter(detector_id__in=detector_ids, timestamp__gte=future).delete()
+        DetectorDataHourly.objects.filter(detector_id__in=detector_ids, hour__gte=future).delete()
+        HouseAlerts.objects.filter(id__gt=last_alert).delete()
+        Alerts.objects.filter(id__gt=last_global_alert).delete()
+
+    def per_row(valid):
+        # Запрос порогов датчика на каждое показание
+        breached = 0
+        for detector_id, value in zip(valid['detector_id'].tolist(), valid['value'].tolist()):
+            for kind, limit in DetectorTreshold.objects.filter(detector_id=detector_id).values_list('kind', 'value'):
+                breached += value < limit if kind == 'min' else value > limit
+        return breached
+
+    results = {}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            payloads = {}
+            for size in batches:
+                # Значения равномерны в [0, 1): верхний порог 1 - breach_share нарушает такая доля показаний
+                payloads[size] = {
+                    'detector_ids': [detector_ids[i % len(detector_ids)] for i in range(size)],
+                    'timestamps': [str(future + timedelta(minutes=i // len(detector_ids))) for i in range(size)],
+                    'values': np.random.default_rng(size).random(size).round(3).tolist(),
+                }
+
+            def ingest(size):
+                def run():
+                    ingest_batch(payloads[size])
+                    cleanup()
+                return run
+
+            for size in batches:
+                results[f'{size}'] = {'ingest_without_thresholds': measure(ingest(size), repeat)}
+            DetectorTreshold.objects.bulk_create(
+                [DetectorTreshold(detector_id_id=detector_id, name='Максимум', kind='max', value=1 - breach_share)
+                 for detector_id in detector_ids] +
+                [DetectorTreshold(detector_id_id=detector_id, name='Минимум', kind='min', value=-1.0)
+                 for detector_id in detector_ids])
+            threshold_index.invalidate()
+            for size in batches:
+                valid, _ = validate_batch(parse_batch(payloads[size]))
+                alerts = ingest_batch(payloads[size])['alerts']
+                cleanup()
+                results[f'{size}'].update({
+                    'alerts': alerts,
+                    'breaching_rows': int((valid['value'] > 1 - breach_share).sum()),
+                    'ingest_with_thresholds': measure(ingest(size), repeat),
+                    'breaches': measure(lambda: threshold_index.breaches(valid), repeat),
+                })
+            size = min(batches)
+            valid, _ = validate_batch(parse_batch(payloads[size]))
+            results[f'{size}']['per_row_queries'] = measure(lambda: per_row(valid), 1)
+            results['index'] = threshold_index.stats()
+    finally:
+        cleanup()
+        delete_fleet(BENCH_FLEET_PREFIX)
+    return results
+
+
+@benchmark('rollups')
+def rollups(days=30, freq=5, batches=(1_000, 10_000), repeat=3, **options):
+    """Часовые агрегаты DetectorDataHourly на доме с показаниями раз в freq минут за days дней:
+    заполнение по исходным показаниям, совпадение агрегатов пакетной записи с пересчётом,
+    detector_data_log/ за месяц и таблица dahdl/ из исходных показаний и из агрегатов"""
+    from dashboards.fleet import synthetic_readings, create_house, delete_fleet
+    from dashboards.ingest import ingest_batch
+    from dashboards.rollups import rebuild_rollups, ROLLUP_FIELDS
+    from dashboards.views import prepare_data
+    delete_fleet(BENCH_FLEET_PREFIX)
+    house = create_house(f'{BENCH_FLEET_PREFIX}-0', synthetic_readings(days * 24 * 60 // freq, freq,
+                                                                      rng=np.random.default_rng(0)))
+    detectors_list = list(DetectorsAtHouse.objects.filter(house_id=house).order_by('id'))
+    detector_ids = [detector.detector_id_id for detector in detectors_list]
+    start, end = period_bounds(RANGE_DAYS['month'])
+    future = timezone.now().replace(microsecond=0) + timedelta(days=365)
+
+    def rollup_rows(since, until=None):
+        rows = DetectorDataHourly.objects.filter(detector_id__in=detector_ids, hour__gte=since)
+        if until is not None:
+            rows = rows.filter(hour__lt=until)
+        return pd.DataFrame.from_records(rows.order_by('detector_id', 'hour')
+                                         .values_list('detector_id', 'hour', *ROLLUP_FIELDS),
+                                         columns=['detector_id', 'hour', *ROLLUP_FIELDS])
+
+    results = {}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            backfill_start = time.perf_counter()
+            for detector_id in detector_ids:
+                rebuild_rollups(detector_id, period_start(days + 1))
+            results['backfill_ms'] = round((time.perf_counter() - backfill_start) * 1000, 3)
+
+            # Пакеты в будущее время, по несколько показаний на час и с повтором часа в соседних пакетах
+            for size in batches:
+                payload = {
+                    'detector_ids': [detector_ids[i % len(detector_ids)] for i in range(size)],
+                    'timestamps': [str(future + timedelta(minutes=freq * (i // len(detector_ids)))) for i in range(size)],
+                    'values': np.random.default_rng(size).normal(size=size).round(3).tolist(),
+                }
+                half = size // 2
+                halves = [{key: values[:half] for key, values in payload.items()},
+                          {key: values[half:] for key, values in payload.items()}]
+
+                def ingest():
+                    for part in halves:
+                        ingest_batch(part)
+
+                def cleanup():
+                    DetectorData.objects.filter(detector_id__in=detector_ids, timestamp__gte=future).delete()
+                    DetectorDataHourly.objects.filter(detector_id__in=detector_ids, hour__gte=future).delete()
+
+                ingest()
+                incremental = rollup_rows(future)
+                for detector_id in detector_ids:
+                    rebuild_rollups(detector_id, future)
+                rebuilt = rollup_rows(future)
+                cleanup()
+                numeric = [field for field in ROLLUP_FIELDS if field != 'last_timestamp']
+                results[f'ingest_{size}'] = {
+                    'hours': len(rebuilt),
+                    'matches_rebuild': bool(
+                        len(incremental) == len(rebuilt)
+                        and np.allclose(incremental[numeric].to_numpy(float), rebuilt[numeric].to_numpy(float))
+                        and (incremental['last_timestamp'] == rebuilt['last_timestamp']).all()),
+                    'ingest': measure(lambda: (ingest(), cleanup()), repeat),
+                }
+
+            for detector_id in detector_ids[:1]:
+                raw = DetectorData.objects.filter(detector_id=detector_id, timestamp__gte=start, timestamp__lt=end).order_by('-timestamp')
+                hourly = DetectorDataHourly.objects.filter(detector_id=detector_id, hour__gte=start, hour__lt=end).order_by('-hour')
+                results['detector_month'] = {
+                    'raw_rows': raw.count(),
+                    'hourly_rows': hourly.count(),
+                    'raw': measure(lambda: serialize("json", raw), repeat),
+                    'hourly': measure(lambda: serialize("json", hourly), repeat),
+                }
+            results['house_month'] = {
+                'raw_rows': len(prepare_data(house.id, detectors_list, days_back=30)),
+                'hourly_rows': len(prepare_data(house.id, detectors_list, days_back=30, hourly=True)),
+                'raw': measure(lambda: prepare_data(house.id, detectors_list, days_back=30).to_json(orient='records'), repeat),
+                'hourly': measure(lambda: prepare_data(house.id, detectors_list, days_back=30, hourly=True)
+                                  .to_json(orient='records'), repeat),
+            }
+    finally:
+        delete_fleet(BENCH_FLEET_PREFIX)
+    return results
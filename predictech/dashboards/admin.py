@@ -42,4 +42,10 @@ class ForecastAdmin(admin.ModelAdmin):
 class RiskValuesAdmin(admin.ModelAdmin):
     pass
 
+class TrainingJobAdmin(admin.ModelAdmin):
+    list_display = ("house_id", "status", "stage", "epoch", "progress", "created",)
+
+class TableVersionAdmin(admin.ModelAdmin):
+    list_display = ("table", "version", "updated",)
+
 admin_register(namespace=globals())
\ No newline at end of file
@@ -0,0 +1,23 @@
+from django.urls import path
+from .urls import urlpatterns as sync_urlpatterns
+from .async_views import *
+
+# Адреса urls.py, у которых под ASGI своё асинхронное представление
+ASYNC_VIEWS = {
+    'test_alerts': AsyncHouseAlertsView.as_view(),
+    'house_alerts': AsyncHouseAlertsView.as_view(),
+    'alerts': AsyncAlertsView.as_view(),
+    'detector': AsyncDetectorView.as_view(),
+    'detectors_at_house': AsyncDetectorsAtHouseView.as_view(),
+    'house': AsyncHouseView.as_view(),
+    'risks': AsyncRisksValuesView.as_view(),
+    'events': AsyncEventsView.as_view(),
+    'detectors_at_house_data_log': AsyncDetectorsAtHouseDataView.as_view(),
+    'predict': async_predict,
+    'forecast': async_forecast,
+}
+
+urlpatterns = [
+    path(str(pattern.pattern), ASYNC_VIEWS[pattern.name], name=pattern.name) if pattern.name in ASYNC_VIEWS else pattern
+    for pattern in sync_urlpatterns
+]
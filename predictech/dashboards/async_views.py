@@ -0,0 +1,108 @@
+from django.http import HttpResponse, StreamingHttpResponse
+from django.conf import settings
+from django.core.serializers import serialize
+from django.utils.decorators import method_decorator
+from .models import *
+from .pagination import alist_response
+from .events import hub, async_event_stream
+from .freshness import conditional
+from .response_cache import cached_response
+from .offload import offload
+from .views import (HouseAlertsView, AlertsView, DetectorsAtHouseView, DetectorView, HouseView, EventsView,
+                    DetectorsAtHouseDataView, RisksValuesView, predict, forecast,
+                    house_alerts_state, alerts_state, detectors_at_house_state, detector_state, house_state, risks_state)
+import asyncio
+import json
+
+# Асинхронные версии представлений для ASGI (main.asgi_urls). Под WSGI работают
+# синхронные представления views.py: там async-представление выполнялось бы через
+# async_to_sync с новым циклом событий на каждый запрос
+
+
+@method_decorator(conditional(house_alerts_state), name='get')
+class AsyncHouseAlertsView(HouseAlertsView):
+
+    async def get(self, request, *args, **kwargs):
+        if request.GET.get("house_id") is None:
+            return await alist_response(request, HouseAlerts.objects.all())
+        qs = await HouseAlerts.objects.filter(house_id=request.GET.get("house_id")).order_by('-date_time').afirst()
+        data = serialize("json", [qs] if qs is not None else [])
+        return HttpResponse(data, content_type="application/json", status=200)
+
+
+@method_decorator(conditional(alerts_state), name='get')
+class AsyncAlertsView(AlertsView):
+
+    async def get(self, request, *args, **kwargs):
+        if request.GET.get("alert_id") is None:
+            return await alist_response(request, Alerts.objects.all())
+        qs = await Alerts.objects.filter(id=request.GET.get("alert_id")).order_by('-date_time').afirst()
+        data = serialize("json", [qs] if qs is not None else [])
+        return HttpResponse(data, content_type="application/json", status=200)
+
+
+@method_decorator(conditional(detectors_at_house_state), name='get')
+class AsyncDetectorsAtHouseView(DetectorsAtHouseView):
+    async def get(self, request, *args, **kwargs):
+        qs = DetectorsAtHouse.objects.all()
+        if request.GET.get("house_id") is not None:
+            qs = qs.filter(house_id=request.GET.get("house_id"))
+        data = serialize("json", [obj async for obj in qs])
+        return HttpResponse(data, content_type="application/json", status=200)
+
+
+@method_decorator(conditional(detector_state), name='get')
+class AsyncDetectorView(DetectorView):
+    async def get(self, request, *args, **kwargs):
+        if request.GET.get("detector_id") is None:
+            return await alist_response(request, Detector.objects.all())
+        qs = await Detector.objects.aget(id=request.GET.get("detector_id"))
+        data = serialize("json", [qs])
+        return HttpResponse(data, content_type="application/json", status=200)
+
+
+@method_decorator(conditional(house_state), name='get')
+class AsyncHouseView(HouseView):
+    async def get(self, request, *args, **kwargs):
+        if request.GET.get("house_id") is None:
+            return await alist_response(request, House.objects.all())
+        qs = await House.objects.aget(id=request.GET.get("house_id"))
+        data = serialize("json", [qs])
+        return HttpResponse(data, content_type="application/json", status=200)
+
+
+@method_decorator(conditional(risks_state), name='get')
+@method_decorator(cached_response(lambda request: (['risks'], ())), name='get')
+class AsyncRisksValuesView(RisksValuesView):
+    async def get(self, request, *args, **kwargs):
+        risks = await RiskValues.objects.alast()
+        return HttpResponse(serialize("json", [risks]), content_type="application/json", status=200)
+
+    # Запись настроек редкая: синхронный post выполняется в пуле offload
+    post = offload(RisksValuesView.post)
+
+
+class AsyncEventsView(EventsView):
+    """Поток событий для ASGI: клиент ждёт события в цикле событий, не занимая поток"""
+    async def get(self, request, *args, **kwargs):
+        house = request.GET.get("house_id")
+        try:
+            house = int(house) if house not in (None, "") else None
+        except ValueError:
+            return HttpResponse(json.dumps({"status": "Error", "message": "Bad request. house_id"}), content_type="application/json", status=400)
+        hub.ensure_listener()
+        subscription = hub.subscribe(house, loop=asyncio.get_running_loop())
+        response = StreamingHttpResponse(async_event_stream(subscription, settings.EVENTS_HEARTBEAT), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        # nginx не должен буферизовать поток
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
+# Тяжёлые представления (pandas, TensorFlow) выполняются в пуле потоков offload
+class AsyncDetectorsAtHouseDataView(DetectorsAtHouseDataView):
+    get = offload(DetectorsAtHouseDataView.get)
+
+
+async_predict = offload(predict)
+async_forecast = offload(forecast)
@@ -0,0 +1,195 @@
+from django.conf import settings
+from django.db import connection, transaction
+from collections import defaultdict
+import threading
+import asyncio
+import queue
+import json
+import time
+
+PG_CHANNEL = 'predictech_events'
+
+# Лимит полезной нагрузки pg_notify - 8000 байт
+PG_PAYLOAD_LIMIT = 7900
+
+
+class Subscription:
+    """Очередь событий одного SSE-клиента; при переполнении отбрасываются самые старые.
+
+    Если задан цикл событий loop (ASGI), клиент ждёт событие через aget, не занимая поток.
+    """
+
+    def __init__(self, house_id, queue_size, loop=None):
+        self.house_id = house_id
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.loop = loop
+        self.wakeup = asyncio.Event() if loop is not None else None
+
+    def put(self, event):
+        while True:
+            try:
+                self.queue.put_nowait(event)
+                break
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+        if self.loop is not None:
+            try:
+                self.loop.call_soon_threadsafe(self.wakeup.set)
+            except RuntimeError:
+                # Цикл клиента уже закрыт
+                pass
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    async def aget(self, timeout):
+        while True:
+            # Флаг сбрасывается до проверки очереди, чтобы не потерять событие между ними
+            self.wakeup.clear()
+            try:
+                return self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+
+
+class EventHub:
+    """Раздача событий домов подписчикам процесса.
+
+    Одно изменение в БД публикуется один раз и раскладывается по очередям всех
+    подписчиков дома, поэтому число зрителей не добавляет запросов к БД. На PostgreSQL
+    события идут через LISTEN/NOTIFY: один поток-слушатель на процесс получает
+    изменения, сделанные любым воркером.
+    """
+
+    def __init__(self, queue_size=200):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+        self._listener = None
+        self.published = 0
+
+    def subscribe(self, house_id=None, loop=None, limit=-1):
+        """Подписка на события дома house_id или, если None, всех домов.
+
+        None, если в процессе уже limit подписчиков (-1 - без ограничения).
+        """
+        subscription = Subscription(house_id, self.queue_size, loop=loop)
+        with self._lock:
+            if 0 <= limit <= sum(len(subscribers) for subscribers in self._subscribers.values()):
+                return None
+            self._subscribers[house_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.house_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.house_id]
+
+    def publish(self, event):
+        """Кладёт событие в очереди подписчиков его дома и подписчиков всех домов"""
+        with self._lock:
+            targets = list(self._subscribers.get(event['house_id'], ())) + list(self._subscribers.get(None, ()))
+            self.published += 1
+        for subscription in targets:
+            subscription.put(event)
+
+    def ensure_listener(self):
+        """Запускает поток LISTEN, если события передаются через PostgreSQL"""
+        if not use_pg_notify():
+            return
+        with self._lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            self._listener = threading.Thread(target=self._listen, name='events-listener', daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        # У потока своё подключение Django к БД, отдельное от подключений запросов
+        while True:
+            try:
+                connection.ensure_connection()
+                pg = connection.connection
+                pg.autocommit = True
+                pg.execute(f"LISTEN {PG_CHANNEL}")
+                for notify in pg.notifies():
+                    self.publish(json.loads(notify.payload))
+            except Exception as e:
+                print(f"Слушатель событий: {e}")
+                connection.close()
+                time.sleep(1)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': sum(len(subscribers) for subscribers in self._subscribers.values()),
+                'houses': len([house for house in self._subscribers if house is not None]),
+                'published': self.published,
+            }
+
+
+def use_pg_notify():
+    return getattr(settings, 'EVENTS_PG_NOTIFY', connection.vendor == 'postgresql')
+
+
+hub = EventHub(queue_size=settings.EVENTS_QUEUE_SIZE)
+
+
+def publish_event(house_id, kind, data):
+    """Публикует событие дома после фиксации транзакции"""
+    event = {'house_id': int(house_id), 'type': kind, 'data': data}
+
+    def send():
+        if use_pg_notify():
+            payload = json.dumps(event, default=str)
+            if len(payload.encode()) > PG_PAYLOAD_LIMIT:
+                # Крупные записи отправляются без данных: клиент перечитает их сам
+                payload = json.dumps({'house_id': event['house_id'], 'type': kind, 'data': None})
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_notify(%s, %s)", [PG_CHANNEL, payload])
+        else:
+            hub.publish(json.loads(json.dumps(event, default=str)))
+
+    transaction.on_commit(send)
+
+
+def event_stream(subscription, heartbeat=15):
+    """Поток text/event-stream; комментарий-пинг раз в heartbeat секунд держит соединение"""
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            event = subscription.get(timeout=heartbeat)
+            if event is None:
+                yield ": ping\n\n"
+                continue
+            yield f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+    finally:
+        hub.unsubscribe(subscription)
+
+
+async def async_event_stream(subscription, heartbeat=15):
+    """event_stream для ASGI: ожидание событий не занимает поток"""
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            event = await subscription.aget(timeout=heartbeat)
+            if event is None:
+                yield ": ping\n\n"
+                continue
+            yield f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+    finally:
+        hub.unsubscribe(subscription)
@@ -0,0 +1,144 @@
+import pandas as pd
+import numpy as np
+
+FLOW_COLUMNS = ['flow_xvs', 'flow_gvs']
+TEMP_COLUMNS = ['temp_supply', 'temp_return']
+
+# Допуск, в пределах которого масштабированное значение считается близким к половине
+TIE_TOLERANCE = 1e-6
+
+DIFF_WINDOWS = [1, 3, 12]
+ROLLING_WINDOWS = [3, 12]
+# Сколько предыдущих строк нужно training_features для расчёта строки
+FEATURE_LOOKBACK = max(DIFF_WINDOWS + ROLLING_WINDOWS)
+
+
+def py_round(values, decimals=None):
+    """Векторный аналог встроенного round(x, decimals) для массива float64.
+
+    rint(x * 10**d) / 10**d совпадает с round() везде, кроме значений, близких
+    к половине после масштабирования: их немного, они досчитываются через round().
+    Без decimals, как round(x), результат целый, поэтому -0.0 становится 0.0.
+    """
+    values = np.asarray(values, dtype='float64')
+    if decimals is None:
+        return np.rint(values) + 0.0
+    result = np.rint(values * 10.0 ** decimals) / 10.0 ** decimals
+    for i in np.flatnonzero(near_ties(values, decimals)):
+        result[i] = round(float(values[i]), decimals)
+    return result
+
+
+def near_ties(values, decimals):
+    """Маска значений, которые после умножения на 10**decimals близки к половине (пропуски - False)"""
+    scaled = np.asarray(values, dtype='float64') * 10.0 ** decimals
+    with np.errstate(invalid='ignore'):
+        distance = np.abs(scaled - np.floor(scaled) - 0.5)
+        return distance <= TIE_TOLERANCE * np.maximum(1.0, np.abs(scaled))
+
+
+def _rounded(values, decimals, index):
+    """Series с округлением как у прежнего .apply(round): round(x) без пропусков даёт int64"""
+    result = py_round(values, decimals)
+    if decimals is None and len(result) and not np.isnan(result).any():
+        return pd.Series(result.astype('int64'), index=index)
+    return pd.Series(result, index=index)
+
+
+def _difference(values, window):
+    """values[i] - values[i - window], как x - x.shift(window)"""
+    result = np.full(len(values), np.nan)
+    if window < len(values):
+        result[window:] = values[window:] - values[:-window]
+    return result
+
+
+def _rolling(columns, index):
+    """Скользящие среднее и отклонение до округления - rolling pandas, как в прежнем create_features.
+
+    rolling накапливает сумму по всему ряду, поэтому последние биты значения зависят от того,
+    с какой строки начинается ряд; округлённый признак от этого меняется только у половины.
+    """
+    result = {}
+    for col in FLOW_COLUMNS + ['imbalance']:
+        series = pd.Series(columns[col], index=index)
+        for window in ROLLING_WINDOWS:
+            # Среднее и отклонение считаются по одному окну
+            rolling = series.rolling(window=window)
+            result[f'{col}_mean_{window}h'] = rolling.mean().to_numpy()
+            result[f'{col}_std_{window}h'] = rolling.std().to_numpy()
+    return result
+
+
+def _source_columns(df):
+    columns = {name: df[name].to_numpy(dtype='float64') for name in FLOW_COLUMNS + TEMP_COLUMNS}
+    columns['imbalance'] = py_round(columns['flow_xvs'] - columns['flow_gvs'], 2)
+    return columns
+
+
+def rolling_ties(df, rows):
+    """Есть ли у строк rows (метки индекса df) скользящее среднее или отклонение у половины при округлении.
+
+    Признаки таких строк, посчитанные по хвосту истории, могут отличаться на 0.01 от
+    посчитанных по всей истории; у остальных строк хвост и вся история совпадают.
+    """
+    positions = df.index.get_indexer(rows)
+    return any(near_ties(values[positions], 2).any() for values in _rolling(_source_columns(df), df.index).values())
+
+
+def training_features(df):
+    """Признаки модели аномалий (RealDataRetrainer) для строк df в исходном порядке"""
+    index = df.index
+    columns = _source_columns(df)
+    new = {}
+
+    new['imbalance'] = _rounded(columns['imbalance'], 2, index)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        new['imbalance_ratio'] = _rounded(1 - columns['flow_gvs'] / columns['flow_xvs'], 2, index)
+    new['temp_difference'] = _rounded(columns['temp_supply'] - columns['temp_return'], None, index)
+    new['hour'] = df['timestamp'].dt.hour
+
+    for col in FLOW_COLUMNS + ['imbalance']:
+        for window in DIFF_WINDOWS:
+            new[f'{col}_diff_{window}h'] = _rounded(_difference(columns[col], window), 2, index)
+    for col in TEMP_COLUMNS:
+        for window in DIFF_WINDOWS:
+            new[f'{col}_diff_{window}h'] = _rounded(_difference(columns[col], window), None, index)
+
+    for name, values in _rolling(columns, index).items():
+        new[name] = _rounded(values, 2, index)
+
+    features = df.assign(**new)
+    # Строковые 'nan' (например, в метках) считаются пропусками
+    text_columns = features.columns[features.dtypes == object]
+    if len(text_columns):
+        features[text_columns] = features[text_columns].replace('nan', np.nan)
+    return features.dropna()
+
+
+def forecast_features(df):
+    """Упрощённые признаки модели прогноза; строки упорядочены по времени"""
+    df = df.copy()
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    df = df.sort_values('timestamp').reset_index(drop=True)
+    columns = {name: df[name].to_numpy(dtype='float64') for name in FLOW_COLUMNS + TEMP_COLUMNS}
+    decimals = {'flow_xvs': 2, 'flow_gvs': 2, 'temp_supply': 1, 'temp_return': 1}
+
+    features = pd.DataFrame({name: df[name] for name in FLOW_COLUMNS + TEMP_COLUMNS})
+    imbalance = np.round(columns['flow_xvs'] - columns['flow_gvs'], 2)
+    features['imbalance'] = imbalance
+    flow_xvs = np.where(columns['flow_xvs'] == 0, 0.001, columns['flow_xvs'])
+    features['imbalance_ratio'] = np.round(1 - columns['flow_gvs'] / flow_xvs, 2)
+    features['temp_difference'] = np.round(columns['temp_supply'] - columns['temp_return'], 1)
+
+    features['hour'] = df['timestamp'].dt.hour
+    features['day_of_week'] = df['timestamp'].dt.dayofweek
+
+    for col, values in [('flow_xvs', columns['flow_xvs']), ('flow_gvs', columns['flow_gvs']), ('imbalance', imbalance)]:
+        features[f'{col}_mean_3h'] = np.round(pd.Series(values).rolling(window=3, min_periods=1).mean().to_numpy(), 2)
+
+    for window in [1, 3]:
+        for col in FLOW_COLUMNS + TEMP_COLUMNS:
+            features[f'{col}_diff_{window}h'] = np.round(_difference(columns[col], window), decimals[col])
+
+    return features.bfill().ffill()
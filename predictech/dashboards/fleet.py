@@ -0,0 +1,109 @@
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from datetime import timedelta
+from .models import House, DetectorTypes, Detector, DetectorsAtHouse, DetectorData, StateLabel
+import pandas as pd
+import numpy as np
+
+FLEET_TYPE_NAME = 'fleet'
+FLEET_PREFIX = 'fleet'
+DETECTOR_NAMES = ['flow_xvs', 'flow_gvs', 'temp_supply', 'temp_return']
+
+# Диапазоны показаний в норме - как у демонстрационных данных forecast()
+NORMAL_RANGES = {
+    'flow_xvs': (0.15, 0.25, 2),
+    'flow_gvs': (0.14, 0.24, 2),
+    'temp_supply': (59.0, 61.0, 1),
+    'temp_return': (41.0, 43.0, 1),
+}
+ANOMALIES = ['gradual_leak', 'sharp_leak', 'sensor_failure']
+
+
+def synthetic_readings(steps, freq_minutes=60, end=None, anomaly_share=0.1, rng=None):
+    """Показания дома за steps шагов по freq_minutes минут, заканчивая end, с метками состояния.
+
+    Эпизоды аномалий длиной 3-24 шага занимают около anomaly_share времени:
+    постепенная утечка - нарастающий расход ХВС, утечка - скачок расхода ХВС,
+    сбой датчика - нулевая температура подачи.
+    """
+    rng = rng or np.random.default_rng()
+    end = end or timezone.now()
+    freq = timedelta(minutes=freq_minutes)
+    end = end - (end - end.replace(hour=0, minute=0, second=0, microsecond=0)) % freq
+    end = end.replace(microsecond=0)
+    frame = pd.DataFrame({'timestamp': pd.date_range(end=end, periods=steps, freq=freq)})
+    for name, (low, high, decimals) in NORMAL_RANGES.items():
+        frame[name] = rng.uniform(low, high, steps)
+    labels = np.full(steps, 'normal', dtype=object)
+
+    position = 0
+    while position < steps:
+        position += int(rng.geometric(anomaly_share / 12)) if anomaly_share > 0 else steps
+        if position >= steps:
+            break
+        length = min(int(rng.integers(3, 25)), steps - position)
+        episode = slice(position, position + length)
+        kind = ANOMALIES[rng.integers(len(ANOMALIES))]
+        if kind == 'gradual_leak':
+            frame.loc[frame.index[episode], 'flow_xvs'] += np.linspace(0.01, 0.08, length)
+        elif kind == 'sharp_leak':
+            frame.loc[frame.index[episode], 'flow_xvs'] += 0.1
+        else:
+            frame.loc[frame.index[episode], 'temp_supply'] = 0.0
+        labels[episode] = kind
+        position += length
+
+    for name, (_, _, decimals) in NORMAL_RANGES.items():
+        frame[name] = frame[name].round(decimals)
+    frame['label'] = labels
+    return frame
+
+
+def _insert_readings(rows, batch_size):
+    if connection.vendor == 'postgresql':
+        # COPY в разы быстрее INSERT при миллионах строк
+        with connection.cursor() as cursor:
+            with cursor.copy('COPY dashboards_detectordata (detector_id_id, "timestamp", value) FROM STDIN') as copy:
+                for row in rows:
+                    copy.write_row(row)
+        return
+    DetectorData.objects.bulk_create((DetectorData(detector_id_id=detector_id, timestamp=timestamp, value=value)
+                                      for detector_id, timestamp, value in rows), batch_size=batch_size)
+
+
+def create_house(name, frame, labels=True, batch_size=None):
+    """Дом с датчиками DETECTOR_NAMES, показаниями и метками из frame synthetic_readings"""
+    batch_size = batch_size or settings.DETECTOR_DATA_BULK_BATCH_SIZE
+    detector_type, _ = DetectorTypes.objects.get_or_create(name=FLEET_TYPE_NAME, defaults={'units': '-'})
+    house = House.objects.create(name=name, address='-')
+    timestamps = frame['timestamp'].astype(object).tolist()
+    for detector_name in DETECTOR_NAMES:
+        detector = Detector.objects.create(type_id=detector_type, name=f'{name}-{detector_name}')
+        DetectorsAtHouse.objects.create(house_id=house, detector_id=detector, name=detector_name)
+        _insert_readings(zip([detector.id] * len(frame), timestamps, frame[detector_name].tolist()), batch_size)
+    if labels:
+        StateLabel.objects.bulk_create((StateLabel(house_id=house, timestamp=timestamp, state=state)
+                                        for timestamp, state in zip(timestamps, frame['label'].tolist())),
+                                       batch_size=batch_size)
+    return house
+
+
+def generate_fleet(houses, days=30, freq_minutes=60, seed=0, labels=True, anomaly_share=0.1, prefix=FLEET_PREFIX):
+    """Создаёт houses домов с историей за days дней; имена домов - '<prefix>-<номер>'"""
+    rng = np.random.default_rng(seed)
+    steps = days * 24 * 60 // freq_minutes
+    end = timezone.now()
+    first = House.objects.filter(name__startswith=f'{prefix}-').count()
+    created = []
+    for number in range(first, first + houses):
+        frame = synthetic_readings(steps, freq_minutes, end=end, anomaly_share=anomaly_share, rng=rng)
+        created.append(create_house(f'{prefix}-{number}', frame, labels=labels))
+    return created
+
+
+def delete_fleet(prefix=FLEET_PREFIX):
+    """Удаляет синтетические дома и их датчики вместе с показаниями и метками"""
+    houses = House.objects.filter(name__startswith=f'{prefix}-')
+    Detector.objects.filter(type_id__name=FLEET_TYPE_NAME, detectorsathouse__house_id__in=houses).delete()
+    return houses.delete()[0]
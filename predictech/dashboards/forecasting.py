@@ -0,0 +1,143 @@
+from django.conf import settings
+from .models import House, Forecast
+from .features import forecast_features
+from .metrics import stage_timer
+from datetime import datetime, timedelta
+import pandas as pd
+import numpy as np
+import threading
+import os
+
+# Метаданные на случай, если модель прогноза не удалось загрузить
+DEMO_METADATA = {
+    'feature_names': ['flow_xvs', 'flow_gvs', 'temp_supply', 'temp_return', 'imbalance',
+                      'imbalance_ratio', 'temp_difference', 'hour', 'day_of_week',
+                      'flow_xvs_mean_3h', 'flow_gvs_mean_3h', 'imbalance_mean_3h',
+                      'flow_xvs_diff_1h', 'flow_gvs_diff_1h', 'temp_supply_diff_1h',
+                      'temp_return_diff_1h', 'flow_xvs_diff_3h', 'flow_gvs_diff_3h',
+                      'temp_supply_diff_3h', 'temp_return_diff_3h'],
+    'target_names': ['flow_xvs_168', 'flow_gvs_168', 'temp_supply_168', 'temp_return_168',
+                     'flow_xvs_336', 'flow_gvs_336', 'temp_supply_336', 'temp_return_336',
+                     'flow_xvs_504', 'flow_gvs_504', 'temp_supply_504', 'temp_return_504'],
+    'forecast_horizons': [168, 336, 504],
+}
+
+
+class ForecastService:
+    """Модель прогноза параметров дома, загруженная один раз на процесс.
+
+    Сервер gunicorn загружает модель в мастере до fork (dashboards.warmup.preload), и воркеры
+    делят её страницы, пока не изменят их. Модель перечитывается при изменении файлов.
+    """
+
+    def __init__(self, base_path="forecast", model_name='fast_forecast_model.pkl', metadata_name='forecast_metadata.pkl'):
+        self.base_path = base_path
+        self.model_name = model_name
+        self.metadata_name = metadata_name
+        self._lock = threading.Lock()
+        self._key = None
+        self._loaded = None
+
+    def _paths(self):
+        return (os.path.join(settings.MEDIA_ROOT, self.base_path, self.model_name),
+                os.path.join(settings.MEDIA_ROOT, self.base_path, self.metadata_name))
+
+    def load(self):
+        """(model, metadata); при ошибке загрузки - необученная демо-модель"""
+        import joblib
+        model_path, metadata_path = self._paths()
+        try:
+            key = (os.path.getmtime(model_path), os.path.getmtime(metadata_path))
+        except OSError:
+            key = None
+        with self._lock:
+            if key is not None and key == self._key:
+                return self._loaded
+            try:
+                model = joblib.load(model_path)
+                metadata = joblib.load(metadata_path)
+                print("Модель и метаданные успешно загружены!")
+                print(f"Количество признаков: {metadata['feature_count']}")
+                print(f"Целевые переменные: {metadata['target_names']}")
+            except Exception as e:
+                print(f"Ошибка при загрузке модели: {e}")
+                # Если не удалось загрузить, создадим демонстрационную модель (не кэшируется)
+                print("Создание демонстрационной модели...")
+                from sklearn.ensemble import RandomForestRegressor
+                return RandomForestRegressor(), DEMO_METADATA
+            # Прогноз - одна строка: потоки joblib дороже самого обхода деревьев
+            model.n_jobs = 1
+            self._key = key
+            self._loaded = (model, metadata)
+            return self._loaded
+
+    def clear(self):
+        with self._lock:
+            self._key = None
+            self._loaded = None
+
+    def predict(self, features):
+        """Прогноз для строк features"""
+        model, _ = self.load()
+        return model.predict(features)
+
+    def features_for(self, data):
+        """Признаки модели прогноза для таблицы prepare_data"""
+        _, metadata = self.load()
+        features = forecast_features(data)
+        missing_features = set(metadata['feature_names']) - set(features.columns)
+        if missing_features:
+            print(f"Предупреждение: отсутствуют признаки: {missing_features}")
+            # Оставляем только те признаки, которые есть в данных
+            return features[[f for f in metadata['feature_names'] if f in features.columns]]
+        return features[metadata['feature_names']]
+
+    def forecast_house(self, house, data):
+        """Прогноз параметров дома на 1-3 недели и сохранение его в Forecast"""
+        with stage_timer('forecast', 'model_load'):
+            _, metadata = self.load()
+        if data.empty:
+            data = demo_data()
+        with stage_timer('forecast', 'features'):
+            features = self.features_for(data)
+        # Сохраняется прогноз от последних показаний: признаки упорядочены по времени,
+        # оценивается только последняя строка
+        with stage_timer('forecast', 'predict'):
+            prediction = self.predict(features.iloc[-1:])
+        pred_df = pd.DataFrame(prediction, columns=metadata['target_names'])
+        pred_df['timestamp'] = [pd.to_datetime(data['timestamp']).max()]
+
+        forecast = pred_df.round(2).loc[0]
+        timestamp = forecast['timestamp']
+        forecast['timestamp'] = str(timestamp)[:10] + " " + str(timestamp)[11:]  # Убираем миллисекунды из timestamp
+        with stage_timer('forecast', 'save'):
+            house_obj = House.objects.get(id=house)
+            try:
+                forecast_obj = Forecast.objects.get(timestamp=timestamp, house_id=house_obj)
+                forecast_obj.forecast = forecast.to_json()
+                forecast_obj.save()
+            except:
+                Forecast.objects.create(timestamp=timestamp, house_id=house_obj, forecast=forecast.to_json())
+        return forecast.to_json()
+
+
+def demo_data():
+    """Демонстрационные почасовые данные за 30 дней, если у дома нет показаний"""
+    print("Создание демонстрационных данных...")
+    dates = pd.date_range(start=datetime.now() - timedelta(days=30), end=datetime.now(), freq='h')
+    return pd.DataFrame({
+        'timestamp': dates,
+        'flow_xvs': np.round(np.random.uniform(0.15, 0.25, len(dates)), 2),
+        'flow_gvs': np.round(np.random.uniform(0.14, 0.24, len(dates)), 2),
+        'temp_supply': np.round(np.random.uniform(59.0, 61.0, len(dates)), 1),
+        'temp_return': np.round(np.random.uniform(41.0, 43.0, len(dates)), 1),
+        'label': 'normal',
+    })
+
+
+forecast_service = ForecastService()
+
+
+def forecast_house(house, data):
+    """Прогноз параметров дома на 1-3 недели и сохранение его в Forecast"""
+    return forecast_service.forecast_house(house, data)
@@ -0,0 +1,94 @@
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.db.models import Max, F
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from functools import wraps
+from .models import TableVersion
+import hashlib
+
+
+def bump_version(model):
+    """Отмечает изменение существующих записей таблицы model"""
+    table = model._meta.db_table
+    if not TableVersion.objects.filter(table=table).update(version=F('version') + 1, updated=timezone.now()):
+        TableVersion.objects.get_or_create(table=table, defaults={'version': 1})
+
+
+def table_versions(*models):
+    """Счётчики изменений таблиц models одним запросом"""
+    tables = [model._meta.db_table for model in models]
+    versions = dict(TableVersion.objects.filter(table__in=tables).values_list('table', 'version'))
+    return tuple(versions.get(table, 0) for table in tables)
+
+
+def queryset_state(qs, latest=None):
+    """Максимальный pk выборки и, если задано поле latest, его максимум - по индексам, без
+    подсчёта строк.
+
+    Новая запись увеличивает максимальный pk, поэтому вставки меняют состояние без
+    сигналов. Правки и удаления записей учитываются отдельно счётчиком TableVersion.
+    """
+    aggregates = {'max_pk': Max('pk')}
+    if latest is not None:
+        aggregates['latest'] = Max(latest)
+    state = qs.order_by().aggregate(**aggregates)
+    return tuple(str(state[key]) for key in sorted(state))
+
+
+def make_etag(request, state):
+    """ETag ответа на запрос request при состоянии данных state"""
+    key = repr((request.path, sorted(request.GET.lists()), state)).encode()
+    return quote_etag(hashlib.md5(key, usedforsecurity=False).hexdigest())
+
+
+def conditional(state_func):
+    """Условный GET: 304 без выполнения представления, если ETag клиента актуален.
+
+    state_func(request) возвращает кортеж, который меняется вместе с данными ответа и
+    считается агрегатными запросами по индексам. Ответ помечается no-cache: клиент
+    хранит тело, но перед использованием каждый раз сверяет ETag. Подходит и для
+    асинхронных представлений: state_func тогда выполняется через sync_to_async.
+    """
+    def request_etag(request):
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        try:
+            return make_etag(request, state_func(request))
+        except (ValueError, TypeError):
+            # Некорректные параметры разбирает само представление
+            return None
+
+    def finish(response, etag):
+        response['ETag'] = etag
+        patch_cache_control(response, no_cache=True)
+        return response
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def ainner(request, *args, **kwargs):
+                etag = await sync_to_async(request_etag)(request)
+                if etag is None:
+                    return await view(request, *args, **kwargs)
+                response = get_conditional_response(request, etag=etag)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                    if response.status_code != 200:
+                        return response
+                return finish(response, etag)
+            return ainner
+
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            etag = request_etag(request)
+            if etag is None:
+                return view(request, *args, **kwargs)
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            return finish(response, etag)
+        return inner
+    return decorator
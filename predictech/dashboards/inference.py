@@ -0,0 +1,166 @@
+import numpy as np
+import zipfile
+import json
+import io
+import re
+
+# Предсказание моделей RealDataRetrainer.build_model (LSTM, Dropout, Dense) на NumPy без TensorFlow.
+# Веса читаются из файла .keras (zip с config.json и model.weights.h5), расчёт во float32
+
+
+class UnsupportedModel(ValueError):
+    """Слой или параметр слоя, которого нет в NumpySequential"""
+
+
+def _sigmoid(x):
+    # Через tanh: без переполнения exp при больших |x|
+    return 0.5 * (np.tanh(0.5 * x) + 1.0)
+
+
+def _softmax(x):
+    e = np.exp(x - x.max(axis=-1, keepdims=True))
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+ACTIVATIONS = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0),
+    'tanh': np.tanh,
+    'sigmoid': _sigmoid,
+    'softmax': _softmax,
+}
+
+
+def _activation(name):
+    if name not in ACTIVATIONS:
+        raise UnsupportedModel(f"функция активации {name}")
+    return ACTIVATIONS[name]
+
+
+class LSTMLayer:
+    """Слой LSTM Keras. В весах Keras вентили идут в порядке i, f, c, o; при загрузке они
+    переставляются в i, f, o, c, чтобы функция вентилей применялась к одному срезу"""
+
+    def __init__(self, config, kernel, recurrent_kernel, bias):
+        for key, expected in (('go_backwards', False), ('stateful', False), ('return_state', False),
+                              ('use_bias', True)):
+            if config.get(key, expected) != expected:
+                raise UnsupportedModel(f"LSTM {key}={config.get(key)}")
+        self.units = units = config['units']
+        self.return_sequences = config['return_sequences']
+        self.activation = _activation(config['activation'])
+        self.recurrent_activation = _activation(config['recurrent_activation'])
+        order = np.r_[0:2 * units, 3 * units:4 * units, 2 * units:3 * units]
+        self.kernel = np.ascontiguousarray(kernel[:, order])
+        self.recurrent_kernel = np.ascontiguousarray(recurrent_kernel[:, order])
+        self.bias = bias[order]
+
+    def __call__(self, x):
+        batch, steps, _ = x.shape
+        units = self.units
+        # Входная часть всех шагов - одно матричное умножение; в цикле по шагам остаётся только h @ U
+        projected = (x.reshape(batch * steps, x.shape[-1]) @ self.kernel + self.bias).reshape(batch, steps, 4 * units)
+        h = np.zeros((batch, units), dtype=np.float32)
+        c = np.zeros((batch, units), dtype=np.float32)
+        outputs = np.empty((batch, steps, units), dtype=np.float32) if self.return_sequences else None
+        for t in range(steps):
+            z = projected[:, t] + h @ self.recurrent_kernel
+            gates = self.recurrent_activation(z[:, :3 * units])
+            c = gates[:, units:2 * units] * c + gates[:, :units] * self.activation(z[:, 3 * units:])
+            h = gates[:, 2 * units:] * self.activation(c)
+            if outputs is not None:
+                outputs[:, t] = h
+        return outputs if outputs is not None else h
+
+
+class DenseLayer:
+    def __init__(self, config, kernel, bias=None):
+        self.activation = _activation(config['activation'])
+        self.kernel = kernel
+        self.bias = bias
+
+    def __call__(self, x):
+        y = x @ self.kernel
+        if self.bias is not None:
+            y += self.bias
+        return self.activation(y)
+
+
+def _snake_case(name):
+    # Как keras.src.utils.naming.to_snake_case
+    name = re.sub(r"(.)([A-Z][a-z]+)", r"\1_\2", re.sub(r"\W+", "", name))
+    return re.sub(r"([a-z])([A-Z])", r"\1_\2", name).lower()
+
+
+def _layer_keys(layers):
+    """Пути весов слоёв в model.weights.h5: имя класса в snake_case и номер среди слоёв того же класса
+    (lstm, lstm_1, dense, dense_1...), а не имя слоя из конфигурации"""
+    seen = {}
+    keys = []
+    for layer in layers:
+        base = _snake_case(layer['class_name'])
+        count = seen.get(base, 0)
+        seen[base] = count + 1
+        keys.append(f"layers/{base}" if count == 0 else f"layers/{base}_{count}")
+    return keys
+
+
+class NumpySequential:
+    """Модель Sequential из LSTM, Dropout и Dense для предсказания на NumPy.
+
+    predict и input_shape совместимы с моделью Keras в местах, где модель только
+    предсказывает (RealDataRetrainer.predict_with_temperature, predict/, score_fleet).
+    """
+
+    def __init__(self, layers, input_shape):
+        self.layers = layers
+        self.input_shape = input_shape
+
+    @classmethod
+    def from_keras(cls, path):
+        """Архитектура из config.json и веса из model.weights.h5 файла .keras"""
+        import h5py
+        with zipfile.ZipFile(path) as archive:
+            config = json.loads(archive.read('config.json'))
+            weights = archive.read('model.weights.h5')
+        if config.get('class_name') != 'Sequential':
+            raise UnsupportedModel(f"модель {config.get('class_name')}")
+        layer_configs = config['config']['layers']
+        layers = []
+        with h5py.File(io.BytesIO(weights), 'r') as h5:
+            # InputLayer не сохраняет весов и не участвует в нумерации путей
+            stored = [layer for layer in layer_configs if layer['class_name'] != 'InputLayer']
+            for layer, key in zip(stored, _layer_keys(stored)):
+                name, layer_config = layer['class_name'], layer['config']
+                if layer_config.get('dtype', {}).get('config', {}).get('name', 'float32') != 'float32':
+                    raise UnsupportedModel(f"тип данных слоя {layer_config['name']}")
+                if name == 'LSTM':
+                    variables = h5[f"{key}/cell/vars"]
+                    layers.append(LSTMLayer(layer_config, *(np.asarray(variables[str(i)], dtype=np.float32)
+                                                            for i in range(3))))
+                elif name == 'Dense':
+                    variables = h5[f"{key}/vars"]
+                    layers.append(DenseLayer(layer_config, *(np.asarray(variables[str(i)], dtype=np.float32)
+                                                             for i in range(len(variables)))))
+                elif name != 'Dropout':
+                    # Dropout при предсказании ничего не делает
+                    raise UnsupportedModel(f"слой {name}")
+        first = layer_configs[0]
+        if first['class_name'] == 'InputLayer':
+            input_shape = tuple(first['config']['batch_shape'])
+        else:
+            input_shape = tuple(first.get('build_config', {}).get('input_shape') or ())
+        return cls(layers, input_shape)
+
+    def predict(self, x, batch_size=1024, verbose=0):
+        """Выход модели для пакета окон (batch, шаги, признаки); пакет считается частями по batch_size"""
+        x = np.asarray(x, dtype=np.float32)
+        batch_size = batch_size or max(len(x), 1)
+        outputs = []
+        # Пустой пакет тоже проходит слои: форма результата (0, классы), как у Keras
+        for start in range(0, len(x) or 1, batch_size):
+            y = x[start:start + batch_size]
+            for layer in self.layers:
+                y = layer(y)
+            outputs.append(y)
+        return np.concatenate(outputs)
@@ -0,0 +1,133 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import Detector, DetectorData, HouseAlerts
+from .signals import detector_data_ingested, house_alerts_created
+from .thresholds import threshold_index
+from .rollups import update_rollups
+import pandas as pd
+import numpy as np
+
+
+class BatchFormatError(ValueError):
+    """Пакет показаний имеет неверный формат"""
+
+
+def parse_batch(payload):
+    """Приводит пакет показаний (массив записей или колонки) к DataFrame"""
+    if isinstance(payload, list):
+        if not all(isinstance(row, dict) for row in payload):
+            raise BatchFormatError("Элементы массива должны быть объектами")
+        return pd.DataFrame({
+            'detector_id': [row.get('detector_id') for row in payload],
+            'timestamp': [row.get('timestamp') for row in payload],
+            'value': [row.get('value') for row in payload],
+        })
+    if isinstance(payload, dict):
+        if 'detector_ids' not in payload or 'values' not in payload:
+            raise BatchFormatError("Нужны поля detector_ids и values")
+        detector_ids = payload['detector_ids']
+        values = payload['values']
+        timestamps = payload.get('timestamps')
+        if not isinstance(detector_ids, list) or not isinstance(values, list) or not isinstance(timestamps, (list, type(None))):
+            raise BatchFormatError("detector_ids, timestamps и values должны быть массивами")
+        # Без timestamps показания получают текущее время; пустой массив - ошибка длины
+        if timestamps is None:
+            timestamps = [None] * len(detector_ids)
+        if not len(detector_ids) == len(values) == len(timestamps):
+            raise BatchFormatError("Длины detector_ids, timestamps и values не совпадают")
+        return pd.DataFrame({'detector_id': detector_ids, 'timestamp': timestamps, 'value': values})
+    raise BatchFormatError("Ожидается массив записей или объект с колонками")
+
+
+def _parse_timestamps(raw):
+    """Разбор меток времени; пустые заменяются текущим временем"""
+    missing = raw.isna()
+    text = raw[~missing].astype(str).str.strip()
+    parsed = pd.Series(pd.NaT, index=raw.index, dtype='datetime64[ns]')
+    # Метки со смещением часового пояса приводим к локальному времени проекта
+    aware = text.str.contains(r'(?:Z|[+-]\d{2}:?\d{2})$', regex=True)
+    if aware.any():
+        parsed[aware[aware].index] = (
+            pd.to_datetime(text[aware], errors='coerce', format='mixed', utc=True)
+            .dt.tz_convert(settings.TIME_ZONE).dt.tz_localize(None)
+        )
+    if (~aware).any():
+        parsed[aware[~aware].index] = pd.to_datetime(text[~aware], errors='coerce', format='mixed')
+    parsed[missing] = pd.Timestamp(timezone.now())
+    return parsed, missing
+
+
+def validate_batch(frame):
+    """Векторная проверка пакета; возвращает корректные строки и причины отказа"""
+    reasons = pd.Series('', index=frame.index, dtype=object)
+
+    detector_id = pd.to_numeric(frame['detector_id'], errors='coerce')
+    bad_id = detector_id.isna() | (detector_id <= 0) | (detector_id % 1 != 0)
+    reasons[bad_id] = 'invalid detector_id'
+
+    value = pd.to_numeric(frame['value'], errors='coerce')
+    bad_value = value.isna() | ~np.isfinite(value.fillna(0))
+    reasons[bad_value & (reasons == '')] = 'invalid value'
+
+    timestamp, missing = _parse_timestamps(frame['timestamp'])
+    bad_timestamp = timestamp.isna() & ~missing
+    reasons[bad_timestamp & (reasons == '')] = 'invalid timestamp'
+
+    # Одна выборка для проверки существования всех датчиков пакета
+    candidate_ids = detector_id[reasons == ''].astype('int64')
+    known_ids = np.fromiter(
+        Detector.objects.filter(id__in=candidate_ids.unique().tolist()).values_list('id', flat=True),
+        dtype='int64',
+    )
+    unknown = (reasons == '') & ~detector_id.isin(known_ids)
+    reasons[unknown] = 'unknown detector_id'
+
+    accepted = reasons == ''
+    valid = pd.DataFrame({
+        'detector_id': detector_id[accepted].astype('int64'),
+        'timestamp': timestamp[accepted],
+        'value': value[accepted].astype('float64'),
+    })
+    rejected = reasons[~accepted]
+    return valid, rejected
+
+
+def ingest_batch(payload, batch_size=None):
+    """Проверка и запись пакета показаний через bulk_create порциями"""
+    if batch_size is None:
+        batch_size = settings.DETECTOR_DATA_BULK_BATCH_SIZE
+    frame = parse_batch(payload)
+    valid, rejected = validate_batch(frame)
+    objects = [
+        DetectorData(detector_id_id=detector_id, timestamp=timestamp, value=value)
+        for detector_id, timestamp, value in zip(
+            valid['detector_id'].tolist(),
+            valid['timestamp'].astype(object).tolist(),
+            valid['value'].tolist(),
+        )
+    ]
+    # Часовые агрегаты пишутся в той же транзакции, что и показания
+    with transaction.atomic():
+        created = DetectorData.objects.bulk_create(objects, batch_size=batch_size)
+        if created:
+            update_rollups(valid)
+    house_alerts, alerts = [], []
+    if created:
+        detector_data_ingested.send(
+            sender=DetectorData,
+            detector_ids=sorted(set(valid['detector_id'].tolist())),
+            count=len(created),
+            last_timestamp=max(obj.timestamp for obj in created),
+        )
+        # Пороги проверяются по уже разобранному пакету, без запросов на каждое показание
+        house_alerts, alerts = threshold_index.check(valid)
+        house_alerts_created.send(sender=HouseAlerts, alerts=house_alerts)
+    return {
+        "status": "Success",
+        "total": len(frame),
+        "accepted": len(created),
+        "rejected": len(rejected),
+        "alerts": len(alerts),
+        "rejected_rows": [{"row": int(row), "reason": reason} for row, reason in rejected.items()],
+    }
@@ -0,0 +1,186 @@
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from .models import DetectorsAtHouse, TrainingJob, ModelForHouse
+from .events import publish_event
+from .metrics import registry, stage_timer
+from .loaders import iter_house_frames
+from datetime import timedelta
+import json
+import os
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+# Доля общего прогресса, достигнутая к началу этапа; этап fit растягивается по эпохам
+STAGE_PROGRESS = {'data': 0.0, 'features': 0.05, 'sequences': 0.1, 'fit': 0.15, 'evaluate': 0.9, 'save': 0.95}
+FIT_SHARE = STAGE_PROGRESS['evaluate'] - STAGE_PROGRESS['fit']
+
+
+def submit_job(house_id, epochs=8, days_back=30, incremental=False):
+    """Ставит обучение дома в очередь; если задача для дома уже выполняется, возвращает её.
+
+    incremental - дообучить текущую модель дома на данных после её обучения
+    """
+    active = TrainingJob.objects.filter(house_id=house_id, status__in=ACTIVE_STATUSES).order_by('-id').first()
+    if active is not None:
+        return active
+    return TrainingJob.objects.create(house_id_id=int(house_id), epochs=epochs, days_back=days_back,
+                                      incremental=incremental)
+
+
+def cancel_job(job):
+    """Отмена задачи: из очереди снимается сразу, выполняющаяся прерывается после текущей эпохи"""
+    if job.status == 'queued':
+        TrainingJob.objects.filter(id=job.id, status='queued').update(status='cancelled', finished=timezone.now())
+    elif job.status == 'running':
+        TrainingJob.objects.filter(id=job.id).update(cancel_requested=True)
+    job.refresh_from_db()
+    return job
+
+
+def job_state(job):
+    """Состояние задачи для JSON-ответа; status совместим с ответом train_model"""
+    state = {
+        "status": {'success': "Success", 'error': "Error", 'cancelled': "Cancelled"}.get(job.status, "Pending"),
+        "job_id": job.id,
+        "house_id": job.house_id_id,
+        "job_status": job.status,
+        "stage": job.stage,
+        "epoch": job.epoch,
+        "epochs": job.epochs,
+        "incremental": job.incremental,
+        "progress": round(job.progress, 3),
+        "cancel_requested": job.cancel_requested,
+        "created": str(job.created),
+        "started": str(job.started) if job.started else None,
+        "finished": str(job.finished) if job.finished else None,
+    }
+    if job.result:
+        result = json.loads(job.result)
+        # Поля результата retrain_model (retrain_date, test_accuracy, message...) отдаются как есть
+        state.update({key: value for key, value in result.items() if key != "status"})
+    return state
+
+
+def publish_job(job_id):
+    """Событие training_job с текущим состоянием задачи для подписчиков /events/"""
+    job = TrainingJob.objects.get(id=job_id)
+    publish_event(job.house_id_id, 'training_job', job_state(job))
+
+
+def claim_job(job_id):
+    """Атомарно переводит задачу из очереди в работу; False, если её уже забрали или отменили"""
+    now = timezone.now()
+    return TrainingJob.objects.filter(id=job_id, status='queued').update(
+        status='running', started=now, heartbeat=now) == 1
+
+
+def beat_jobs(job_ids):
+    """Отметка процесса, выполняющего задачи job_ids: он жив"""
+    TrainingJob.objects.filter(id__in=job_ids, status='running').update(heartbeat=timezone.now())
+
+
+def reap_stale_jobs(timeout=None):
+    """Помечает ошибкой задачи в работе без отметки дольше timeout секунд; возвращает их число.
+
+    Задачи других живых воркеров отмечаются и не затрагиваются.
+    """
+    if timeout is None:
+        timeout = settings.TRAINING_JOB_TIMEOUT
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    # Задачи без отметки - взятые до её появления
+    stale = Q(status='running') & (Q(heartbeat__lt=cutoff) | Q(heartbeat__isnull=True, started__lt=cutoff))
+    reaped = 0
+    for job_id in TrainingJob.objects.filter(stale).values_list('id', flat=True):
+        if TrainingJob.objects.filter(stale, id=job_id).update(
+                status='error', finished=timezone.now(),
+                result='{"status": "Error", "message": "Воркер был остановлен"}'):
+            publish_job(job_id)
+            reaped += 1
+    return reaped
+
+
+def finish_job(job_id, status, result):
+    fields = dict(status=status, result=json.dumps(result), finished=timezone.now())
+    if status == 'success':
+        fields['progress'] = 1.0
+    TrainingJob.objects.filter(id=job_id).update(**fields)
+    publish_job(job_id)
+
+
+def run_queued_job(job_id):
+    """Забирает задачу из очереди и выполняет её; False, если задачу забрали или отменили раньше"""
+    if not claim_job(job_id):
+        return False
+    run_training_job(job_id)
+    return True
+
+
+def run_training_job(job_id):
+    """Тело задачи обучения; выполняется в процессе пула"""
+    from .views import prepare_data
+    from .ml import retrain_model, TrainingCancelled
+    from .training import EpochProgress
+
+    job = TrainingJob.objects.get(id=job_id)
+    TrainingJob.objects.filter(id=job_id).update(pid=os.getpid(), stage='data', progress=STAGE_PROGRESS['data'])
+
+    def cancelled():
+        return TrainingJob.objects.filter(id=job_id, cancel_requested=True).exists()
+
+    def on_stage(stage):
+        if cancelled():
+            raise TrainingCancelled("Обучение отменено")
+        TrainingJob.objects.filter(id=job_id).update(stage=stage, progress=STAGE_PROGRESS[stage], heartbeat=timezone.now())
+        publish_job(job_id)
+
+    def on_epoch(epoch, logs):
+        TrainingJob.objects.filter(id=job_id).update(
+            epoch=epoch, progress=STAGE_PROGRESS['fit'] + FIT_SHARE * epoch / job.epochs, heartbeat=timezone.now())
+        publish_job(job_id)
+        return not cancelled()
+
+    detectors_list = DetectorsAtHouse.objects.filter(house_id=job.house_id_id)
+    if not len(detectors_list):
+        finish_job(job_id, 'error', {"status": "Error", "message": "Bad request. No detectors"})
+        return
+
+    def full_data():
+        return prepare_data(job.house_id_id, detectors_list, days_back=job.days_back)
+
+    stream = None
+    if job.days_back >= settings.TRAINING_STREAM_DAYS:
+        # Длинная история не загружается целиком: обучение по частям
+        def stream():
+            return iter_house_frames(job.house_id_id, detectors_list, days_back=job.days_back,
+                                     chunk_days=settings.TRAINING_CHUNK_DAYS)
+
+    base_model, since = None, None
+    if job.incremental:
+        current = (ModelForHouse.objects.filter(house_id=job.house_id_id).select_related('model_id')
+                   .order_by('-timestamp').first())
+        if current is not None:
+            base_model, since = current.model_id, current.model_id.timestamp
+    try:
+        with stage_timer('training', 'data'):
+            if base_model is not None:
+                # Сутки до обучения модели - предыстория для признаков и окон первых новых строк
+                data = prepare_data(job.house_id_id, detectors_list,
+                                    days_back=min(job.days_back, (timezone.now() - since).days + 1))
+            elif stream is None:
+                data = full_data()
+            else:
+                data = None
+        result = json.loads(retrain_model(data, days_back=job.days_back, epochs=job.epochs, house_id=job.house_id_id,
+                                          on_stage=on_stage, callbacks=[EpochProgress(on_epoch)],
+                                          base_model=base_model, since=since, full_data=full_data,
+                                          stream=stream))
+    finally:
+        # Процесс пула завершается через os._exit, минуя atexit
+        registry.flush()
+    if result.get("status") == "Success":
+        finish_job(job_id, 'success', result)
+    elif cancelled():
+        finish_job(job_id, 'cancelled', {"status": "Cancelled", "message": "Обучение отменено"})
+    else:
+        finish_job(job_id, 'error', result)
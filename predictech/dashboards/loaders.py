@@ -0,0 +1,144 @@
+from .models import DetectorData, DetectorDataHourly, StateLabel
+from .utils import period_start
+from datetime import datetime, timedelta
+import pandas as pd
+import numpy as np
+
+# Размер порции при потоковом чтении показаний из курсора БД
+FETCH_CHUNK_SIZE = 2000
+
+READINGS_DTYPE = [('detector_id', 'i8'), ('timestamp', 'M8[us]'), ('value', 'f8')]
+LABELS_DTYPE = [('timestamp', 'M8[us]'), ('state', 'O')]
+
+
+def fetch_readings(detector_ids, start, end=None):
+    """Показания всех датчиков одним запросом в структурированный массив NumPy; end - не включая"""
+    rows = DetectorData.objects.filter(detector_id__in=detector_ids, timestamp__gte=start)
+    if end is not None:
+        rows = rows.filter(timestamp__lt=end)
+    rows = (rows
+            .values_list('detector_id', 'timestamp', 'value')
+            .iterator(chunk_size=FETCH_CHUNK_SIZE))
+    return np.fromiter(rows, dtype=READINGS_DTYPE)
+
+
+def fetch_hourly(detector_ids, start, end=None, field='mean'):
+    """Часовые агрегаты DetectorDataHourly в массиве того же вида, что fetch_readings: метка
+    времени - начало часа, значение - агрегат field (mean, min, max, last)"""
+    rows = DetectorDataHourly.objects.filter(detector_id__in=detector_ids, hour__gte=start)
+    if end is not None:
+        rows = rows.filter(hour__lt=end)
+    rows = (rows
+            .values_list('detector_id', 'hour', field)
+            .iterator(chunk_size=FETCH_CHUNK_SIZE))
+    return np.fromiter(rows, dtype=READINGS_DTYPE)
+
+
+def fetch_labels(house, start, end=None):
+    """Метки состояния дома одним запросом в структурированный массив NumPy; end - не включая"""
+    rows = StateLabel.objects.filter(house_id=house, timestamp__gte=start)
+    if end is not None:
+        rows = rows.filter(timestamp__lt=end)
+    rows = (rows
+            .values_list('timestamp', 'state')
+            .iterator(chunk_size=FETCH_CHUNK_SIZE))
+    return np.fromiter(rows, dtype=LABELS_DTYPE)
+
+
+def pivot_readings(readings, detectors):
+    """Разворот показаний в широкую таблицу: строка на метку времени, столбец на датчик дома"""
+    timestamps, rows = np.unique(readings['timestamp'], return_inverse=True)
+    values = np.full((len(timestamps), len(detectors)), np.nan)
+    for column, (detector_id, _) in enumerate(detectors):
+        mask = readings['detector_id'] == detector_id
+        values[rows[mask], column] = readings['value'][mask]
+    return pd.DataFrame(
+        values,
+        index=pd.DatetimeIndex(timestamps.astype('M8[ns]'), name='timestamp'),
+        columns=[name for _, name in detectors],
+    )
+
+
+def _labels_series(labels):
+    return pd.Series(labels['state'], index=pd.DatetimeIndex(labels['timestamp'].astype('M8[ns]'), name='timestamp'), name='label')
+
+
+def _hourly_labels(labels):
+    # Последняя метка каждого часа
+    labels = labels.sort_index(kind='stable')
+    return labels.groupby(labels.index.floor('h')).last().rename_axis('timestamp')
+
+
+def load_house_frame(house, detectors_list, days_back=30, hourly=False):
+    """Показания датчиков дома и метки состояния за days_back дней в одной широкой таблице.
+
+    hourly - строка на час: средние из часовых агрегатов DetectorDataHourly вместо исходных
+    показаний и последняя метка состояния часа.
+    """
+    start = period_start(days_back)
+    detectors = [(detector.detector_id_id, detector.name) for detector in detectors_list]
+    detector_ids = [detector_id for detector_id, _ in detectors]
+    labels = _labels_series(fetch_labels(house, start))
+    if hourly:
+        return _join_labels(pivot_readings(fetch_hourly(detector_ids, start), detectors), _hourly_labels(labels))
+    return _join_labels(pivot_readings(fetch_readings(detector_ids, start), detectors), labels)
+
+
+def _join_labels(data, labels):
+    # Строки по возрастанию времени: последние строки таблицы - последние показания
+    data = data.join(labels, how='outer').sort_index(kind='stable')
+    data.index.name = 'timestamp'
+    return data.reset_index()
+
+
+def iter_house_frames(house, detectors_list, days_back=30, chunk_days=30, now=None):
+    """Таблица load_house_frame по частям за chunk_days дней (от старых к новым), без сборки
+    всей таблицы в памяти"""
+    start = period_start(days_back, now)
+    detectors = [(detector.detector_id_id, detector.name) for detector in detectors_list]
+    detector_ids = [detector_id for detector_id, _ in detectors]
+    bounds = [start]
+    end = period_start(-1, now)
+    while bounds[-1] + timedelta(days=chunk_days) < end:
+        bounds.append(bounds[-1] + timedelta(days=chunk_days))
+    # Последняя часть без верхней границы, как load_house_frame
+    for lo, hi in zip(bounds, bounds[1:] + [None]):
+        data = _join_labels(pivot_readings(fetch_readings(detector_ids, lo, hi), detectors),
+                            _labels_series(fetch_labels(house, lo, hi)))
+        if len(data):
+            yield data
+
+
+def fetch_tail(detector_id, rows, start):
+    """Последние rows показаний датчика не раньше start (ORDER BY timestamp DESC LIMIT rows)
+    в массиве вида fetch_readings, по возрастанию времени"""
+    rows = (DetectorData.objects
+            .filter(detector_id=detector_id, timestamp__gte=start)
+            .order_by('-timestamp')
+            .values_list('detector_id', 'timestamp', 'value')[:rows])
+    return np.fromiter(rows, dtype=READINGS_DTYPE)[::-1]
+
+
+def load_house_tail(house, detectors_list, rows, days_back=30, reject=None):
+    """Последние строки таблицы load_house_frame: не меньше rows показаний на датчик.
+
+    У каждого датчика читаются его последние rows показаний; таблица обрезается по самому
+    позднему началу этих хвостов, поэтому совпадает с концом полной таблицы.
+    Возвращает (data, complete); complete - прочитан весь период. Если reject от хвоста
+    вернул True, возвращается (None, False).
+    """
+    start = period_start(days_back)
+    detectors = [(detector.detector_id_id, detector.name) for detector in detectors_list]
+    tails = [fetch_tail(detector_id, rows, start) for detector_id, _ in detectors]
+    # У датчика с числом показаний меньше rows прочитан весь период
+    starts = [tail['timestamp'][0] for tail in tails if len(tail) == rows]
+    readings = np.concatenate(tails) if tails else np.empty(0, dtype=READINGS_DTYPE)
+    if not starts:
+        return _join_labels(pivot_readings(readings, detectors), _labels_series(fetch_labels(house, start))), True
+    cutoff = max(starts)
+    readings = readings[readings['timestamp'] >= cutoff]
+    labels = _labels_series(fetch_labels(house, cutoff.astype(datetime)))
+    tail = _join_labels(pivot_readings(readings, detectors), labels)
+    if reject is not None and reject(tail):
+        return None, False
+    return tail, False
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from dashboards.fleet import generate_fleet, delete_fleet, FLEET_PREFIX
+import time
+
+
+class Command(BaseCommand):
+    help = "Синтетические дома с датчиками, показаниями и метками состояния для нагрузочных проверок"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--houses', type=int, default=10, help="Количество домов")
+        parser.add_argument('--days', type=int, default=30, help="Глубина истории в днях")
+        parser.add_argument('--freq', type=int, default=60, help="Интервал показаний, мин")
+        parser.add_argument('--anomaly-share', type=float, default=0.1, help="Доля времени в эпизодах аномалий")
+        parser.add_argument('--seed', type=int, default=0, help="Зерно генератора случайных чисел")
+        parser.add_argument('--no-labels', action='store_true', help="Не создавать метки состояния")
+        parser.add_argument('--prefix', default=FLEET_PREFIX, help="Префикс имён домов")
+        parser.add_argument('--clear', action='store_true', help="Удалить ранее созданные дома с этим префиксом")
+
+    def handle(self, *args, **options):
+        if options['freq'] <= 0 or 60 * 24 % options['freq']:
+            raise CommandError("--freq должен быть делителем 1440 минут")
+        if options['clear']:
+            self.stdout.write(f"Удалено объектов: {delete_fleet(options['prefix'])}")
+        if options['houses'] <= 0:
+            return
+        started = time.perf_counter()
+        with transaction.atomic():
+            houses = generate_fleet(options['houses'], days=options['days'], freq_minutes=options['freq'],
+                                    seed=options['seed'], labels=not options['no_labels'],
+                                    anomaly_share=options['anomaly_share'], prefix=options['prefix'])
+        steps = options['days'] * 24 * 60 // options['freq']
+        self.stdout.write(f"Создано домов: {len(houses)} ({houses[0].name} - {houses[-1].name}), "
+                          f"показаний: {len(houses) * steps * 4}, за {time.perf_counter() - started:.1f} с")
@@ -0,0 +1,137 @@
+from concurrent.futures import wait, FIRST_COMPLETED
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from dashboards.jobs import submit_job, finish_job, cancel_job, run_queued_job, beat_jobs
+from dashboards.models import House, DetectorsAtHouse, StateLabel, TrainingJob
+from dashboards.utils import period_start
+from dashboards.workers import worker_pool, available_cpus
+import json
+import time
+
+
+class Command(BaseCommand):
+    help = ("Переобучение моделей многих домов в пуле процессов. Ядра делятся между процессами: "
+            "каждый процесс получает свою долю потоков TensorFlow")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--house', type=int, action='append', help="id дома (можно несколько); по умолчанию все дома с метками")
+        parser.add_argument('--prefix', help="Только дома, имя которых начинается с префикса")
+        parser.add_argument('--processes', type=int, help="Процессов обучения (по умолчанию min(домов, ядер))")
+        parser.add_argument('--threads', type=int, help="Потоков TensorFlow на процесс (по умолчанию ядра / процессы)")
+        parser.add_argument('--epochs', type=int, default=8, help="Количество эпох")
+        parser.add_argument('--days-back', type=int, default=30, help="Глубина данных для обучения, дней")
+        parser.add_argument('--incremental', action='store_true',
+                            help="Дообучить текущие модели домов на новых данных (при смене признаков или классов - обучение заново)")
+        parser.add_argument('--min-labels', type=int, default=50, help="Минимум меток состояния за период")
+        parser.add_argument('--deadline', type=float, help="Окно переобучения, мин: после него задачи из очереди снимаются")
+        parser.add_argument('--output', help="Файл JSON с отчётом по домам")
+
+    def houses(self, options):
+        """Дома с датчиками и метками за период, начиная с домов с наибольшим числом меток.
+
+        Самые долгие задачи запускаются первыми: общий срок меньше зависит от порядка
+        """
+        houses = House.objects.filter(id__in=DetectorsAtHouse.objects.values('house_id'))
+        if options['house']:
+            houses = houses.filter(id__in=options['house'])
+        if options['prefix']:
+            houses = houses.filter(name__startswith=options['prefix'])
+        labels = dict(StateLabel.objects.filter(timestamp__gte=period_start(options['days_back']), house_id__in=houses)
+                      .values_list('house_id').annotate(count=Count('id')).values_list('house_id', 'count'))
+        return sorted(((house_id, count) for house_id, count in labels.items() if count >= options['min_labels']),
+                      key=lambda item: (-item[1], item[0]))
+
+    def handle(self, *args, **options):
+        houses = self.houses(options)
+        if not houses:
+            raise CommandError("Нет домов с датчиками и метками состояния за период")
+        cpus = available_cpus()
+        processes = options['processes'] or min(len(houses), cpus)
+        threads = options['threads'] or max(1, cpus // processes)
+        labels = dict(houses)
+
+        jobs = []
+        for house_id, _ in houses:
+            job = submit_job(house_id, epochs=options['epochs'], days_back=options['days_back'],
+                             incremental=options['incremental'])
+            if job.status != 'queued':
+                self.stdout.write(f"Дом {house_id}: уже обучается (задача {job.id}), пропущен")
+                continue
+            jobs.append(job.id)
+        self.stdout.write(f"Домов: {len(jobs)}, ядер: {cpus}, процессов: {processes}, потоков на процесс: {threads}")
+
+        started = time.perf_counter()
+        deadline = started + options['deadline'] * 60 if options['deadline'] else None
+        pool = worker_pool(processes, threads)
+        futures = {pool.submit(run_queued_job, job_id): job_id for job_id in jobs}
+        pending = set(futures)
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+                beat_jobs(jobs)
+                for future in done:
+                    job_id = futures[future]
+                    error = future.exception()
+                    if error is not None:
+                        finish_job(job_id, 'error', {"status": "Error", "message": str(error)})
+                    job = TrainingJob.objects.get(id=job_id)
+                    self.stdout.write(f"Дом {job.house_id_id}: {job.status}, {time.perf_counter() - started:.1f} с от начала")
+                if deadline is not None and time.perf_counter() > deadline:
+                    deadline = None
+                    expired = TrainingJob.objects.filter(id__in=jobs, status='queued')
+                    for job in expired:
+                        cancel_job(job)
+                    self.stdout.write(f"Окно переобучения истекло, снято из очереди: {len(expired)}")
+        except KeyboardInterrupt:
+            # Процессы пула получают тот же сигнал; их задачи не будут завершены
+            for job in TrainingJob.objects.filter(id__in=jobs, status='queued'):
+                cancel_job(job)
+            TrainingJob.objects.filter(id__in=jobs, status='running').update(
+                status='error', result='{"status": "Error", "message": "Переобучение прервано"}')
+            raise
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+        elapsed = time.perf_counter() - started
+
+        report = []
+        for job in TrainingJob.objects.filter(id__in=jobs).order_by('id'):
+            wall = (job.finished - job.started).total_seconds() if job.started and job.finished else None
+            try:
+                result = json.loads(job.result) if job.result else {}
+            except ValueError:
+                result = {}
+            report.append({
+                'house_id': job.house_id_id,
+                'job_id': job.id,
+                'labels': labels[job.house_id_id],
+                'status': job.status,
+                'wall_s': round(wall, 2) if wall is not None else None,
+                'mode': result.get('mode'),
+                'test_accuracy': result.get('test_accuracy'),
+                'message': result.get('message') if job.status != 'success' else None,
+            })
+
+        self.stdout.write(f"{'дом':>6} {'меток':>7} {'статус':>10} {'режим':>12} {'время, с':>9} {'точность':>9}")
+        for row in report:
+            wall = f"{row['wall_s']:.1f}" if row['wall_s'] is not None else '-'
+            accuracy = f"{row['test_accuracy']:.4f}" if row['test_accuracy'] is not None else '-'
+            self.stdout.write(f"{row['house_id']:>6} {row['labels']:>7} {row['status']:>10} {row['mode'] or '-':>12} "
+                              f"{wall:>9} {accuracy:>9}")
+        walls = [row['wall_s'] for row in report if row['wall_s'] is not None]
+        summary = {
+            'houses': len(report),
+            'success': sum(row['status'] == 'success' for row in report),
+            'cpus': cpus,
+            'processes': processes,
+            'threads': threads,
+            'epochs': options['epochs'],
+            'elapsed_s': round(elapsed, 2),
+            'sum_wall_s': round(sum(walls), 2),
+            'max_wall_s': round(max(walls), 2) if walls else None,
+        }
+        self.stdout.write(f"Успешно: {summary['success']} из {summary['houses']}, общее время {summary['elapsed_s']} с, "
+                          f"сумма по домам {summary['sum_wall_s']} с, самый долгий дом {summary['max_wall_s']} с")
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'summary': summary, 'houses': report}, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Отчёт: {options['output']}")
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+from dashboards.models import Detector, DetectorData, DetectorsAtHouse
+from dashboards.rollups import rebuild_rollups
+from dashboards.utils import period_start
+from datetime import timedelta
+import time
+
+
+class Command(BaseCommand):
+    help = ("Пересчёт часовых агрегатов DetectorDataHourly по исходным показаниям: заполнение для "
+            "существующих данных и исправление после удаления или правки показаний")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--detector', type=int, action='append', help="id датчика (можно несколько); по умолчанию все датчики")
+        parser.add_argument('--house', type=int, action='append', help="Датчики дома (можно несколько)")
+        parser.add_argument('--days-back', type=int, help="Глубина пересчёта, дней; по умолчанию вся история")
+        parser.add_argument('--chunk-days', type=int, default=30, help="Показания читаются частями по столько дней")
+
+    def handle(self, *args, **options):
+        if options['chunk_days'] <= 0:
+            raise CommandError("--chunk-days должен быть положительным")
+        detectors = Detector.objects.all()
+        if options['detector']:
+            detectors = detectors.filter(id__in=options['detector'])
+        if options['house']:
+            detectors = detectors.filter(id__in=DetectorsAtHouse.objects.filter(house_id__in=options['house'])
+                                         .values('detector_id'))
+        detector_ids = list(detectors.order_by('id').values_list('id', flat=True))
+        if not detector_ids:
+            raise CommandError("Нет датчиков для пересчёта")
+
+        started = time.perf_counter()
+        total_readings = total_hours = 0
+        for detector_id in detector_ids:
+            if options['days_back'] is not None:
+                start = period_start(options['days_back'])
+            else:
+                start = DetectorData.objects.filter(detector_id=detector_id).aggregate(first=Min('timestamp'))['first']
+                if start is None:
+                    continue
+            # Части по chunk_days дней; последняя без верхней границы, чтобы учесть показания с будущим временем
+            bounds = [start]
+            now = timezone.now()
+            while bounds[-1] + timedelta(days=options['chunk_days']) < now:
+                bounds.append(bounds[-1] + timedelta(days=options['chunk_days']))
+            readings = hours = 0
+            for lo, hi in zip(bounds, bounds[1:] + [None]):
+                chunk_readings, chunk_hours = rebuild_rollups(detector_id, lo, hi)
+                readings += chunk_readings
+                hours += chunk_hours
+            total_readings += readings
+            total_hours += hours
+            self.stdout.write(f"Датчик {detector_id}: показаний {readings}, часов {hours}")
+        self.stdout.write(f"Датчиков: {len(detector_ids)}, показаний: {total_readings}, часов: {total_hours}, "
+                          f"за {time.perf_counter() - started:.1f} с")
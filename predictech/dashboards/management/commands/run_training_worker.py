@@ -0,0 +1,56 @@
+from concurrent.futures.process import BrokenProcessPool
+from django.core.management.base import BaseCommand
+from dashboards.jobs import claim_job, finish_job, run_training_job, beat_jobs, reap_stale_jobs
+from dashboards.models import TrainingJob
+from dashboards.workers import worker_pool, available_cpus
+import time
+
+
+class Command(BaseCommand):
+    help = "Воркер очереди обучения моделей: выполняет TrainingJob в отдельных процессах"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help="Количество процессов обучения")
+        parser.add_argument('--threads', type=int, help="Потоков TensorFlow на процесс (по умолчанию ядра делятся поровну)")
+        parser.add_argument('--poll', type=float, default=2.0, help="Интервал опроса очереди, с")
+        parser.add_argument('--once', action='store_true', help="Выполнить текущую очередь и завершиться")
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        threads = options['threads'] or max(1, available_cpus() // workers)
+        pool = worker_pool(workers, threads)
+        running = {}
+        self.stdout.write(f"Воркер обучения запущен, процессов: {workers}, потоков на процесс: {threads}")
+        try:
+            while True:
+                # Задачи остановленных воркеров не будут завершены; задачи живых воркеров
+                # (этого и других) отмечаются каждый опрос
+                beat_jobs(list(running))
+                stale = reap_stale_jobs()
+                if stale:
+                    self.stdout.write(f"Помечено прерванных задач: {stale}")
+                for job_id, future in list(running.items()):
+                    if not future.done():
+                        continue
+                    del running[job_id]
+                    error = future.exception()
+                    if error is not None:
+                        finish_job(job_id, 'error', {"status": "Error", "message": str(error)})
+                        if isinstance(error, BrokenProcessPool):
+                            pool = worker_pool(workers, threads)
+                    self.stdout.write(f"Задача {job_id}: {TrainingJob.objects.get(id=job_id).status}")
+
+                free = workers - len(running)
+                if free > 0:
+                    for job_id in TrainingJob.objects.filter(status='queued').order_by('created', 'id').values_list('id', flat=True)[:free]:
+                        if claim_job(job_id):
+                            running[job_id] = pool.submit(run_training_job, job_id)
+                            self.stdout.write(f"Задача {job_id} запущена")
+
+                if options['once'] and not running:
+                    break
+                time.sleep(options['poll'])
+        except KeyboardInterrupt:
+            self.stdout.write("Остановка воркера...")
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,88 @@
+from collections import defaultdict
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from dashboards.models import DetectorsAtHouse, ModelForHouse
+from dashboards.model_cache import model_cache
+from dashboards.metrics import stage_timer
+import numpy as np
+import time
+
+
+class Command(BaseCommand):
+    help = "Прогноз состояния всех домов с назначенной моделью: один пакетный predict на модель"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--house', type=int, action='append', dest='houses', help="Ограничить прогноз домами (можно несколько)")
+        parser.add_argument('--batch-size', type=int, default=1024, help="Размер батча model.predict")
+        parser.add_argument('--dry-run', action='store_true', help="Не записывать StateLabel")
+
+    def handle(self, *args, **options):
+        from dashboards.ml import prediction_data, prediction_window, save_state_labels
+
+        started = time.perf_counter()
+        assignments = ModelForHouse.objects.select_related('model_id').order_by('model_id', 'house_id')
+        if options['houses']:
+            assignments = assignments.filter(house_id__in=options['houses'])
+        groups = defaultdict(list)
+        saved_models = {}
+        for assignment in assignments:
+            groups[assignment.model_id_id].append(assignment.house_id_id)
+            saved_models[assignment.model_id_id] = assignment.model_id
+
+        detectors = defaultdict(list)
+        for detector in DetectorsAtHouse.objects.filter(house_id__in=[h for houses in groups.values() for h in houses]).order_by('id'):
+            detectors[detector.house_id_id].append(detector)
+
+        timings = defaultdict(float)
+        predictions, skipped = [], []
+        for model_id, house_ids in groups.items():
+            stage = time.perf_counter()
+            with stage_timer('prediction', 'model_load'):
+                predictor = model_cache.get(saved_models[model_id])
+            timings['load_model'] += time.perf_counter() - stage
+
+            windows, targets = [], []
+            for house_id in house_ids:
+                if not detectors[house_id]:
+                    skipped.append((house_id, "нет датчиков"))
+                    continue
+                stage = time.perf_counter()
+                try:
+                    data, features = prediction_data(predictor, house_id, detectors[house_id])
+                except KeyError as e:
+                    skipped.append((house_id, f"нет признака {e}"))
+                    continue
+                finally:
+                    timings['load_data'] += time.perf_counter() - stage
+                if len(features) <= predictor.sequence_length:
+                    skipped.append((house_id, f"недостаточно данных: {len(features)}"))
+                    continue
+                windows.append(prediction_window(predictor, features))
+                targets.append((house_id, (data['timestamp'].max() + timedelta(hours=1)).to_pydatetime()))
+            if not windows:
+                continue
+
+            # Окна всех домов модели складываются в один батч
+            stage = time.perf_counter()
+            with stage_timer('prediction', 'predict'):
+                proba = predictor.model.predict(np.stack(windows), batch_size=options['batch_size'], verbose=0)
+            timings['predict'] += time.perf_counter() - stage
+            states = predictor.label_encoder.inverse_transform(np.argmax(proba, axis=1))
+            for (house_id, timestamp), state, confidence in zip(targets, states, proba.max(axis=1)):
+                predictions.append((house_id, timestamp, state, float(confidence)))
+
+        updated = created = 0
+        if not options['dry_run']:
+            stage = time.perf_counter()
+            with stage_timer('prediction', 'save'):
+                updated, created = save_state_labels(predictions)
+            timings['save'] += time.perf_counter() - stage
+
+        elapsed = time.perf_counter() - started
+        for house_id, reason in skipped:
+            self.stdout.write(f"Дом {house_id} пропущен: {reason}")
+        self.stdout.write(f"Моделей: {len(groups)}, домов с прогнозом: {len(predictions)}, пропущено: {len(skipped)}")
+        self.stdout.write(f"Метки: обновлено {updated}, создано {created}")
+        self.stdout.write("Этапы: " + ", ".join(f"{name} {seconds:.2f} с" for name, seconds in timings.items()))
+        rate = len(predictions) / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(f"Всего {elapsed:.2f} с, {rate:.1f} домов/с"))
@@ -0,0 +1,458 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from contextlib import ContextDecorator
+import contextvars
+import threading
+import socket
+import atexit
+import fcntl
+import json
+import math
+import time
+import os
+
+# Общий файл значений завершившихся процессов и блокировка его записи
+MERGED_NAME = 'metrics_merged.json'
+LOCK_NAME = 'metrics.lock'
+# Границы корзин гистограмм, с
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, math.inf)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, math.inf)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, registry, name, help, labelnames):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(label, "")) for label in self.labelnames)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, value=1, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            self._values[key] = self._values.get(key, 0) + value
+        self.registry.changed()
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, registry, name, help, labelnames, buckets=DURATION_BUCKETS):
+        super().__init__(registry, name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            # Счётчики по корзинам (не накопительные), сумма и количество
+            state = self._values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+        self.registry.changed()
+
+
+class Registry:
+    """Метрики процесса в текстовом формате Prometheus, общие для нескольких процессов.
+
+    Каждый процесс (воркер сервера, воркер обучения, команда) держит свои значения в памяти
+    и не реже раза в flush_interval секунд записывает их в свой файл в directory.
+    /metrics суммирует файлы всех процессов, включая завершившиеся: счётчики и гистограммы
+    только растут, поэтому перезапуск воркера не сбрасывает их. Файлы завершившихся
+    процессов при сборе сливаются в один общий файл, поэтому число файлов не растёт.
+    """
+
+    def __init__(self, directory, flush_interval=5.0, stale_after=3600.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.stale_after = stale_after
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.collectors = []
+        # Узел в имени файла: каталог может быть общим для контейнеров со своими номерами процессов
+        self.host = socket.gethostname().replace('_', '-')
+        self.path = self._process_path()
+        self._dirty = False
+        self._flusher = None
+
+    def _process_path(self):
+        # Время запуска в имени файла: новый процесс с тем же pid не перезапишет прежний файл
+        return os.path.join(self.directory, f"metrics_{self.host}_{os.getpid()}_{time.time_ns()}.json")
+
+    def counter(self, name, help, labelnames=()):
+        return self.metrics.setdefault(name, Counter(self, name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DURATION_BUCKETS):
+        return self.metrics.setdefault(name, Histogram(self, name, help, labelnames, buckets))
+
+    def collector(self, func):
+        """Регистрирует func() -> [(имя, описание, {метки}, значение)]: счётчики, которые
+        ведут другие модули (кэши, канал событий); значения снимаются при записи файла"""
+        self.collectors.append(func)
+        return func
+
+    def changed(self):
+        self._dirty = True
+        if self._flusher is None:
+            with self.lock:
+                if self._flusher is not None:
+                    return
+                self._flusher = threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True)
+            self._flusher.start()
+
+    def after_fork(self):
+        """В дочернем процессе (gunicorn --preload) значения родителя не повторяются"""
+        self.lock = threading.Lock()
+        for metric in self.metrics.values():
+            metric._values = {}
+        self.path = self._process_path()
+        self._dirty = False
+        self._flusher = None
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            if self._dirty:
+                self.flush()
+                continue
+            # Время изменения файла показывает другим узлам, что процесс жив
+            try:
+                os.utime(self.path)
+            except OSError:
+                pass
+
+    def snapshot(self):
+        """Значения процесса: {имя: {type, help, buckets, samples: [[метки, значение]]}}"""
+        result = {}
+        with self.lock:
+            for metric in self.metrics.values():
+                result[metric.name] = {
+                    'type': metric.kind,
+                    'help': metric.help,
+                    'buckets': [str(bound) for bound in getattr(metric, 'buckets', ())],
+                    'samples': [[dict(zip(metric.labelnames, key)), value] for key, value in metric._values.items()],
+                }
+        for collect in self.collectors:
+            try:
+                samples = collect()
+            except Exception as e:
+                print(f"Ошибка сбора метрик: {e}")
+                continue
+            for name, help, labels, value in samples:
+                entry = result.setdefault(name, {'type': 'counter', 'help': help, 'buckets': [], 'samples': []})
+                entry['samples'].append([labels, value])
+        return result
+
+    def flush(self):
+        """Записывает значения процесса в его файл (атомарно, через временный файл)"""
+        self._dirty = False
+        os.makedirs(self.directory, exist_ok=True)
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(temporary, self.path)
+
+    def _process_files(self):
+        """Файлы других процессов: [(путь, узел, pid, время запуска)]; у файлов без узла в имени узел None"""
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if not name.startswith('metrics_') or not name.endswith('.json') or name == MERGED_NAME or path == self.path:
+                continue
+            parts = name[len('metrics_'):-len('.json')].rsplit('_', 2)
+            if len(parts) == 2:
+                parts.insert(0, None)
+            try:
+                files.append((path, parts[0], int(parts[1]), int(parts[2])))
+            except (ValueError, IndexError):
+                continue
+        return files
+
+    def _finished(self, files):
+        """Файлы завершившихся процессов. Процесс этого узла проверяется по pid (у процесса
+        один файл - самый новый с его pid), процесс другого узла - по времени изменения файла"""
+        newest = {}
+        for path, host, pid, started in files:
+            if host == self.host:
+                newest[pid] = max(newest.get(pid, started), started)
+        finished = []
+        for path, host, pid, started in files:
+            if host == self.host:
+                if started == newest[pid] and _alive(pid):
+                    continue
+            else:
+                try:
+                    if time.time() - os.path.getmtime(path) <= self.stale_after:
+                        continue
+                except OSError:
+                    continue
+            finished.append(path)
+        return finished
+
+    def _compact(self, files):
+        """Сливает файлы завершившихся процессов в общий файл MERGED_NAME и удаляет их;
+        возвращает значения общего файла и файлы оставшихся процессов.
+
+        В общем файле записаны и имена слитых файлов: если процесс прервётся между записью
+        общего файла и удалением, эти файлы не будут учтены дважды.
+        """
+        merged_path = os.path.join(self.directory, MERGED_NAME)
+        merged = _read_json(merged_path) or {'metrics': {}, 'files': []}
+        finished = self._finished(files)
+        if not finished:
+            return merged['metrics'], files
+        done = set(merged['files'])
+        snapshots = [merged['metrics']]
+        for path in finished:
+            if os.path.basename(path) not in done:
+                snapshot = _read_json(path)
+                if snapshot is not None:
+                    snapshots.append(snapshot)
+        metrics = _as_snapshot(_merge(snapshots))
+        temporary = merged_path + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump({'metrics': metrics, 'files': sorted(os.path.basename(path) for path in finished)}, f)
+        os.replace(temporary, merged_path)
+        for path in finished:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        return metrics, [file for file in files if file[0] not in finished]
+
+    def collect(self):
+        """Сумма значений всех процессов; текущий процесс берётся из памяти.
+
+        Слияние и чтение файлов - под блокировкой каталога: иначе файл, слитый другим
+        процессом между чтениями, пропал бы из суммы и счётчики на время уменьшились бы.
+        """
+        snapshots = [self.snapshot()]
+        if os.path.isdir(self.directory):
+            with open(os.path.join(self.directory, LOCK_NAME), 'a') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                merged, files = self._compact(self._process_files())
+                snapshots.append(merged)
+                for path, *_ in files:
+                    snapshot = _read_json(path)
+                    if snapshot is not None:
+                        snapshots.append(snapshot)
+        return _merge(snapshots)
+
+    def render(self):
+        """Текстовый формат экспозиции Prometheus 0.0.4"""
+        lines = []
+        for name, entry in sorted(self.collect().items()):
+            lines.append(f"# HELP {name} {entry['help']}")
+            lines.append(f"# TYPE {name} {entry['type']}")
+            for key, value in sorted(entry['samples'].items()):
+                labels = dict(key)
+                if entry['type'] != 'histogram':
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(entry['buckets'], value[:-2]):
+                    cumulative += count
+                    le = '+Inf' if bound == 'inf' else bound
+                    lines.append(f"{name}_bucket{_labels(dict(labels, le=le))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(value[-2])}")
+                lines.append(f"{name}_count{_labels(labels)} {value[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+def _merge(snapshots):
+    """Сумма снимков snapshot по метрикам и меткам: {имя: {type, help, buckets, samples: {метки: значение}}}"""
+    merged = {}
+    for snapshot in snapshots:
+        for name, entry in snapshot.items():
+            target = merged.setdefault(name, {'type': entry['type'], 'help': entry['help'],
+                                              'buckets': entry['buckets'], 'samples': {}})
+            for labels, value in entry['samples']:
+                key = tuple(sorted(labels.items()))
+                if isinstance(value, list):
+                    current = target['samples'].get(key, [0] * len(value))
+                    target['samples'][key] = [a + b for a, b in zip(current, value)]
+                else:
+                    target['samples'][key] = target['samples'].get(key, 0) + value
+    return merged
+
+
+def _as_snapshot(merged):
+    """Результат _merge в формате snapshot для записи в файл"""
+    return {name: dict(entry, samples=[[dict(key), value] for key, value in entry['samples'].items()])
+            for name, entry in merged.items()}
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (key + '="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+               for key, value in labels.items())
+    return "{" + ",".join(escaped) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+registry = Registry(settings.METRICS_DIR, settings.METRICS_FLUSH_INTERVAL, settings.METRICS_STALE_AFTER)
+atexit.register(lambda: registry._dirty and registry.flush())
+os.register_at_fork(after_in_child=registry.after_fork)
+
+request_duration = registry.histogram(
+    'predictech_http_request_duration_seconds', "Время обработки запроса до начала ответа", ('view', 'method'))
+requests_total = registry.counter(
+    'predictech_http_requests_total', "Количество запросов", ('view', 'method', 'status'))
+request_queries = registry.histogram(
+    'predictech_db_queries_per_request', "Количество запросов к БД за HTTP-запрос", ('view',), QUERY_COUNT_BUCKETS)
+db_queries_total = registry.counter(
+    'predictech_db_queries_total', "Количество запросов к БД при обработке HTTP-запросов", ('view',))
+db_query_seconds = registry.counter(
+    'predictech_db_query_seconds_total', "Суммарное время запросов к БД при обработке HTTP-запросов", ('view',))
+stage_duration = registry.histogram(
+    'predictech_stage_duration_seconds', "Время этапа конвейера обучения, прогноза состояния или прогноза параметров",
+    ('pipeline', 'stage'))
+
+
+class stage_timer(ContextDecorator):
+    """Замер этапа конвейера: with stage_timer('training', 'fit'): ... или декоратор"""
+
+    def __init__(self, pipeline, stage):
+        self.pipeline = pipeline
+        self.stage = stage
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        stage_duration.observe(time.perf_counter() - self._started, pipeline=self.pipeline, stage=self.stage)
+        return False
+
+
+# Счётчик запросов к БД текущего HTTP-запроса. Соединения Django привязаны к потокам,
+# а асинхронный ORM и sync_to_async выполняют запросы в других потоках, поэтому счётчик
+# передаётся через контекст, который asgiref копирует в эти потоки
+current_query_timer = contextvars.ContextVar('current_query_timer', default=None)
+
+
+class QueryTimer:
+    """Число и время запросов к БД"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+def time_query(execute, sql, params, many, context):
+    """Обёртка execute_wrapper каждого соединения: учитывает запрос в счётчике текущего HTTP-запроса"""
+    timer = current_query_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timer.count += 1
+        timer.seconds += time.perf_counter() - started
+
+
+def install_query_timer(sender, connection, **kwargs):
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+connection_created.connect(install_query_timer)
+
+
+class MetricsMiddleware:
+    """Длительность запросов по имени URL и запросы к БД за запрос.
+
+    У потоковых ответов учитывается время до начала выдачи; запросы к БД,
+    выполненные при чтении потока, не считаются. Работает и под WSGI, и под ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timer = QueryTimer()
+        token = current_query_timer.set(timer)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_query_timer.reset(token)
+        self.record(request, response, timer, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        timer = QueryTimer()
+        token = current_query_timer.set(timer)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_query_timer.reset(token)
+        self.record(request, response, timer, time.perf_counter() - started)
+        return response
+
+    def record(self, request, response, timer, elapsed):
+        match = request.resolver_match
+        view = (match.view_name or match._func_path) if match is not None else '<unmatched>'
+        request_duration.observe(elapsed, view=view, method=request.method)
+        requests_total.inc(view=view, method=request.method, status=response.status_code)
+        request_queries.observe(timer.count, view=view)
+        db_queries_total.inc(timer.count, view=view)
+        db_query_seconds.inc(timer.seconds, view=view)
+
+
+@registry.collector
+def cache_counters():
+    """Счётчики кэшей моделей и ответов и канала событий"""
+    from .model_cache import model_cache
+    from .response_cache import response_cache
+    from .events import hub
+    samples = []
+    for cache_name, stats in (('models', model_cache.stats()), ('responses', response_cache.stats())):
+        for event in ('hits', 'misses', 'evictions', 'invalidations'):
+            samples.append((f'predictech_cache_{event}_total', f"Кэш: {event}", {'cache': cache_name}, stats.get(event, 0)))
+    samples.append(('predictech_events_published_total', "Опубликовано событий /events/", {}, hub.stats()['published']))
+    return samples
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:07
+
+from django.db import migrations, models
+
+
+def create_timestamp_brin(apps, schema_editor):
+    # BRIN-индекс по времени: показания пишутся в порядке возрастания timestamp
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS detectordata_timestamp_brin '
+        'ON dashboards_detectordata USING brin ("timestamp") WITH (pages_per_range = 32)'
+    )
+
+
+def drop_timestamp_brin(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS detectordata_timestamp_brin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboards', '0014_riskvalues'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='detectordata',
+            index=models.Index(fields=['detector_id', 'timestamp'], name='detectordata_detector_ts_idx'),
+        ),
+        migrations.RunPython(create_timestamp_brin, drop_timestamp_brin),
+    ]
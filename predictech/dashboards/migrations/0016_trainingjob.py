@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:17
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboards', '0015_detectordata_detector_ts_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrainingJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', 'В очереди'), ('running', 'Выполняется'), ('success', 'Завершено'), ('error', 'Ошибка'), ('cancelled', 'Отменено')], default='queued', max_length=20)),
+                ('stage', models.CharField(blank=True, choices=[('data', 'Загрузка данных'), ('features', 'Создание признаков'), ('sequences', 'Подготовка последовательностей'), ('fit', 'Обучение'), ('evaluate', 'Оценка'), ('save', 'Сохранение')], default='', max_length=20)),
+                ('epochs', models.PositiveIntegerField(default=8)),
+                ('epoch', models.PositiveIntegerField(default=0)),
+                ('days_back', models.PositiveIntegerField(default=30)),
+                ('progress', models.FloatField(default=0.0)),
+                ('cancel_requested', models.BooleanField(default=False)),
+                ('result', models.TextField(blank=True, default='')),
+                ('pid', models.PositiveIntegerField(blank=True, null=True)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('started', models.DateTimeField(blank=True, null=True)),
+                ('finished', models.DateTimeField(blank=True, null=True)),
+                ('house_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='dashboards.house')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboards', '0017_tableversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trainingjob',
+            name='incremental',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboards', '0018_trainingjob_incremental'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detectortreshold',
+            name='kind',
+            field=models.CharField(choices=[('max', 'Верхний'), ('min', 'Нижний')], default='max', max_length=10),
+        ),
+    ]
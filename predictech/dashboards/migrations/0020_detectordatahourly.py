@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboards', '0019_detectortreshold_kind'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DetectorDataHourly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('min', models.FloatField(default=0.0)),
+                ('max', models.FloatField(default=0.0)),
+                ('mean', models.FloatField(default=0.0)),
+                ('sum_squares', models.FloatField(default=0.0)),
+                ('last', models.FloatField(default=0.0)),
+                ('last_timestamp', models.DateTimeField()),
+                ('detector_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='dashboards.detector')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('detector_id', 'hour'), name='detectordatahourly_detector_hour_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-18 21:10
+
+from django.db import migrations, models
+
+
+def keep_latest_assignment(apps, schema_editor):
+    # Прежнее переобучение добавляло запись на каждую модель дома: остаётся последняя
+    # по времени (при равном времени - по id)
+    ModelForHouse = apps.get_model('dashboards', 'ModelForHouse')
+    latest = {}
+    for assignment_id, house_id in (ModelForHouse.objects.order_by('house_id', '-timestamp', '-id')
+                                    .values_list('id', 'house_id')):
+        latest.setdefault(house_id, assignment_id)
+    ModelForHouse.objects.exclude(id__in=list(latest.values())).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboards', '0020_detectordatahourly'),
+    ]
+
+    operations = [
+        migrations.RunPython(keep_latest_assignment, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='modelforhouse',
+            constraint=models.UniqueConstraint(fields=('house_id',), name='modelforhouse_house_uniq'),
+        ),
+    ]
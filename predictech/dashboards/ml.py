@@ -0,0 +1,596 @@
+from django.conf import settings
+from .models import *
+from .features import training_features, forecast_features, rolling_ties, FEATURE_LOOKBACK
+from .loaders import load_house_frame, load_house_tail
+from .signals import state_labels_saved
+from .metrics import stage_timer
+from .inference import NumpySequential, UnsupportedModel
+from sklearn.preprocessing import StandardScaler, LabelEncoder
+from sklearn.model_selection import train_test_split
+from numpy.lib.stride_tricks import sliding_window_view
+from datetime import datetime,timedelta
+import pandas as pd
+import numpy as np
+import time
+import tempfile
+import pickle
+import os
+import json
+
+# Дообучение: шаг Adam и минимум новых окон, при меньшем числе модель обучается заново
+FINE_TUNE_LEARNING_RATE = 1e-4
+MIN_FINE_TUNE_SEQUENCES = 10
+
+class RealDataRetrainer:
+    def __init__(self, sequence_length=12, temperature=1.0, dtype=np.float32):
+        self.sequence_length = sequence_length
+        self.temperature = temperature
+        # Тип масштабированной матрицы признаков, из которой берутся окна; Keras считает во float32
+        self.dtype = dtype
+        self.model = None
+        self.scaler = StandardScaler()
+        self.label_encoder = LabelEncoder()
+        self.feature_columns = None
+        self.execution_time = 0
+        self.test_loss = 0
+        self.test_accuracy = 0
+        # 'full' - обучение с нуля, 'incremental' - дообучение загруженной модели
+        self.mode = 'full'
+        # Необязательный обработчик смены этапа обучения: on_stage(stage)
+        self.on_stage = None
+
+    def _report_stage(self, stage):
+        if self.on_stage is not None:
+            self.on_stage(stage)
+
+    def load_trained_model(self, model_path, metadata_path, engine='keras'):
+        """Загружает обученную модель и метаданные.
+
+        engine='numpy' - модель только для предсказания (inference.NumpySequential);
+        если в модели есть неподдерживаемые слои, загружается модель Keras
+        """
+        # Загружаем модель
+        self.model = None
+        if engine == 'numpy':
+            try:
+                self.model = NumpySequential.from_keras(model_path)
+            except UnsupportedModel as e:
+                print(f"Модель {model_path} загружается в TensorFlow: {e}")
+        if self.model is None:
+            import tensorflow as tf
+            self.model = tf.keras.models.load_model(model_path)
+
+        # Загружаем метаданные
+        with open(metadata_path, 'rb') as f:
+            metadata = pickle.load(f)
+
+        # Восстанавливаем все необходимые атрибуты
+        self.scaler = metadata['scaler']
+        self.label_encoder = metadata['label_encoder']
+        self.feature_columns = metadata['feature_columns']
+        self.sequence_length = metadata['sequence_length']
+
+        print(f"Модель загружена из: {model_path}")
+
+    def create_features(self, df):
+        """Создание признаков из реальных данных с контролем точности"""
+        features = training_features(df)
+
+        print(f"Создано признаков: {len([col for col in features.columns if col not in ['timestamp', 'label']])}")
+        return features
+
+    def numeric_columns(self, features_df):
+        """Числовые столбцы признаков - входы модели"""
+        return [col for col in features_df.columns
+                if col not in ['timestamp', 'label']
+                and features_df[col].dtype in ['float64', 'int64']]
+
+    def window_starts(self, n_rows):
+        """Первые строки окон: с шагом 2, у каждого окна есть следующая строка с меткой"""
+        return np.arange(0, max(n_rows - self.sequence_length, 0), 2)
+
+    def prepare_windows(self, features_df, fit=True):
+        """Масштабированная матрица признаков, первые строки окон и метки строк после окон.
+
+        Окна не копируются: окно i - строки X_scaled[starts[i]:starts[i] + sequence_length].
+        fit=False - признаки и масштабирование модели не меняются (дообучение)
+        """
+        if fit:
+            self.feature_columns = self.numeric_columns(features_df)
+        X = features_df[self.feature_columns].values
+        X_scaled = self.scaler.fit_transform(X) if fit else self.scaler.transform(X)
+        X_scaled = X_scaled.astype(self.dtype, copy=False)
+        starts = self.window_starts(len(X_scaled))
+        return X_scaled, starts, features_df['label'].values[starts + self.sequence_length]
+
+    def prepare_sequences(self, features_df):
+        """Подготовка последовательностей: окна (n, sequence_length, признаки) - представление
+        масштабированной матрицы без копирования - и метки строк после окон"""
+        X_scaled, starts, y_seq = self.prepare_windows(features_df)
+        if not len(starts):
+            return np.empty((0, self.sequence_length, X_scaled.shape[1]), dtype=X_scaled.dtype), y_seq
+        windows = sliding_window_view(X_scaled, self.sequence_length, axis=0).transpose(0, 2, 1)
+        return windows[:len(X_scaled) - self.sequence_length:2], y_seq
+
+    def split_windows(self, X_scaled, starts, y_encoded, batch_size=64):
+        """Разделение окон на train/test (как train_test_split массивов окон) и пакеты для Keras"""
+        from .training import WindowDataset
+        train_idx, test_idx = train_test_split(
+            np.arange(len(starts)), test_size=0.2, random_state=42, stratify=_stratify(y_encoded)
+        )
+        train = WindowDataset(X_scaled, starts[train_idx], y_encoded[train_idx], self.sequence_length,
+                              batch_size=batch_size, shuffle=True)
+        test = WindowDataset(X_scaled, starts[test_idx], y_encoded[test_idx], self.sequence_length,
+                             batch_size=batch_size)
+        return train, test
+
+    def build_model(self, n_features, n_classes):
+        """Построение модели (аналогично оригиналу)"""
+        from tensorflow.keras.models import Sequential
+        from tensorflow.keras.layers import LSTM, Dense, Dropout
+        model = Sequential([
+            LSTM(32, return_sequences=True, input_shape=(self.sequence_length, n_features)),
+            Dropout(0.3),
+            LSTM(16, return_sequences=False),
+            Dropout(0.3),
+            Dense(16, activation='relu'),
+            Dense(n_classes, activation='softmax')
+        ])
+
+        model.compile(
+            optimizer='adam',
+            loss='sparse_categorical_crossentropy',
+            metrics=['accuracy']
+        )
+
+        return model
+    
+    def predict_with_temperature(self, X_data, temperature=None):
+        """Предсказание с регулируемой температурой"""
+        if temperature is None:
+            temperature = self.temperature
+
+        # Получаем оригинальные вероятности
+        original_proba = self.model.predict(X_data, verbose=0)
+
+        if temperature == 1.0:
+            return np.argmax(original_proba, axis=1), original_proba
+
+        # Применяем температурное масштабирование
+        adjusted_proba = original_proba ** (1/temperature)
+        adjusted_proba = adjusted_proba / adjusted_proba.sum(axis=1, keepdims=True)
+
+        return np.argmax(adjusted_proba, axis=1), adjusted_proba
+    
+    def retrain_model(self, data, days_back=30, epochs=10, callbacks=None):
+        start_time = time.time()
+        """Основной метод переобучения на реальных данных"""
+        print("=== ПЕРЕОБУЧЕНИЕ МОДЕЛИ НА РЕАЛЬНЫХ ДАННЫХ ===")
+        print(f"Температурный параметр: {self.temperature}")
+
+        # 1. Загрузка данных
+        print("1. Загрузка данных")
+        data = data
+
+        if len(data) < self.sequence_length:
+            raise ValueError(f"Недостаточно данных для обучения. Нужно минимум {self.sequence_length} записей")
+
+        # 2. Создание признаков
+        print("2. Создание признаков...")
+        self._report_stage('features')
+        with stage_timer('training', 'features'):
+            features = self.create_features(data)
+
+        # 3. Подготовка последовательностей
+        print("3. Подготовка последовательностей...")
+        self._report_stage('sequences')
+        with stage_timer('training', 'sequences'):
+            X_scaled, starts, y_seq = self.prepare_windows(features)
+            y_encoded = self.label_encoder.fit_transform(y_seq)
+
+            # Разделение на train/test
+            train_data, test_data = self.split_windows(X_scaled, starts, y_encoded)
+
+        print(f"Обучающая выборка: {train_data.shape}")
+        print(f"Тестовая выборка: {test_data.shape}")
+        print(f"Распределение классов: {np.unique(y_seq, return_counts=True)}")
+
+        history = self.fit_windows(train_data, test_data, X_scaled.shape[1], epochs, callbacks)
+        end_time = time.time()  
+        self.execution_time = end_time - start_time
+        return history, features
+
+    def fit_windows(self, train_data, test_data, n_features, epochs=10, callbacks=None):
+        """Построение модели, обучение и оценка на пакетах окон (WindowDataset)"""
+        from tensorflow.keras.callbacks import EarlyStopping
+        # 4. Построение и обучение модели
+        n_classes = len(self.label_encoder.classes_)
+        self.model = self.build_model(n_features, n_classes)
+
+        early_stop = EarlyStopping(
+            monitor='val_loss',
+            patience=3,
+            restore_best_weights=True
+        )
+
+        print("4. Обучение модели...")
+        self._report_stage('fit')
+        with stage_timer('training', 'fit'):
+            history = self.model.fit(
+                train_data,
+                epochs=epochs,
+                validation_data=test_data,
+                callbacks=[early_stop] + list(callbacks or []),
+                verbose=1
+            )
+
+        # 5. Оценка модели
+        self._report_stage('evaluate')
+        with stage_timer('training', 'evaluate'):
+            self.test_loss, self.test_accuracy = self.model.evaluate(test_data, verbose=0)
+        print(f"Точность на тесте: {self.test_accuracy:.4f}")
+        return history
+
+    def retrain_streaming(self, chunks, epochs=10, callbacks=None, validation_share=0.2, spool_dir=None):
+        """Обучение с нуля по частям таблицы показаний (loaders.iter_house_frames).
+
+        Признаки части считаются вместе с FEATURE_LOOKBACK последними строками предыдущей
+        части и дописываются в файл в spool_dir, масштабирование обучается по частям
+        (partial_fit). Окна читаются из файла пакетами; на проверку идут последние по
+        времени окна, окна на границе периодов отбрасываются. В памяти - одна часть
+        таблицы и номера окон, сколько бы дней ни охватывали данные.
+        """
+        from .training import WindowDataset
+        start_time = time.time()
+        print("=== ПЕРЕОБУЧЕНИЕ МОДЕЛИ ПО ЧАСТЯМ ДАННЫХ ===")
+        with tempfile.TemporaryDirectory(dir=spool_dir) as directory:
+            print("2. Создание признаков по частям...")
+            self._report_stage('features')
+            with stage_timer('training', 'features'):
+                rows, classes = self._spool_features(chunks, directory)
+            if rows <= self.sequence_length:
+                raise ValueError(f"Недостаточно данных для обучения. Нужно минимум {self.sequence_length} записей")
+
+            print("3. Подготовка последовательностей...")
+            self._report_stage('sequences')
+            with stage_timer('training', 'sequences'):
+                X_scaled = self._scale_spooled(directory, rows)
+                codes = np.fromfile(os.path.join(directory, 'labels.bin'), dtype=np.int16)
+                timestamps = np.fromfile(os.path.join(directory, 'timestamps.bin'), dtype=np.int64)
+                starts = self.window_starts(rows)
+                targets = starts + self.sequence_length
+                y_seq = classes[codes[targets]]
+                y_encoded = self.label_encoder.fit_transform(y_seq)
+                # Строки файла упорядочены по возрастанию времени, поэтому окно начинается
+                # своей первой строкой и заканчивается строкой-целью
+                first, last = timestamps[starts], timestamps[targets]
+                cutoff = np.quantile(last, 1 - validation_share, method='lower')
+                train = last < cutoff
+                test = first >= cutoff
+                if not train.any() or not test.any():
+                    raise ValueError("Недостаточно данных для разделения на обучение и проверку по времени")
+                train_data = WindowDataset(X_scaled, starts[train], y_encoded[train], self.sequence_length, shuffle=True)
+                test_data = WindowDataset(X_scaled, starts[test], y_encoded[test], self.sequence_length)
+
+            print(f"Обучающая выборка: {train_data.shape}")
+            print(f"Тестовая выборка: {test_data.shape}")
+            print(f"Распределение классов: {np.unique(y_seq, return_counts=True)}")
+            history = self.fit_windows(train_data, test_data, X_scaled.shape[1], epochs, callbacks)
+            del train_data, test_data, X_scaled
+        self.execution_time = time.time() - start_time
+        return history
+
+    def _spool_features(self, chunks, directory):
+        """Признаки частей в файлы directory: features.bin (float64), labels.bin (коды меток),
+        timestamps.bin; возвращает число строк и метки по кодам"""
+        tail = None
+        rows = 0
+        codes = {}
+        with open(os.path.join(directory, 'features.bin'), 'wb') as features_file, \
+                open(os.path.join(directory, 'labels.bin'), 'wb') as labels_file, \
+                open(os.path.join(directory, 'timestamps.bin'), 'wb') as timestamps_file:
+            for chunk in chunks:
+                # Строки предыдущей части - предыстория для признаков первых строк этой части
+                frame = chunk if tail is None else pd.concat([tail, chunk], ignore_index=True)
+                skip = 0 if tail is None else len(tail)
+                tail = frame.iloc[-FEATURE_LOOKBACK:]
+                features = training_features(frame)
+                features = features[features.index >= skip]
+                if not len(features):
+                    continue
+                if self.feature_columns is None:
+                    self.feature_columns = self.numeric_columns(features)
+                X = features[self.feature_columns].to_numpy(dtype='float64')
+                self.scaler.partial_fit(X)
+                features_file.write(X.tobytes())
+                labels_file.write(np.array([codes.setdefault(label, len(codes)) for label in features['label']],
+                                           dtype=np.int16).tobytes())
+                timestamps_file.write(features['timestamp'].to_numpy(dtype='M8[ns]').view(np.int64).tobytes())
+                rows += len(X)
+        print(f"Создано признаков: {len(self.feature_columns or [])}, строк: {rows}")
+        return rows, np.array(list(codes), dtype=object)
+
+    def _scale_spooled(self, directory, rows, block_rows=65536):
+        """Масштабированная матрица признаков в файле scaled.bin (np.memmap только для чтения)"""
+        shape = (rows, len(self.feature_columns))
+        source = np.memmap(os.path.join(directory, 'features.bin'), dtype=np.float64, mode='r', shape=shape)
+        path = os.path.join(directory, 'scaled.bin')
+        target = np.memmap(path, dtype=self.dtype, mode='w+', shape=shape)
+        for start in range(0, rows, block_rows):
+            target[start:start + block_rows] = self.scaler.transform(source[start:start + block_rows])
+        target.flush()
+        del source, target
+        return np.memmap(path, dtype=self.dtype, mode='r', shape=shape)
+
+    def fine_tune_model(self, data, since, epochs=10, callbacks=None):
+        """Дообучение загруженной модели (load_trained_model) на данных после since.
+
+        Масштабирование и кодировщик меток модели не меняются. Если признаки или классы
+        данных не совпадают с моделью или новых окон мало, вызывается IncrementalUnavailable.
+        data должна начинаться раньше since: окнам первых новых строк нужна предыстория.
+        """
+        import tensorflow as tf
+        from tensorflow.keras.callbacks import EarlyStopping
+        start_time = time.time()
+        print("=== ДООБУЧЕНИЕ МОДЕЛИ НА НОВЫХ ДАННЫХ ===")
+        print(f"Данные после: {since}")
+        self.mode = 'incremental'
+
+        if len(data) < self.sequence_length:
+            raise IncrementalUnavailable("мало новых данных")
+
+        self._report_stage('features')
+        with stage_timer('training', 'features'):
+            features = self.create_features(data)
+
+        self._report_stage('sequences')
+        with stage_timer('training', 'sequences'):
+            if self.numeric_columns(features) != list(self.feature_columns):
+                raise IncrementalUnavailable("изменился набор признаков")
+            new_classes = set(features['label'].values) - set(self.label_encoder.classes_)
+            if new_classes:
+                raise IncrementalUnavailable(f"новые классы {sorted(new_classes)}")
+
+            X_scaled, starts, y_seq = self.prepare_windows(features, fit=False)
+            # Только окна, метка которых получена после обучения модели
+            fresh = features['timestamp'].values[starts + self.sequence_length] > np.datetime64(since)
+            starts, y_seq = starts[fresh], y_seq[fresh]
+            if len(starts) < MIN_FINE_TUNE_SEQUENCES:
+                raise IncrementalUnavailable(f"мало новых данных ({len(starts)} окон)")
+            train_data, test_data = self.split_windows(X_scaled, starts, self.label_encoder.transform(y_seq))
+
+        print(f"Обучающая выборка: {train_data.shape}")
+        print(f"Тестовая выборка: {test_data.shape}")
+
+        # Меньший шаг, чтобы не растерять обученное на прежних данных
+        self.model.compile(
+            optimizer=tf.keras.optimizers.Adam(learning_rate=FINE_TUNE_LEARNING_RATE),
+            loss='sparse_categorical_crossentropy',
+            metrics=['accuracy']
+        )
+        early_stop = EarlyStopping(monitor='val_loss', patience=2, restore_best_weights=True)
+
+        print("4. Дообучение модели...")
+        self._report_stage('fit')
+        with stage_timer('training', 'fine_tune'):
+            history = self.model.fit(
+                train_data,
+                epochs=epochs,
+                validation_data=test_data,
+                callbacks=[early_stop] + list(callbacks or []),
+                verbose=1
+            )
+
+        self._report_stage('evaluate')
+        with stage_timer('training', 'evaluate'):
+            self.test_loss, self.test_accuracy = self.model.evaluate(test_data, verbose=0)
+        print(f"Точность на тесте: {self.test_accuracy:.4f}")
+        self.execution_time = time.time() - start_time
+        return history, features
+
+    @stage_timer('training', 'save')
+    def save_retrained_model(self, base_path="retrained_models", house_id=None):
+        """Сохранение переобученной модели с датой в названии"""
+        self._report_stage('save')
+        # Формирование имени файла с датой
+        current_date = datetime.now().strftime("%Y%m%d_%H%M")
+        # Дом и секунды в имени: модели, обученные параллельно, не перезаписывают друг друга
+        file_suffix = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{house_id}"
+        model_filename = f"anomaly_model_retrained_{file_suffix}.keras"
+        metadata_filename = f"model_metadata_retrained_{file_suffix}.pkl"
+
+        # Создание файла с информацией
+        info_content = f"""Информация о переобученной модели:
+- Дата переобучения: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+- Количество признаков: {len(self.feature_columns)}
+- Длина последовательности: {self.sequence_length}
+- Температурный параметр: {self.temperature}
+- Режим: {'дообучение' if self.mode == 'incremental' else 'полное обучение'}
+- Классы: {list(self.label_encoder.classes_)}
+- Точность на тесте: {self.test_accuracy:.4f}
+- Тестовые потери: {self.test_loss:.4f}
+- Время обучения: {self.execution_time:.2f}
+"""
+      
+        # Создание папки если не существует
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, base_path), exist_ok=True)
+        # Сохранение модели
+        model_path = os.path.join(settings.MEDIA_ROOT, f"{base_path}/{model_filename}")
+        self.model.save(model_path, overwrite=True)
+        # Сохранение метаданных
+        metadata_path = os.path.join(settings.MEDIA_ROOT, f"{base_path}/{metadata_filename}")
+        metadata = {
+            'scaler': self.scaler,
+            'label_encoder': self.label_encoder,
+            'feature_columns': self.feature_columns,
+            'sequence_length': self.sequence_length,
+            'temperature': self.temperature,
+            'retrain_date': current_date
+        }
+        with open(metadata_path, 'wb') as f:
+            pickle.dump(metadata, f)
+        # Сохранение информации о модели
+        savedmodel = SavedModel.objects.create(
+            timestamp=current_date,
+            name=model_filename,
+            description=info_content,
+            model_file=model_path,
+            metadata_file=metadata_path,
+            accuracy=self.test_accuracy
+        )
+        house_obj = House.objects.get(id=house_id)
+        # Дом переключается на новую модель, прежняя выгружается из кэша сигналом post_save
+        ModelForHouse.objects.update_or_create(house_id=house_obj,
+                                               defaults=dict(model_id=savedmodel, name=model_filename,
+                                                             description=info_content, timestamp=current_date))
+        print(f"\n✅ Модель успешно переобучена и сохранена!")
+        result = {
+            "status": "Success",
+            "message": "Модель успешно переобучена и сохранена!",
+            "sequence_length": self.sequence_length,
+            "temperature": self.temperature,
+            "mode": self.mode,
+            "retrain_date": current_date,
+            "test_accuracy": self.test_accuracy,
+            "test_loss": self.test_loss,
+            "execution_time": self.execution_time
+        }
+        return json.dumps(result)
+
+    # РЕГУЛИРОВКА ЧУВСТВИТЕЛЬНОСТИ МОДЕЛИ
+    # Измените значение temperature для регулировки чувствительности:
+    # - temperature < 1.0: более чувствительная модель (чаще предсказывает аномалии)
+    # - temperature > 1.0: менее чувствительная модель (реже предсказывает аномалии)
+    # - temperature = 1.0: оригинальная модель (без изменений) 
+def retrain_model(data, days_back=30, epochs=8, house_id=None, temperature=1.0, on_stage=None, callbacks=None,
+                  base_model=None, since=None, full_data=None, stream=None):
+    """Функция для запуска переобучения.
+
+    С base_model (SavedModel дома) модель дообучается на data после since; если это
+    невозможно, обучается заново на full_data() - данных за days_back дней.
+    stream() - те же данные по частям (loaders.iter_house_frames): модель обучается
+    заново без загрузки всей таблицы (RealDataRetrainer.retrain_streaming).
+    """
+    try:
+        # Создание и запуск переобучения
+        retrainer = RealDataRetrainer(sequence_length=12, temperature=temperature)
+        retrainer.on_stage = on_stage
+        fallback = None
+        if base_model is not None:
+            try:
+                retrainer.load_trained_model(base_model.model_file.path, base_model.metadata_file.path)
+                retrainer.fine_tune_model(data, since, epochs=epochs, callbacks=callbacks)
+            except IncrementalUnavailable as e:
+                fallback = str(e)
+                print(f"Дообучение невозможно: {fallback}. Модель обучается заново")
+                retrainer = RealDataRetrainer(sequence_length=12, temperature=temperature)
+                retrainer.on_stage = on_stage
+                if stream is None:
+                    with stage_timer('training', 'data'):
+                        data = full_data()
+        if retrainer.mode == 'full' and stream is not None:
+            retrainer.retrain_streaming(stream(), epochs=epochs, callbacks=callbacks,
+                                        spool_dir=settings.TRAINING_SPOOL_DIR)
+        elif retrainer.mode == 'full':
+            history, features = retrainer.retrain_model(
+                data=data,
+                days_back=days_back, 
+                epochs=epochs,
+                callbacks=callbacks,
+            )
+        # Сохранение модели
+        result = retrainer.save_retrained_model(house_id=house_id)
+        if fallback is not None:
+            result = json.dumps(dict(json.loads(result), fallback=fallback))
+        return result
+
+    except Exception as e:
+        print(f"❌ Ошибка при переобучении: {e}")
+        return json.dumps({"status": "Error", "message": str(e)})
+
+class IncrementalUnavailable(Exception):
+    """Дообучение невозможно: изменились признаки или классы либо мало новых данных"""
+
+def _stratify(y_encoded, test_size=0.2):
+    """Метки для стратификации train_test_split или None, если классов на тест не хватает"""
+    counts = np.bincount(y_encoded)
+    counts = counts[counts > 0]
+    if counts.min() < 2 or int(np.ceil(len(y_encoded) * test_size)) < len(counts):
+        return None
+    return y_encoded
+
+class TrainingCancelled(Exception):
+    """Обучение прервано по запросу отмены"""
+
+def prediction_window(predictor, features):
+    """Окно из sequence_length строк признаков, предшествующих последней строке"""
+    demo_idx = len(features) - 1
+    return features.iloc[demo_idx-predictor.sequence_length:demo_idx][predictor.feature_columns].values
+
+# Запас строк хвоста сверх sequence_length + FEATURE_LOOKBACK на пропуски и неполные метки
+TAIL_MARGIN = 12
+
+def prediction_data(predictor, house, detectors_list, days_back=30):
+    """Данные и признаки для prediction_window по хвосту истории.
+
+    Окно prediction_window совпадает с расчётом по всем days_back дням; если по хвосту
+    это доказать нельзя, загружается полная история.
+    """
+    rows = predictor.sequence_length + FEATURE_LOOKBACK + TAIL_MARGIN
+    window = slice(-predictor.sequence_length - 1, -1)
+    while True:
+        with stage_timer('prediction', 'data'):
+            # Половинки в последних строках хвоста - полная история читается сразу, не дожидаясь
+            # расчёта признаков
+            data, complete = load_house_tail(house, detectors_list, rows, days_back=days_back,
+                                             reject=lambda tail: rolling_ties(tail, tail.index[window]))
+        if data is None:
+            break
+        with stage_timer('prediction', 'features'):
+            features = predictor.create_features(data)
+        if complete:
+            return data, features
+        if len(features) > predictor.sequence_length:
+            # Признаки строки зависят только от FEATURE_LOOKBACK предыдущих строк; скользящие
+            # среднее и отклонение rolling могут отличаться в последнем бите, что меняет
+            # округление только у половины - тогда окно считается по полной истории
+            if rolling_ties(data, features.index[window]):
+                break
+            return data, features
+        rows *= 2
+    with stage_timer('prediction', 'data'):
+        data = load_house_frame(house, detectors_list, days_back=days_back)
+    with stage_timer('prediction', 'features'):
+        return data, predictor.create_features(data)
+
+def save_state_labels(predictions):
+    """Пакетная запись прогнозов (house_id, timestamp, state, confidence) в StateLabel:
+    метки на те же дом и время обновляются, остальные создаются"""
+    if not predictions:
+        return 0, 0
+    existing = {
+        (label.house_id_id, label.timestamp): label
+        for label in StateLabel.objects.filter(
+            house_id__in={house_id for house_id, _, _, _ in predictions},
+            timestamp__in={timestamp for _, timestamp, _, _ in predictions},
+        )
+    }
+    to_update, to_create = [], []
+    for house_id, timestamp, state, confidence in predictions:
+        label = existing.get((house_id, timestamp))
+        if label is None:
+            to_create.append(StateLabel(house_id_id=house_id, timestamp=timestamp, state=state, confidence=confidence))
+        else:
+            label.state = state
+            label.confidence = confidence
+            label.confirmed = False
+            to_update.append(label)
+    StateLabel.objects.bulk_update(to_update, ['state', 'confidence', 'confirmed'], batch_size=1000)
+    StateLabel.objects.bulk_create(to_create, batch_size=1000)
+    state_labels_saved.send(sender=StateLabel, labels=predictions)
+    return len(to_update), len(to_create)
+
+# Функция для создания признаков прогноза (такая же, как при обучении)
+def create_features_simple(df):
+    """Создание упрощенных признаков с округлением"""
+    return forecast_features(df)
@@ -0,0 +1,123 @@
+from collections import OrderedDict
+from django.conf import settings
+import threading
+import os
+
+
+class ModelCache:
+    """LRU-кэш загруженных моделей (Keras + метаданные) в памяти процесса.
+
+    Ключ - id SavedModel и время изменения файлов модели и метаданных, поэтому
+    перезапись файлов приводит к повторной загрузке. Объём ограничен количеством
+    записей и суммарным размером файлов на диске.
+    """
+
+    def __init__(self, max_entries=8, max_bytes=512 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}
+        self._houses = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _key(saved_model):
+        model_path = saved_model.model_file.path
+        metadata_path = saved_model.metadata_file.path
+        return (saved_model.id, os.path.getmtime(model_path), os.path.getmtime(metadata_path))
+
+    @staticmethod
+    def _load(saved_model):
+        """Загрузка модели и метаданных с диска"""
+        from .ml import RealDataRetrainer
+        predictor = RealDataRetrainer(sequence_length=12)
+        predictor.load_trained_model(saved_model.model_file.path, saved_model.metadata_file.path,
+                                     engine=settings.INFERENCE_ENGINE)
+        size = os.path.getsize(saved_model.model_file.path) + os.path.getsize(saved_model.metadata_file.path)
+        return predictor, size
+
+    def get(self, saved_model, house_id=None):
+        """Загруженный RealDataRetrainer для SavedModel; при промахе модель читается с диска"""
+        key = self._key(saved_model)
+        with self._lock:
+            if house_id is not None:
+                self._houses[int(house_id)] = saved_model.id
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+            load_lock = self._loading.setdefault(key, threading.Lock())
+
+        # Параллельные запросы одной модели ждут единственную загрузку
+        with load_lock:
+            try:
+                with self._lock:
+                    if key in self._entries:
+                        self._entries.move_to_end(key)
+                        return self._entries[key][0]
+                predictor, size = self._load(saved_model)
+                with self._lock:
+                    # Устаревшие версии той же модели (другое mtime) больше не нужны
+                    for stale in [k for k in self._entries if k[0] == saved_model.id]:
+                        del self._entries[stale]
+                        self.evictions += 1
+                    self._entries[key] = (predictor, size)
+                    self._evict()
+            finally:
+                with self._lock:
+                    self._loading.pop(key, None)
+        return predictor
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self._size() > self.max_bytes):
+            if len(self._entries) == 1:
+                break
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _size(self):
+        return sum(size for _, size in self._entries.values())
+
+    def invalidate(self, saved_model_id):
+        """Удаляет из кэша все версии модели saved_model_id"""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == saved_model_id]:
+                del self._entries[key]
+                self.invalidations += 1
+
+    def repointed(self, house_id, saved_model_id):
+        """Дому назначена другая модель: прежняя выгружается, если её не использует другой дом"""
+        with self._lock:
+            previous = self._houses.pop(int(house_id), None)
+            if previous is None or previous == saved_model_id or previous in self._houses.values():
+                return
+        self.invalidate(previous)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._houses.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._size(),
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+model_cache = ModelCache(
+    max_entries=settings.MODEL_CACHE_MAX_ENTRIES,
+    max_bytes=settings.MODEL_CACHE_MAX_BYTES,
+)
@@ -64,6 +64,8 @@ class DetectorTreshold(models.Model):
     name = models.CharField(max_length=100)
     serial_number = models.CharField(max_length=100)
     value = models.FloatField(default=0.0)
+    KINDS = {'max':'Верхний', 'min':'Нижний'}
+    kind = models.CharField(choices=KINDS, default='max', max_length=10)
     def __str__(self):
         return self.name
 
@@ -79,9 +81,35 @@ class DetectorData(models.Model):
     detector_id = models.ForeignKey(Detector, null=False, blank=False, on_delete=models.CASCADE)
     timestamp = models.DateTimeField(default=timezone.now)
     value = models.FloatField(default=0.0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['detector_id', 'timestamp'], name='detectordata_detector_ts_idx'),
+        ]
+
     def __str__(self):
         return self.timestamp.__str__()+" - "+self.detector_id.__str__()+" - "+self.value.__str__()
 
+class DetectorDataHourly(models.Model):
+    # Часовые агрегаты показаний датчика (dashboards/rollups.py); hour - начало часа
+    detector_id = models.ForeignKey(Detector, null=False, blank=False, on_delete=models.CASCADE)
+    hour = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+    min = models.FloatField(default=0.0)
+    max = models.FloatField(default=0.0)
+    mean = models.FloatField(default=0.0)
+    sum_squares = models.FloatField(default=0.0)
+    last = models.FloatField(default=0.0)
+    last_timestamp = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['detector_id', 'hour'], name='detectordatahourly_detector_hour_uniq'),
+        ]
+
+    def __str__(self):
+        return self.hour.__str__()+" - "+self.detector_id.__str__()+" - "+self.mean.__str__()
+
 def user_directory_path(instance, filename):
     return 'saved_models/user_{0}/%Y-%m-%d-%H-%M-%S-{1}'.format(instance.user.id, filename)
 
@@ -101,6 +129,13 @@ class ModelForHouse(models.Model):
     timestamp = models.DateTimeField(default=timezone.now)
     name = models.CharField(max_length=100)
     description = models.TextField(default="", blank=True)
+
+    class Meta:
+        constraints = [
+            # Одна действующая модель на дом: переобучение обновляет запись
+            models.UniqueConstraint(fields=['house_id'], name='modelforhouse_house_uniq'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -135,4 +170,39 @@ class RiskValues(models.Model):
     sensivity = models.FloatField(default=0.0)
 
     def __str__(self):
-        return self.house_id.__str__()+" - "+self.timestamp.__str__()+" - "+self.sensivity.__str__()
\ No newline at end of file
+        return self.house_id.__str__()+" - "+self.timestamp.__str__()+" - "+self.sensivity.__str__()
+
+class TrainingJob(models.Model):
+    STATUSES = {'queued':'В очереди', 'running':'Выполняется', 'success':'Завершено', 'error':'Ошибка', 'cancelled':'Отменено'}
+    STAGES = {'data':'Загрузка данных', 'features':'Создание признаков', 'sequences':'Подготовка последовательностей',
+              'fit':'Обучение', 'evaluate':'Оценка', 'save':'Сохранение'}
+    house_id = models.ForeignKey(House, null=False, blank=False, on_delete=models.CASCADE)
+    status = models.CharField(choices=STATUSES, default='queued', max_length=20)
+    stage = models.CharField(choices=STAGES, default="", blank=True, max_length=20)
+    epochs = models.PositiveIntegerField(default=8)
+    epoch = models.PositiveIntegerField(default=0)
+    days_back = models.PositiveIntegerField(default=30)
+    # Дообучение текущей модели дома на данных после её обучения
+    incremental = models.BooleanField(default=False)
+    progress = models.FloatField(default=0.0)
+    cancel_requested = models.BooleanField(default=False)
+    result = models.TextField(default="", blank=True)
+    pid = models.PositiveIntegerField(null=True, blank=True)
+    created = models.DateTimeField(default=timezone.now)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    # Время последней отметки процесса, выполняющего задачу (jobs.beat_jobs)
+    heartbeat = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.house_id.__str__()+" - "+self.created.__str__()+" - "+self.status
+
+class TableVersion(models.Model):
+    # Счётчик изменений и удалений записей таблицы; новые записи учитываются
+    # по максимальному pk выборки, поэтому при вставке счётчик не меняется
+    table = models.CharField(max_length=100, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+    updated = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return self.table+" - "+self.version.__str__()
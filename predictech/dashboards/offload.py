@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.db import close_old_connections
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
+import contextvars
+import asyncio
+
+# Отдельный пул для тяжёлых представлений (pandas, TensorFlow). Под ASGI синхронные
+# представления и асинхронный ORM выполняются в одном общем потоке, поэтому расчёт
+# прогноза в нём задержал бы все лёгкие запросы процесса
+executor = ThreadPoolExecutor(max_workers=settings.OFFLOAD_THREADS, thread_name_prefix='offload')
+
+
+def _run(view, args, kwargs):
+    # У потока пула своё соединение с БД; закрывается по тем же правилам, что в конце запроса
+    close_old_connections()
+    try:
+        return view(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def offload(view):
+    """Делает синхронное представление (функцию или метод) асинхронным: тело выполняется в пуле executor"""
+    @wraps(view)
+    async def inner(*args, **kwargs):
+        loop = asyncio.get_running_loop()
+        # Контекст запроса (счётчик запросов к БД для /metrics) переносится в поток пула
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(executor, partial(context.run, _run, view, args, kwargs))
+    return inner
@@ -0,0 +1,108 @@
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers import serialize
+from django.http import HttpResponse, StreamingHttpResponse
+from itertools import islice
+import json
+
+# Размер порции чтения из курсора и сериализации при потоковой выдаче
+STREAM_CHUNK_SIZE = 2000
+
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+
+
+def keyset_page(qs, limit, after=None):
+    """Страница по первичному ключу: до limit записей с pk > after и pk для следующей страницы"""
+    qs = qs.order_by('pk')
+    if after is not None:
+        qs = qs.filter(pk__gt=after)
+    page = list(qs[:limit])
+    next_after = page[-1].pk if len(page) == limit else None
+    return page, next_after
+
+
+async def akeyset_page(qs, limit, after=None):
+    """keyset_page для асинхронных представлений"""
+    qs = qs.order_by('pk')
+    if after is not None:
+        qs = qs.filter(pk__gt=after)
+    page = [obj async for obj in qs[:limit]]
+    next_after = page[-1].pk if len(page) == limit else None
+    return page, next_after
+
+
+def stream_serialized(qs, chunk_size=STREAM_CHUNK_SIZE):
+    """JSON того же вида, что serialize("json", qs), порциями по chunk_size записей"""
+    rows = qs.iterator(chunk_size=chunk_size)
+    yield "["
+    separator = ""
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        yield separator + serialize("json", chunk)[1:-1]
+        separator = ", "
+    yield "]"
+
+
+async def astream_serialized(qs, chunk_size=STREAM_CHUNK_SIZE):
+    """stream_serialized для ASGI: синхронный итератор ASGI-обработчик собрал бы в память целиком"""
+    yield "["
+    separator = ""
+    chunk = []
+    async for obj in qs.aiterator(chunk_size=chunk_size):
+        chunk.append(obj)
+        if len(chunk) == chunk_size:
+            yield separator + serialize("json", chunk)[1:-1]
+            separator = ", "
+            chunk = []
+    if chunk:
+        yield separator + serialize("json", chunk)[1:-1]
+    yield "]"
+
+
+def parse_page_params(params):
+    """limit и after из GET; None, если постраничный режим не запрошен"""
+    if params.get("limit") is None and params.get("after") is None:
+        return None
+    limit = int(params.get("limit") or DEFAULT_PAGE_SIZE)
+    if not 0 < limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit должен быть от 1 до {MAX_PAGE_SIZE}")
+    after = params.get("after")
+    return limit, int(after) if after not in (None, "") else None
+
+
+def list_response(request, qs):
+    """Список записей: страница при limit/after, иначе потоковая выдача всей выборки.
+
+    Курсор следующей страницы передаётся в заголовке X-Next-After, тело - тот же
+    массив, что у serialize("json", ...).
+    """
+    try:
+        page_params = parse_page_params(request.GET)
+    except ValueError as e:
+        return HttpResponse(json.dumps({"status": "Error", "message": str(e)}), content_type="application/json", status=400)
+    if page_params is None:
+        return StreamingHttpResponse(stream_serialized(qs), content_type="application/json", status=200)
+    page, next_after = keyset_page(qs, *page_params)
+    response = HttpResponse(serialize("json", page), content_type="application/json", status=200)
+    if next_after is not None:
+        response["X-Next-After"] = str(next_after)
+    return response
+
+
+async def alist_response(request, qs):
+    """list_response для асинхронных представлений"""
+    try:
+        page_params = parse_page_params(request.GET)
+    except ValueError as e:
+        return HttpResponse(json.dumps({"status": "Error", "message": str(e)}), content_type="application/json", status=400)
+    if page_params is None:
+        # Под WSGI поток читает сам сервер синхронно, под ASGI - цикл событий
+        stream = astream_serialized(qs) if isinstance(request, ASGIRequest) else stream_serialized(qs)
+        return StreamingHttpResponse(stream, content_type="application/json", status=200)
+    page, next_after = await akeyset_page(qs, *page_params)
+    response = HttpResponse(serialize("json", page), content_type="application/json", status=200)
+    if next_after is not None:
+        response["X-Next-After"] = str(next_after)
+    return response
@@ -0,0 +1,152 @@
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse
+from functools import wraps
+import threading
+import hashlib
+import uuid
+
+
+class ResponseCache:
+    """Кэш вычисленных ответов представлений во фреймворке кэша Django (алиас responses).
+
+    Ключ ответа включает путь, параметры запроса и водяные знаки данных, от которых он
+    зависит (house:<id>, detector:<id>, risks). Водяной знак - случайный токен в том же
+    кэше; хуки записи показаний, меток и настроек рисков заменяют его, и прежние ответы
+    больше не находятся, а затем вытесняются по TIMEOUT и MAX_ENTRIES. Водяной знак
+    читается до расчёта ответа, поэтому ответ, посчитанный во время записи, сохраняется
+    под устаревшим ключом и не отдаётся.
+    """
+
+    def __init__(self, alias='responses'):
+        self.alias = alias
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def watermark(self, scope):
+        key = f'watermark:{scope}'
+        token = self.cache.get(key)
+        if token is None:
+            # Водяной знак мог быть вытеснен: новый токен не совпадёт ни с одним прежним ключом
+            self.cache.add(key, uuid.uuid4().hex, timeout=None)
+            token = self.cache.get(key)
+        return token
+
+    def invalidate(self, *scopes):
+        """Новые водяные знаки для scopes: ответы, зависящие от них, устаревают"""
+        if not scopes:
+            return
+        self.cache.set_many({f'watermark:{scope}': uuid.uuid4().hex for scope in scopes}, timeout=None)
+        with self._lock:
+            self.invalidations += len(scopes)
+
+    def key(self, request, scopes, extra=()):
+        watermarks = [(scope, self.watermark(scope)) for scope in scopes]
+        raw = repr((request.path, sorted(request.GET.lists()), watermarks, extra)).encode()
+        return 'response:' + hashlib.md5(raw, usedforsecurity=False).hexdigest()
+
+    def count(self, name, value=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + value)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': type(self.cache).__name__,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+response_cache = ResponseCache()
+
+
+def cached_response(scope_func):
+    """Кэширует ответы 200 представления; scope_func(request) -> (scopes, extra) или None.
+
+    extra - прочие условия, от которых зависит ответ (например, границы периода).
+    None означает, что запрос не кэшируется. Потоковые ответы не кэшируются.
+    Обращения к кэшу асинхронных представлений выполняются через sync_to_async.
+    """
+    def lookup(request):
+        """(ключ, ответ из кэша или None); ключ None - запрос не кэшируется"""
+        if request.method not in ('GET', 'HEAD'):
+            return None, None
+        try:
+            scope = scope_func(request)
+        except (ValueError, TypeError):
+            scope = None
+        if scope is None:
+            return None, None
+        key = response_cache.key(request, *scope)
+        cached = response_cache.cache.get(key)
+        if cached is None:
+            response_cache.count('misses')
+            return key, None
+        response_cache.count('hits')
+        content, content_type = cached
+        return key, HttpResponse(content, content_type=content_type, status=200)
+
+    def store(key, response):
+        if response.status_code == 200 and not response.streaming:
+            response_cache.cache.set(key, (response.content, response['Content-Type']))
+        return response
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def ainner(request, *args, **kwargs):
+                key, cached = await sync_to_async(lookup)(request)
+                if cached is not None:
+                    return cached
+                response = await view(request, *args, **kwargs)
+                if key is not None:
+                    await sync_to_async(store)(key, response)
+                return response
+            return ainner
+
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            key, cached = lookup(request)
+            if cached is not None:
+                return cached
+            response = view(request, *args, **kwargs)
+            return store(key, response) if key is not None else response
+        return inner
+    return decorator
+
+
+class EvictionCounter:
+    """Считает записи, удалённые бэкендом при переполнении (MAX_ENTRIES)"""
+
+    def _cull(self):
+        before = self._entry_count()
+        super()._cull()
+        evicted = before - self._entry_count()
+        if evicted > 0:
+            response_cache.count('evictions', evicted)
+
+
+class LocMemResponseCache(EvictionCounter, LocMemCache):
+    """Кэш в памяти процесса"""
+
+    def _entry_count(self):
+        return len(self._cache)
+
+
+class FileResponseCache(EvictionCounter, FileBasedCache):
+    """Файловый кэш, общий для процессов на одной машине"""
+
+    def _entry_count(self):
+        return len(self._list_cache_files())
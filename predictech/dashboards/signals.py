@@ -0,0 +1,139 @@
+from django.core.serializers import serialize
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver, Signal
+import json
+
+from .models import (ModelForHouse, SavedModel, DetectorData, DetectorsAtHouse, StateLabel, HouseAlerts, Forecast,
+                     Alerts, House, Detector, RiskValues, DetectorTreshold)
+from .model_cache import model_cache
+from .thresholds import threshold_index
+from .events import publish_event
+from .freshness import bump_version
+from .response_cache import response_cache
+
+# Пакетные записи (bulk_create/bulk_update) не вызывают post_save, о них сообщают эти сигналы.
+# detector_data_ingested: detector_ids, count, last_timestamp
+detector_data_ingested = Signal()
+# state_labels_saved: labels - список (house_id, timestamp, state, confidence)
+state_labels_saved = Signal()
+# house_alerts_created: alerts - созданные bulk_create записи HouseAlerts
+house_alerts_created = Signal()
+
+
+# Таблицы, отдаваемые с ETag: правка или удаление записи меняет их счётчик TableVersion.
+# Вставки видны по максимальному pk выборки
+VERSIONED_MODELS = [HouseAlerts, Alerts, House, Detector, DetectorsAtHouse, DetectorData, StateLabel, RiskValues]
+# post_delete у показаний отключил бы их быстрое удаление при каскаде: удаление показаний
+# вместе с датчиком отмечает detector_removed
+DELETE_VERSIONED_MODELS = [model for model in VERSIONED_MODELS if model is not DetectorData]
+
+
+def record_changed(sender, instance, created=False, **kwargs):
+    if not created:
+        bump_version(sender)
+
+
+def record_deleted(sender, instance, **kwargs):
+    bump_version(sender)
+
+
+for versioned_model in VERSIONED_MODELS:
+    post_save.connect(record_changed, sender=versioned_model, dispatch_uid=f'record_changed_{versioned_model.__name__}')
+for versioned_model in DELETE_VERSIONED_MODELS:
+    post_delete.connect(record_deleted, sender=versioned_model, dispatch_uid=f'record_deleted_{versioned_model.__name__}')
+
+
+@receiver(post_delete, sender=Detector)
+def detector_removed(sender, instance, **kwargs):
+    bump_version(DetectorData)
+
+
+@receiver(post_save, sender=ModelForHouse)
+def repoint_house_model(sender, instance, **kwargs):
+    model_cache.repointed(instance.house_id_id, instance.model_id_id)
+
+
+@receiver(post_delete, sender=ModelForHouse)
+def unassign_house_model(sender, instance, **kwargs):
+    model_cache.repointed(instance.house_id_id, None)
+
+
+@receiver(post_delete, sender=SavedModel)
+def drop_saved_model(sender, instance, **kwargs):
+    model_cache.invalidate(instance.id)
+
+
+def _record(instance):
+    """Запись в том же виде, что в ответах serialize("json", ...)"""
+    return json.loads(serialize("json", [instance]))[0]
+
+
+@receiver(post_save, sender=DetectorData)
+def detector_data_saved(sender, instance, **kwargs):
+    # Запись по одному показанию в обход detector_data/ (админка, shell) только сбрасывает
+    # кэш ответов: часовые агрегаты пересчитывает rollup_detector_data, а агрегаты, пороги и
+    # события detector_data/ ведёт пакетная запись (ingest_batch)
+    house_ids = list(DetectorsAtHouse.objects.filter(detector_id=instance.detector_id_id).values_list('house_id', flat=True).distinct())
+    response_cache.invalidate(f'detector:{instance.detector_id_id}', *[f'house:{house_id}' for house_id in house_ids])
+
+
+@receiver(detector_data_ingested)
+def detector_data_batch_saved(sender, detector_ids, count, last_timestamp, **kwargs):
+    houses = {}
+    for house_id, detector_id in DetectorsAtHouse.objects.filter(detector_id__in=detector_ids).values_list('house_id', 'detector_id'):
+        houses.setdefault(house_id, []).append(detector_id)
+    response_cache.invalidate(*[f'detector:{detector_id}' for detector_id in detector_ids], *[f'house:{house_id}' for house_id in houses])
+    for house_id, house_detectors in houses.items():
+        publish_event(house_id, 'detector_data', {'detector_ids': sorted(set(house_detectors)), 'count': count, 'last_timestamp': str(last_timestamp)})
+
+
+@receiver(post_save, sender=StateLabel)
+def state_label_saved(sender, instance, **kwargs):
+    response_cache.invalidate(f'house:{instance.house_id_id}')
+    publish_event(instance.house_id_id, 'state_label', _record(instance))
+
+
+@receiver(state_labels_saved)
+def state_labels_batch_saved(sender, labels, **kwargs):
+    # bulk_update существующих меток не видно по агрегатам
+    bump_version(StateLabel)
+    response_cache.invalidate(*{f'house:{house_id}' for house_id, *_ in labels})
+    for house_id, timestamp, state, confidence in labels:
+        publish_event(house_id, 'state_label', {'timestamp': str(timestamp), 'state': state, 'confidence': confidence})
+
+
+@receiver(post_save, sender=HouseAlerts)
+def house_alert_saved(sender, instance, **kwargs):
+    publish_event(instance.house_id, 'house_alert', _record(instance))
+
+
+@receiver(house_alerts_created)
+def house_alerts_batch_created(sender, alerts, **kwargs):
+    for alert in alerts:
+        publish_event(alert.house_id, 'house_alert', _record(alert))
+
+
+@receiver(post_save, sender=Forecast)
+def forecast_saved(sender, instance, **kwargs):
+    publish_event(instance.house_id_id, 'forecast', _record(instance))
+
+
+@receiver(post_save, sender=RiskValues)
+def risk_values_saved(sender, instance, **kwargs):
+    response_cache.invalidate('risks')
+
+
+@receiver(post_save, sender=DetectorsAtHouse)
+@receiver(post_delete, sender=DetectorsAtHouse)
+def house_detectors_changed(sender, instance, **kwargs):
+    response_cache.invalidate(f'house:{instance.house_id_id}')
+    threshold_index.invalidate()
+
+
+# Индекс порогов хранит пороги, названия и единицы датчиков и адреса домов
+@receiver(post_save, sender=DetectorTreshold)
+@receiver(post_delete, sender=DetectorTreshold)
+@receiver(post_save, sender=Detector)
+@receiver(post_save, sender=House)
+def thresholds_changed(sender, instance, **kwargs):
+    threshold_index.invalidate()
@@ -0,0 +1,128 @@
+"""Прежние реализации загрузки, признаков и окон - эталоны для сверки в тестах и бенчмарках"""
+from django.utils import timezone
+from datetime import timedelta
+from dashboards.models import DetectorData, StateLabel
+import pandas as pd
+import numpy as np
+
+
+def legacy_prepare_data(house, detectors_list, days_back=30):
+    """Прежний views.prepare_data: запрос и pd.concat на каждый датчик - эталон для сверки"""
+    data = pd.DataFrame()
+    now = timezone.now()
+    for detector in detectors_list:
+        detector_data = pd.DataFrame(DetectorData.objects.filter(
+            detector_id=detector.detector_id, timestamp__date__gte=(now - timedelta(days=days_back)).date()
+        ).order_by('-timestamp').values('timestamp', 'value'))
+        detector_data.rename(columns={"value": detector.name}, inplace=True)
+        detector_data['timestamp'] = pd.to_datetime(detector_data['timestamp'])
+        detector_data = detector_data.set_index('timestamp')
+        data = pd.concat([data, detector_data], axis=1)
+    labels = pd.DataFrame(StateLabel.objects.filter(
+        house_id=house, timestamp__date__gte=(now - timedelta(days=days_back)).date()
+    ).order_by('-timestamp').values('timestamp', 'state'))
+    labels.rename(columns={"state": 'label'}, inplace=True)
+    labels['timestamp'] = pd.to_datetime(labels['timestamp'])
+    labels = labels.set_index('timestamp')
+    data = pd.concat([data, labels], axis=1)
+    return data.reset_index()
+
+
+def _legacy_round(value, digits=None):
+    return round(value, digits) if pd.notnull(value) else value
+
+
+def legacy_training_features(df):
+    """Прежний RealDataRetrainer.create_features с построчным .apply(round) - эталон для сверки"""
+    features = df.copy()
+    flow_round = lambda value: _legacy_round(value, 2)
+    features['imbalance'] = (features['flow_xvs'] - features['flow_gvs']).apply(flow_round)
+    features['imbalance_ratio'] = (1 - (features['flow_gvs'] / features['flow_xvs'])).apply(flow_round)
+    features['temp_difference'] = (features['temp_supply'] - features['temp_return']).apply(_legacy_round)
+    features['hour'] = features['timestamp'].dt.hour
+    for col in ['flow_xvs', 'flow_gvs', 'imbalance']:
+        for window in [1, 3, 12]:
+            features[f'{col}_diff_{window}h'] = (features[col] - features[col].shift(window)).apply(flow_round)
+    for col in ['temp_supply', 'temp_return']:
+        for window in [1, 3, 12]:
+            features[f'{col}_diff_{window}h'] = (features[col] - features[col].shift(window)).apply(_legacy_round)
+    for col in ['flow_xvs', 'flow_gvs', 'imbalance']:
+        for window in [3, 12]:
+            features[f'{col}_mean_{window}h'] = features[col].rolling(window=window).mean().apply(flow_round)
+            features[f'{col}_std_{window}h'] = features[col].rolling(window=window).std().apply(flow_round)
+    return features.replace('nan', np.nan).dropna()
+
+
+def legacy_forecast_features(df):
+    """Прежний create_features_simple - эталон для сверки"""
+    df = df.copy()
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    df = df.sort_values('timestamp').reset_index(drop=True)
+    features = pd.DataFrame()
+    for col in ['flow_xvs', 'flow_gvs', 'temp_supply', 'temp_return']:
+        features[col] = df[col]
+    features['imbalance'] = round(features['flow_xvs'] - features['flow_gvs'], 2)
+    features['imbalance_ratio'] = round(1 - (features['flow_gvs'] / features['flow_xvs'].replace(0, 0.001)), 2)
+    features['temp_difference'] = round(features['temp_supply'] - features['temp_return'], 1)
+    features['hour'] = df['timestamp'].dt.hour
+    features['day_of_week'] = df['timestamp'].dt.dayofweek
+    features['flow_xvs_mean_3h'] = round(df['flow_xvs'].rolling(window=3, min_periods=1).mean(), 2)
+    features['flow_gvs_mean_3h'] = round(df['flow_gvs'].rolling(window=3, min_periods=1).mean(), 2)
+    features['imbalance_mean_3h'] = round(features['imbalance'].rolling(window=3, min_periods=1).mean(), 2)
+    for window in [1, 3]:
+        for col, digits in [('flow_xvs', 2), ('flow_gvs', 2), ('temp_supply', 1), ('temp_return', 1)]:
+            features[f'{col}_diff_{window}h'] = round(df[col].diff(window), digits)
+    return features.bfill().ffill()
+
+
+def synthetic_house_frame(hours, seed=0, gaps=True, quantized=True):
+    """Почасовые показания дома в формате prepare_data (по убыванию времени, как из БД)"""
+    rng = np.random.default_rng(seed)
+    timestamps = pd.date_range(end=pd.Timestamp.now().floor('h'), periods=hours, freq='h')
+    if quantized:
+        # Значения с тремя знаками дают много половинок при округлении до двух
+        flows = [rng.integers(0, 400, hours) / 1000 for _ in range(2)]
+        temps = [rng.integers(550, 650, hours) / 10, rng.integers(380, 460, hours) / 10]
+    else:
+        flows = [rng.uniform(0, 0.4, hours) for _ in range(2)]
+        temps = [rng.uniform(55, 65, hours), rng.uniform(38, 46, hours)]
+    frame = pd.DataFrame({
+        'timestamp': timestamps,
+        'flow_xvs': flows[0],
+        'flow_gvs': flows[1],
+        'temp_supply': temps[0],
+        'temp_return': temps[1],
+        'label': rng.choice(['normal', 'leak', 'nan'], hours, p=[0.8, 0.19, 0.01]),
+    })
+    if gaps:
+        for col in ['flow_xvs', 'temp_supply']:
+            frame.loc[rng.random(hours) < 0.01, col] = np.nan
+    return frame.iloc[::-1].reset_index(drop=True)
+
+
+def frames_identical(left, right):
+    """Совпадение таблиц бит в бит: столбцы, типы, индекс и значения"""
+    if list(left.columns) != list(right.columns) or not left.index.equals(right.index):
+        return False
+    for col in left.columns:
+        a, b = left[col], right[col]
+        if a.dtype != b.dtype:
+            return False
+        if a.dtype.kind == 'f':
+            if not np.array_equal(a.to_numpy().view('i8'), b.to_numpy().view('i8')):
+                return False
+        elif not a.equals(b):
+            return False
+    return True
+
+
+def legacy_prepare_sequences(retrainer, features_df):
+    """RealDataRetrainer.prepare_sequences до окон-представлений: каждое окно копируется в новый массив"""
+    numeric_columns = retrainer.numeric_columns(features_df)
+    X_scaled = retrainer.scaler.fit_transform(features_df[numeric_columns].values)
+    y = features_df['label'].values
+    X_seq, y_seq = [], []
+    for i in range(0, len(X_scaled) - retrainer.sequence_length, 2):
+        X_seq.append(X_scaled[i:(i + retrainer.sequence_length)])
+        y_seq.append(y[i + retrainer.sequence_length])
+    return np.array(X_seq), np.array(y_seq)
@@ -0,0 +1,490 @@
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from .legacy import legacy_prepare_data, legacy_training_features, legacy_forecast_features, synthetic_house_frame, frames_identical
+from ..features import training_features, forecast_features, py_round
+from ..forecasting import ForecastService, DEMO_METADATA
+from ..fleet import synthetic_readings, create_house
+from ..events import hub
+from ..inference import NumpySequential
+from ..ingest import ingest_batch
+from ..jobs import claim_job, reap_stale_jobs
+from ..loaders import iter_house_frames, load_house_frame, load_house_tail
+from ..metrics import Registry, MERGED_NAME
+from ..utils import period_bounds
+from ..response_cache import response_cache
+from ..rollups import ROLLUP_FIELDS, hourly_aggregates, rebuild_rollups, update_rollups
+from ..ml import MIN_FINE_TUNE_SEQUENCES, RealDataRetrainer, prediction_data, prediction_window, retrain_model
+from ..model_cache import model_cache
+from ..models import (Alerts, Detector, DetectorData, DetectorDataHourly, DetectorsAtHouse, DetectorTypes, DetectorTreshold,
+                     Forecast, House, ModelForHouse, SavedModel, StateLabel, TrainingJob)
+from django.utils import timezone
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import contextlib
+import json
+import subprocess
+import tempfile
+from unittest import mock
+import time
+import sys
+import io
+import os
+
+
+def fleet_house(name, steps=720, seed=0, gap=False):
+    """Дом с синтетическими показаниями; gap - удалить одно показание, чтобы таблица не была "выровненной" """
+    house = create_house(name, synthetic_readings(steps, rng=np.random.default_rng(seed)))
+    detectors_list = list(DetectorsAtHouse.objects.filter(house_id=house).order_by('id'))
+    if gap:
+        reading = DetectorData.objects.filter(detector_id=detectors_list[1].detector_id).order_by('timestamp')[steps // 2]
+        reading.delete()
+    return house, detectors_list
+
+
+def test_detector(name='test'):
+    return Detector.objects.create(type_id=DetectorTypes.objects.get_or_create(name='test', units='')[0], name=name)
+
+
+class RangeTests(TestCase):
+    def test_period_bounds_are_half_open_days(self):
+        now = datetime(2026, 3, 15, 13, 30)
+        self.assertEqual(period_bounds(0, now), (datetime(2026, 3, 15), datetime(2026, 3, 16)))
+        self.assertEqual(period_bounds(7, now), (datetime(2026, 3, 8), datetime(2026, 3, 16)))
+
+    def test_day_range_keeps_only_today(self):
+        detector = test_detector()
+        start, end = period_bounds(0)
+        inside = [start, end - timedelta(seconds=1)]
+        # Тот же день месяца в прошлом месяце (если он там есть), конец прошлых суток и начало следующих
+        previous_month = start.replace(day=1) - timedelta(days=1)
+        outside = [previous_month.replace(day=min(start.day, previous_month.day)), start - timedelta(seconds=1), end]
+        for timestamp in inside + outside:
+            DetectorData.objects.create(detector_id=detector, timestamp=timestamp, value=1.0)
+        response = self.client.get('/detector_data_log/', {'detector_id': detector.id, 'range': 'day'})
+        timestamps = sorted(row['fields']['timestamp'] for row in response.json())
+        self.assertEqual(timestamps, [timestamp.isoformat() for timestamp in inside])
+
+
+class TrainedHouseTestCase(TestCase):
+    """Дом с моделью, обученной за одну эпоху; файлы моделей - во временном MEDIA_ROOT класса"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media = cls.enterClassContext(tempfile.TemporaryDirectory())
+        cls.enterClassContext(override_settings(MEDIA_ROOT=cls.media))
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.house, cls.detectors_list = fleet_house('test-trained', steps=300)
+        cls.data = load_house_frame(cls.house.id, cls.detectors_list)
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = json.loads(retrain_model(cls.data, epochs=1, house_id=cls.house.id))
+        assert result['status'] == "Success", result
+        cls.saved_model = ModelForHouse.objects.get(house_id=cls.house).model_id
+
+
+class LoadersTests(TestCase):
+    def test_house_frame_matches_legacy_prepare_data(self):
+        for case in ('aligned', 'gap', 'extra_label'):
+            house, detectors_list = fleet_house(f'test-loader-{case}', steps=200, gap=case == 'gap')
+            if case == 'extra_label':
+                # Метка прогноза на следующий час - без показаний
+                last = StateLabel.objects.filter(house_id=house).order_by('-timestamp').first()
+                StateLabel.objects.create(house_id=house, timestamp=last.timestamp + timedelta(hours=1), state='normal')
+            # Прежний pd.concat упорядочивал "выровненную" таблицу по убыванию времени
+            expected = legacy_prepare_data(house.id, detectors_list).sort_values('timestamp', kind='stable')
+            with self.subTest(case=case):
+                self.assertTrue(frames_identical(expected.reset_index(drop=True),
+                                                 load_house_frame(house.id, detectors_list)))
+
+
+class StreamingTrainingTests(TestCase):
+    def test_chunks_cover_frame_in_time_order(self):
+        house, detectors_list = fleet_house('test-chunks', steps=600, gap=True)
+        chunks = list(iter_house_frames(house.id, detectors_list, chunk_days=7))
+        self.assertGreater(len(chunks), 1)
+        joined = pd.concat(chunks, ignore_index=True)
+        self.assertTrue(joined['timestamp'].is_monotonic_increasing)
+        self.assertTrue(frames_identical(load_house_frame(house.id, detectors_list), joined))
+
+    def test_validation_windows_follow_training_windows(self):
+        house, detectors_list = fleet_house('test-streaming', steps=600)
+        retrainer = RealDataRetrainer(sequence_length=12)
+        with mock.patch.object(RealDataRetrainer, 'fit_windows') as fit_windows, contextlib.redirect_stdout(io.StringIO()):
+            retrainer.retrain_streaming(iter_house_frames(house.id, detectors_list, chunk_days=7))
+        train_data, test_data = fit_windows.call_args.args[:2]
+        # Строки файла признаков идут по времени: последняя строка-цель обучения раньше первой строки проверки
+        self.assertLess(train_data.starts.max() + retrainer.sequence_length, test_data.starts.min())
+        self.assertAlmostEqual(len(test_data.starts) / (len(train_data.starts) + len(test_data.starts)), 0.2, delta=0.05)
+
+
+class FeaturesTests(TestCase):
+    def test_training_features_match_legacy(self):
+        # Половинки при округлении скользящих окон - в данных с тремя знаками
+        for quantized in (True, False):
+            for gaps in (True, False):
+                frame = synthetic_house_frame(1000, seed=1, gaps=gaps, quantized=quantized)
+                with self.subTest(quantized=quantized, gaps=gaps):
+                    self.assertTrue(frames_identical(legacy_training_features(frame), training_features(frame)))
+
+    def test_forecast_features_match_legacy(self):
+        for quantized in (True, False):
+            frame = synthetic_house_frame(1000, seed=2, quantized=quantized)
+            with self.subTest(quantized=quantized):
+                self.assertTrue(frames_identical(legacy_forecast_features(frame), forecast_features(frame)))
+
+    def test_py_round_matches_round(self):
+        values = np.concatenate([np.arange(-2000, 2000) / 1000, np.arange(-200, 200) / 100 + 0.005,
+                                 [np.nan, -0.0, 0.125, 2.675, 1e6 + 0.5]])
+        for decimals in (None, 1, 2):
+            expected = [round(value, decimals) if not np.isnan(value) else np.nan for value in values.tolist()]
+            with self.subTest(decimals=decimals):
+                self.assertTrue(np.array_equal(py_round(values, decimals), np.array(expected, dtype='float64'), equal_nan=True))
+
+
+class PredictionDataTests(TestCase):
+    def full_window(self, predictor, house, detectors_list):
+        features = predictor.create_features(load_house_frame(house.id, detectors_list))
+        predictor.feature_columns = predictor.numeric_columns(features)
+        return prediction_window(predictor, features)
+
+    def test_tail_is_suffix_of_full_table(self):
+        for gap in (False, True):
+            house, detectors_list = fleet_house(f'test-tail-{gap}', gap=gap)
+            full = load_house_frame(house.id, detectors_list)
+            tail, complete = load_house_tail(house.id, detectors_list, 40)
+            with self.subTest(gap=gap):
+                self.assertFalse(complete)
+                self.assertLess(len(tail), len(full))
+                self.assertGreaterEqual(len(tail), 40)
+                self.assertEqual(tail['timestamp'].iloc[-1], full['timestamp'].max())
+                self.assertTrue(frames_identical(full.iloc[len(full) - len(tail):].reset_index(drop=True), tail))
+                data, complete = load_house_tail(house.id, detectors_list, 10 ** 4)
+                self.assertTrue(complete)
+                self.assertTrue(frames_identical(full, data))
+
+    def test_window_matches_full_history(self):
+        for seed in range(4):
+            for gap in (False, True):
+                house, detectors_list = fleet_house(f'test-window-{seed}-{gap}', seed=seed, gap=gap)
+                predictor = RealDataRetrainer(sequence_length=12)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    expected = self.full_window(predictor, house, detectors_list)
+                    _, features = prediction_data(predictor, house.id, detectors_list)
+                with self.subTest(seed=seed, gap=gap):
+                    self.assertTrue(np.array_equal(prediction_window(predictor, features), expected))
+
+
+class ForecastTests(TestCase):
+    def test_forecast_uses_latest_row(self):
+        import joblib
+        from sklearn.ensemble import RandomForestRegressor
+        house, detectors_list = fleet_house('test-forecast', steps=200)
+        data = load_house_frame(house.id, detectors_list)
+        metadata = dict(DEMO_METADATA, feature_count=len(DEMO_METADATA['feature_names']))
+        features = forecast_features(data)[metadata['feature_names']]
+        targets = np.random.default_rng(0).normal(size=(len(features), len(metadata['target_names'])))
+        model = RandomForestRegressor(n_estimators=5, random_state=0).fit(features, targets)
+        with tempfile.TemporaryDirectory() as directory, override_settings(MEDIA_ROOT=directory):
+            os.makedirs(os.path.join(directory, 'forecast'))
+            joblib.dump(model, os.path.join(directory, 'forecast', 'fast_forecast_model.pkl'))
+            joblib.dump(metadata, os.path.join(directory, 'forecast', 'forecast_metadata.pkl'))
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = json.loads(ForecastService().forecast_house(house.id, data.sample(frac=1, random_state=0)))
+        expected = np.round(model.predict(features.iloc[-1:])[0], 2)
+        self.assertEqual([result[name] for name in metadata['target_names']], expected.tolist())
+        saved = Forecast.objects.get(house_id=house)
+        self.assertEqual(saved.timestamp, data['timestamp'].max().to_pydatetime())
+
+
+class ModelCacheTests(TrainedHouseTestCase):
+    def test_repoint_unloads_previous_model(self):
+        model_cache.clear()
+        with contextlib.redirect_stdout(io.StringIO()):
+            predictor = model_cache.get(self.saved_model, house_id=self.house.id)
+            self.assertIs(model_cache.get(self.saved_model, house_id=self.house.id), predictor)
+        replacement = SavedModel.objects.create(name='replacement', model_file=self.saved_model.model_file.name,
+                                                metadata_file=self.saved_model.metadata_file.name)
+        # Модель нужна другому дому - остаётся в кэше
+        other = House.objects.create(name='test-other', address='')
+        ModelForHouse.objects.create(house_id=other, model_id=self.saved_model)
+        with contextlib.redirect_stdout(io.StringIO()):
+            model_cache.get(self.saved_model, house_id=other.id)
+        ModelForHouse.objects.update_or_create(house_id=self.house, defaults=dict(model_id=replacement))
+        self.assertEqual(model_cache.stats()['entries'], 1)
+        ModelForHouse.objects.update_or_create(house_id=other, defaults=dict(model_id=replacement))
+        self.assertEqual(model_cache.stats()['entries'], 0)
+
+
+class ScoreFleetTests(TrainedHouseTestCase):
+    def test_batched_predictions_match_single_house(self):
+        other, other_detectors = fleet_house('test-trained-2', steps=300, seed=1)
+        ModelForHouse.objects.create(house_id=other, model_id=self.saved_model)
+        predictor = model_cache.get(self.saved_model)
+        # Ожидаемое считается до записи: новая метка попадает в кадр следующего прогноза
+        expected = {}
+        with contextlib.redirect_stdout(io.StringIO()):
+            for house, detectors_list in [(self.house, self.detectors_list), (other, other_detectors)]:
+                data, features = prediction_data(predictor, house.id, detectors_list)
+                proba = predictor.model.predict(prediction_window(predictor, features)[None], verbose=0)[0]
+                expected[house] = ((data['timestamp'].max() + timedelta(hours=1)).to_pydatetime(),
+                                   predictor.label_encoder.inverse_transform([proba.argmax()])[0], float(proba.max()))
+            call_command('score_fleet', stdout=io.StringIO())
+        for house, (timestamp, state, confidence) in expected.items():
+            with self.subTest(house=house.name):
+                label = StateLabel.objects.get(house_id=house, timestamp=timestamp)
+                self.assertEqual(label.state, state)
+                self.assertAlmostEqual(label.confidence, confidence, places=5)
+
+
+class FineTuneTests(TrainedHouseTestCase):
+    def retrain(self, since):
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = json.loads(retrain_model(self.data, epochs=1, house_id=self.house.id, base_model=self.saved_model,
+                                              since=since, full_data=lambda: self.data))
+        self.assertEqual(result['status'], "Success", result)
+        self.assertNotEqual(ModelForHouse.objects.get(house_id=self.house).model_id, self.saved_model)
+        return result
+
+    def test_new_data_fine_tunes_current_model(self):
+        result = self.retrain(self.data['timestamp'].iloc[len(self.data) * 2 // 3].to_pydatetime())
+        self.assertEqual(result['mode'], 'incremental')
+        self.assertNotIn('fallback', result)
+
+    def test_too_few_new_windows_fall_back_to_full_training(self):
+        result = self.retrain((self.data['timestamp'].max() - timedelta(hours=MIN_FINE_TUNE_SEQUENCES - 1)).to_pydatetime())
+        self.assertEqual(result['mode'], 'full')
+        self.assertIn("мало новых данных", result['fallback'])
+
+
+class InferenceTests(TestCase):
+    def test_numpy_model_matches_keras(self):
+        import tensorflow as tf
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'model.keras')
+            RealDataRetrainer(sequence_length=12).build_model(34, 4).save(path)
+            keras_model = tf.keras.models.load_model(path)
+            numpy_model = NumpySequential.from_keras(path)
+        self.assertEqual(numpy_model.input_shape, keras_model.input_shape)
+        windows = np.random.default_rng(0).normal(size=(500, 12, 34))
+        expected = keras_model.predict(windows, verbose=0)
+        actual = numpy_model.predict(windows, verbose=0)
+        np.testing.assert_allclose(actual, expected, rtol=0, atol=1e-5)
+        # Классы сравниваются там, где две лучшие вероятности различимы при такой точности
+        top = np.sort(expected, axis=1)
+        clear = top[:, -1] - top[:, -2] > 1e-4
+        self.assertTrue(np.array_equal(actual.argmax(axis=1)[clear], expected.argmax(axis=1)[clear]))
+
+    def test_serving_modules_do_not_import_tensorflow(self):
+        code = ("import django, sys; django.setup(); "
+                "from dashboards import ml, model_cache, views, inference; "
+                "print('tensorflow' in sys.modules)")
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip().splitlines()[-1], 'False')
+
+
+class IngestTests(TestCase):
+    def test_malformed_columns_are_rejected(self):
+        for payload in ({'detector_ids': 5, 'values': [1.0]},
+                        {'detector_ids': [1], 'values': 'x'},
+                        {'detector_ids': [1], 'values': [1.0], 'timestamps': 7},
+                        {'detector_ids': [1, 2], 'values': [1.0]},
+                        {'detector_ids': [1], 'values': [1.0], 'timestamps': []}):
+            response = self.client.post('/detector_data/', json.dumps(payload), content_type='application/json')
+            with self.subTest(payload=payload):
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['status'], "Error")
+
+    def test_single_reading_uses_batch_path(self):
+        detector = test_detector()
+        DetectorTreshold.objects.create(detector_id=detector, name='max', serial_number='', value=10.0)
+        response = self.client.post('/detector_data/', {'detector_id': detector.id, 'timestamp': '2026-01-01 10:15:00', 'value': '12.5'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(DetectorDataHourly.objects.get(detector_id=detector).mean, 12.5)
+        self.assertEqual(Alerts.objects.count(), 1)
+        response = self.client.post('/detector_data/', {'detector_id': detector.id + 1, 'value': '1'})
+        self.assertEqual(response.status_code, 400)
+        # Запись в обход detector_data/: вставка и выборка домов датчика для кэша ответов
+        with self.assertNumQueries(2):
+            DetectorData.objects.create(detector_id=detector, value=20.0)
+
+
+class ConditionalGetTests(TestCase):
+    def test_etag_follows_inserts_and_deletes(self):
+        first = Alerts.objects.create(header="a")
+        Alerts.objects.create(header="b")
+        etag = self.client.get('/alerts/')['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get('/alerts/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries.captured_queries))
+        Alerts.objects.create(header="c")
+        self.assertEqual(self.client.get('/alerts/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        etag = self.client.get('/alerts/')['ETag']
+        # Удаление не последней записи не меняет максимальный pk
+        first.delete()
+        self.assertEqual(self.client.get('/alerts/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class RollupsTests(TestCase):
+    def stored(self, detector):
+        return pd.DataFrame.from_records(
+            DetectorDataHourly.objects.filter(detector_id=detector).order_by('hour').values_list('hour', *ROLLUP_FIELDS),
+            columns=['hour', *ROLLUP_FIELDS])
+
+    def assertRollups(self, detector, expected):
+        actual = self.stored(detector)
+        self.assertEqual(actual[['hour', 'count', 'last_timestamp']].astype(str).values.tolist(),
+                         expected[['hour', 'count', 'last_timestamp']].astype(str).values.tolist())
+        for field in ['min', 'max', 'mean', 'sum_squares', 'last']:
+            np.testing.assert_allclose(actual[field], expected[field], rtol=1e-12, err_msg=field)
+
+    def test_merged_batches_match_whole_batch(self):
+        detector = test_detector()
+        start = datetime(2026, 3, 1, 10, 0)
+        rng = np.random.default_rng(0)
+        readings = pd.DataFrame({'detector_id': detector.id,
+                                 'timestamp': [start + timedelta(minutes=7 * i) for i in range(60)],
+                                 'value': rng.normal(size=60).round(3)})
+        DetectorData.objects.bulk_create(DetectorData(detector_id=detector, timestamp=row.timestamp, value=row.value)
+                                         for row in readings.itertuples())
+        # Вторая половина пакета попадает в уже записанные часы, в том числе раньше их последних показаний
+        update_rollups(readings.iloc[::2])
+        update_rollups(readings.iloc[1::2])
+        expected = hourly_aggregates(readings).sort_values('hour', ignore_index=True)
+        self.assertRollups(detector, expected)
+        rebuild_rollups(detector.id, start)
+        self.assertRollups(detector, expected)
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        response_cache.cache.clear()
+
+    def test_write_replaces_watermark(self):
+        house, detectors_list = fleet_house('test-cache', steps=48)
+        detector_id = detectors_list[0].detector_id_id
+        latest = DetectorData.objects.filter(detector_id=detector_id).latest('timestamp').timestamp
+        for url in [f'/detector_data_log/?detector_id={detector_id}', f'/dahdl/?house_id={house.id}']:
+            with self.subTest(url=url):
+                response_cache.cache.clear()
+                before = response_cache.stats()
+                first = self.client.get(url).content
+                self.assertEqual(self.client.get(url).content, first)
+                after = response_cache.stats()
+                self.assertEqual((after['misses'] - before['misses'], after['hits'] - before['hits']), (1, 1))
+
+                latest += timedelta(hours=1)
+                ingest_batch([{"detector_id": detector_id, "timestamp": latest.isoformat(), "value": 1.0}])
+                self.assertNotEqual(self.client.get(url).content, first)
+                self.assertEqual(response_cache.stats()['misses'] - after['misses'], 1)
+
+
+class MissingRecordTests(TestCase):
+    URLS = ('/house_alerts/?house_id=999999', '/alerts/?alert_id=999999')
+
+    def test_unknown_id_returns_empty_list(self):
+        for url in self.URLS:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json(), [])
+
+    @override_settings(ROOT_URLCONF='main.asgi_urls')
+    async def test_async_unknown_id_returns_empty_list(self):
+        for url in self.URLS:
+            with self.subTest(url=url):
+                response = await self.async_client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json(), [])
+
+
+class PaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ids = [Alerts.objects.create(alert_id=i, header=f'test-{i}').pk for i in range(5)]
+
+    def test_pages_follow_next_after(self):
+        pages, after = [], None
+        while True:
+            response = self.client.get('/alerts/', {'limit': 2} | ({'after': after} if after is not None else {}))
+            self.assertEqual(response.status_code, 200)
+            pages.append([row['pk'] for row in response.json()])
+            after = response.headers.get('X-Next-After')
+            if after is None:
+                break
+        self.assertEqual(pages, [self.ids[0:2], self.ids[2:4], self.ids[4:]])
+
+    def test_unpaged_list_streams_all_rows(self):
+        response = self.client.get('/alerts/')
+        self.assertTrue(response.streaming)
+        self.assertNotIn('X-Next-After', response.headers)
+        self.assertEqual(sorted(row['pk'] for row in json.loads(b"".join(response.streaming_content))), self.ids)
+
+    def test_bad_limit(self):
+        self.assertEqual(self.client.get('/alerts/', {'limit': 0}).status_code, 400)
+
+    @override_settings(ROOT_URLCONF='main.asgi_urls')
+    async def test_async_pages_follow_next_after(self):
+        response = await self.async_client.get('/alerts/', {'limit': 3})
+        self.assertEqual([row['pk'] for row in response.json()], self.ids[:3])
+        response = await self.async_client.get('/alerts/', {'limit': 3, 'after': response.headers['X-Next-After']})
+        self.assertEqual([row['pk'] for row in response.json()], self.ids[3:])
+        self.assertNotIn('X-Next-After', response.headers)
+
+
+class TrainingJobTests(TestCase):
+    def test_only_jobs_without_heartbeat_are_reaped(self):
+        house = House.objects.create(name='test-jobs', address='')
+        live, stopped = [TrainingJob.objects.create(house_id=house) for _ in range(2)]
+        self.assertTrue(claim_job(live.id))
+        self.assertTrue(claim_job(stopped.id))
+        TrainingJob.objects.filter(id=stopped.id).update(heartbeat=timezone.now() - timedelta(seconds=600))
+        self.assertEqual(reap_stale_jobs(timeout=120), 1)
+        self.assertEqual(TrainingJob.objects.get(id=live.id).status, 'running')
+        self.assertEqual(TrainingJob.objects.get(id=stopped.id).status, 'error')
+
+
+class EventsTests(TestCase):
+    def test_streams_over_limit_are_refused(self):
+        with override_settings(EVENTS_MAX_STREAMS=1):
+            first = self.client.get('/events/')
+            self.assertEqual(first.status_code, 200)
+            self.assertEqual(self.client.get('/events/').status_code, 204)
+            self.assertEqual(next(iter(first.streaming_content)), b"retry: 5000\n\n")
+            first.close()
+            self.assertEqual(hub.stats()['subscribers'], 0)
+        with override_settings(EVENTS_MAX_STREAMS=0):
+            self.assertEqual(self.client.get('/events/').status_code, 204)
+
+
+class MetricsTests(TestCase):
+    def test_finished_processes_are_merged(self):
+        exited = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'],
+                                capture_output=True, text=True, check=True)
+        with tempfile.TemporaryDirectory() as directory:
+            registry = Registry(directory)
+            registry.counter('test_total', "Тест").inc()
+
+            def write(name, value, age=0):
+                path = os.path.join(directory, name)
+                with open(path, 'w') as f:
+                    json.dump({'test_total': {'type': 'counter', 'help': "Тест", 'buckets': [],
+                                              'samples': [[{}, value]]}}, f)
+                os.utime(path, (time.time() - age, time.time() - age))
+                return name
+
+            running = write(f"metrics_{registry.host}_{os.getppid()}_1.json", 10)
+            finished = write(f"metrics_{registry.host}_{exited.stdout.strip()}_2.json", 100)
+            write("metrics_other_1_3.json", 1000, age=2 * registry.stale_after)
+            fresh = write("metrics_other_1_4.json", 10000)
+            total = lambda: registry.collect()['test_total']['samples'][()]
+            self.assertEqual(total(), 11111)
+            self.assertEqual(sorted(os.listdir(directory)), sorted([MERGED_NAME, running, fresh, 'metrics.lock']))
+            # Файл, оставшийся после прерванного слияния, уже учтён в общем файле
+            write(finished, 100)
+            self.assertEqual(total(), 11111)
+            self.assertNotIn(finished, os.listdir(directory))
@@ -0,0 +1,141 @@
+from django.conf import settings
+from django.db import transaction
+from .freshness import bump_version, table_versions
+from .models import DetectorTreshold, DetectorsAtHouse, Detector, HouseAlerts, Alerts
+import pandas as pd
+import numpy as np
+import threading
+import time
+
+# Статус и приоритет тревог, созданных при выходе показаний за порог
+HOUSE_ALERT_STATUS = 'warning'
+ALERT_STATUS = 'warning'
+ALERT_PRIORITY = 'medium'
+
+
+class ThresholdIndex:
+    """Пороги DetectorTreshold в памяти процесса: таблица порогов, названия датчиков и дома датчиков.
+
+    В процессе, где изменились пороги, датчики или их дома, индекс сбрасывается сигналом
+    (invalidate). Другие процессы сверяют счётчик TableVersion порогов не чаще раза в recheck
+    секунд, поэтому проверка пакета показаний обычно не делает запросов к БД.
+    """
+
+    def __init__(self, recheck=5.0):
+        self.recheck = recheck
+        self._lock = threading.Lock()
+        self._index = None
+        self._version = None
+        self._checked = 0.0
+        self.reloads = 0
+
+    @staticmethod
+    def _build():
+        thresholds = pd.DataFrame.from_records(
+            DetectorTreshold.objects.values_list('id', 'detector_id', 'kind', 'value', 'name'),
+            columns=['threshold_id', 'detector_id', 'kind', 'limit', 'name'],
+        )
+        thresholds['upper'] = thresholds['kind'] != 'min'
+        detector_ids = thresholds['detector_id'].unique().tolist()
+        detectors = {detector_id: (name, units) for detector_id, name, units in
+                     Detector.objects.filter(id__in=detector_ids).values_list('id', 'name', 'type_id__units')}
+        houses = {}
+        for detector_id, house_id, address in (DetectorsAtHouse.objects.filter(detector_id__in=detector_ids)
+                                               .values_list('detector_id', 'house_id', 'house_id__address').distinct()):
+            houses.setdefault(detector_id, []).append((house_id, address))
+        return {
+            'thresholds': thresholds,
+            'detector_ids': np.asarray(sorted(detector_ids), dtype='int64'),
+            'detectors': detectors,
+            'houses': houses,
+        }
+
+    def current(self):
+        """Индекс порогов; перечитывается, если изменился счётчик TableVersion порогов"""
+        now = time.monotonic()
+        with self._lock:
+            if self._index is not None and now - self._checked < self.recheck:
+                return self._index
+        version = table_versions(DetectorTreshold)[0]
+        with self._lock:
+            if self._index is not None and self._version == version:
+                self._checked = now
+                return self._index
+        index = self._build()
+        with self._lock:
+            self._index, self._version, self._checked = index, version, now
+            self.reloads += 1
+        return index
+
+    def invalidate(self):
+        """Пороги, датчики или их дома изменились: этот процесс перечитает индекс сразу, остальные - по счётчику"""
+        bump_version(DetectorTreshold)
+        with self._lock:
+            self._index = None
+
+    def breaches(self, readings, index=None):
+        """Выходы за пороги в пакете показаний (detector_id, timestamp, value) векторными сравнениями.
+
+        Одна строка на нарушенный порог: число показаний за порогом, первое и последнее
+        время и самое далёкое от порога значение.
+        """
+        index = self.current() if index is None else index
+        readings = readings[np.isin(readings['detector_id'].to_numpy(dtype='int64'), index['detector_ids'])]
+        if readings.empty:
+            return pd.DataFrame()
+        pairs = readings.merge(index['thresholds'], on='detector_id')
+        value, limit, upper = pairs['value'].to_numpy(), pairs['limit'].to_numpy(), pairs['upper'].to_numpy()
+        excess = np.where(upper, value - limit, limit - value)
+        breached = pairs[excess > 0].assign(excess=excess[excess > 0])
+        if breached.empty:
+            return pd.DataFrame()
+        grouped = breached.groupby('threshold_id')
+        worst = breached.loc[grouped['excess'].idxmax()].set_index('threshold_id')
+        return worst.assign(count=grouped.size(), first=grouped['timestamp'].min(), last=grouped['timestamp'].max())
+
+    def check(self, readings):
+        """Тревоги HouseAlerts и Alerts по выходам за пороги пакета показаний readings.
+
+        На каждый нарушенный порог - одна тревога дома на каждый дом датчика (и Alerts к ней);
+        у датчика без дома - только Alerts. Возвращает созданные HouseAlerts и Alerts.
+        """
+        index = self.current()
+        breaches = self.breaches(readings, index)
+        if breaches.empty:
+            return [], []
+        house_alerts = []
+        pending = []
+        for threshold_id, row in breaches.iterrows():
+            detector_name, units = index['detectors'].get(row['detector_id'], (str(row['detector_id']), ''))
+            header = f"{detector_name}: {row['name']}"[:100]
+            description = (f"Значение {row['value']:g} {units} {'выше верхнего' if row['upper'] else 'ниже нижнего'} "
+                           f"порога {row['limit']:g}; показаний за порогом: {row['count']} "
+                           f"({row['first']:%Y-%m-%d %H:%M:%S} - {row['last']:%Y-%m-%d %H:%M:%S})")
+            date_time = row['first'].to_pydatetime()
+            houses = index['houses'].get(row['detector_id']) or [(None, "")]
+            for house_id, address in houses:
+                house_alert = None
+                if house_id is not None:
+                    house_alert = HouseAlerts(house_id=house_id, name=header, date_time=date_time,
+                                              description=description, adress=address, status=HOUSE_ALERT_STATUS)
+                    house_alerts.append(house_alert)
+                pending.append((house_alert, Alerts(header=header, date_time=date_time, description=description,
+                                                    adress=address, status=ALERT_STATUS, priority=ALERT_PRIORITY)))
+        with transaction.atomic():
+            HouseAlerts.objects.bulk_create(house_alerts)
+            for house_alert, alert in pending:
+                if house_alert is not None:
+                    alert.alert_id = house_alert.id
+            alerts = Alerts.objects.bulk_create([alert for _, alert in pending])
+        return house_alerts, alerts
+
+    def stats(self):
+        with self._lock:
+            return {
+                'thresholds': len(self._index['thresholds']) if self._index is not None else None,
+                'version': self._version,
+                'reloads': self.reloads,
+            }
+
+
+threshold_index = ThresholdIndex(recheck=settings.THRESHOLD_INDEX_RECHECK)
@@ -0,0 +1,53 @@
+from .ml import TrainingCancelled
+import tensorflow as tf
+import numpy as np
+import math
+
+# Классы-наследники Keras для обучения: dashboards.ml импортирует этот модуль (и TensorFlow)
+# только при обучении, предсказанию на NumPy TensorFlow не нужен
+
+
+class WindowDataset(tf.keras.utils.PyDataset):
+    """Пакеты окон для fit/evaluate Keras: окна sequence_length строк копируются из
+    матрицы признаков только для текущего пакета"""
+
+    def __init__(self, X_scaled, starts, labels, sequence_length, batch_size=64, shuffle=False, seed=42, **kwargs):
+        super().__init__(**kwargs)
+        self.X_scaled = X_scaled
+        self.starts = starts
+        self.labels = labels
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self._offsets = np.arange(sequence_length)
+        self._order = np.arange(len(starts))
+        self._rng = np.random.default_rng(seed)
+        if shuffle:
+            self._rng.shuffle(self._order)
+
+    @property
+    def shape(self):
+        return (len(self.starts), len(self._offsets), self.X_scaled.shape[1])
+
+    def __len__(self):
+        return math.ceil(len(self.starts) / self.batch_size)
+
+    def __getitem__(self, index):
+        batch = self._order[index * self.batch_size:(index + 1) * self.batch_size]
+        return self.X_scaled[self.starts[batch, None] + self._offsets], self.labels[batch]
+
+    def on_epoch_end(self):
+        # Новый порядок окон в каждой эпохе, как у fit с массивами
+        if self.shuffle:
+            self._rng.shuffle(self._order)
+
+class EpochProgress(tf.keras.callbacks.Callback):
+    """Передаёт номер завершённой эпохи и метрики в report(epoch, logs);
+    если report вернул False, обучение прерывается исключением TrainingCancelled"""
+
+    def __init__(self, report):
+        super().__init__()
+        self.report = report
+
+    def on_epoch_end(self, epoch, logs=None):
+        if self.report(epoch + 1, logs or {}) is False:
+            raise TrainingCancelled("Обучение отменено")
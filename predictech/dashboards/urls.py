@@ -15,6 +15,10 @@ urlpatterns = [
     path('risk-dashboard/', RiskDashboardView.as_view(), name='risk-dashboard'),
     path('situation/', SituationView.as_view(), name='situation'),
     path('train_model/', train_model, name='train_model'),
+    path('train_jobs/', TrainingJobView.as_view(), name='train_jobs'),
+    path('train_jobs/cancel/', TrainingJobCancelView.as_view(), name='train_jobs_cancel'),
+    path('events/', EventsView.as_view(), name='events'),
+    path('metrics', metrics, name='metrics'),
     path('predict/', predict, name='predict'),
     path('house/', HouseView.as_view(), name='house'),
     path('forecast/', forecast, name='forecast'),
@@ -1,4 +1,17 @@
+from django.conf import settings
 from django.contrib import admin
+from django.utils import timezone
+from datetime import timedelta
+
+# Глубина выборки в днях для параметра range
+RANGE_DAYS = {'day': 0, 'week': 7, 'month': 30}
+# То же для таблицы показаний дома (dahdl/); last - последняя строка за сутки
+HOUSE_DATA_RANGE_DAYS = {'day': 1, 'week': 7, 'month': 30, 'last': 1}
+
+
+def hourly_resolution(request):
+    """Запрошены часовые агрегаты вместо исходных показаний: resolution=hour, по умолчанию DETECTOR_DATA_RESOLUTION"""
+    return request.GET.get("resolution", settings.DETECTOR_DATA_RESOLUTION) == "hour"
 
 
 def admin_register(namespace):
@@ -6,4 +19,16 @@ def admin_register(namespace):
         if name.endswith("Admin"):
             model = namespace[name[:-5]]
             try:admin.site.register(model, model_admin)
-            except:raise
\ No newline at end of file
+            except:raise
+
+
+def period_start(days_back, now=None):
+    """Начало суток, отстоящих от now на days_back дней"""
+    now = now or timezone.now()
+    return (now - timedelta(days=days_back)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def period_bounds(days_back, now=None):
+    """Полуоткрытый интервал [начало периода, начало следующих суток) для фильтров по индексу"""
+    now = now or timezone.now()
+    return period_start(days_back, now), period_start(0, now) + timedelta(days=1)
@@ -0,0 +1,71 @@
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count
+from .models import ModelForHouse, SavedModel
+import numpy as np
+import pandas as pd
+import time
+
+
+def preload():
+    """Загрузка в главном процессе сервера до запуска воркеров (gunicorn --preload).
+
+    Импортируются dashboards.ml и, если модели домов считаются в Keras (INFERENCE_ENGINE=keras),
+    TensorFlow; загружается модель прогноза параметров: после fork воркеры делят эти страницы
+    памяти. Среда выполнения TensorFlow не переживает fork (операции в дочернем процессе
+    зависают, если родитель уже создал модель), поэтому модели загружаются в каждом воркере
+    функцией warmup.
+    """
+    started = time.perf_counter()
+    from . import ml  # noqa: F401
+    if settings.INFERENCE_ENGINE == 'keras':
+        import tensorflow  # noqa: F401 - импорт без запуска среды выполнения
+    from .forecasting import forecast_service
+    _, metadata = forecast_service.load()
+    names = metadata['feature_names']
+    forecast_service.predict(pd.DataFrame(np.zeros((1, len(names))), columns=names))
+    # Соединения с БД не должны наследоваться воркерами
+    connections.close_all()
+    print(f"Предзагрузка: {time.perf_counter() - started:.1f} с")
+
+
+def configure_tensorflow(intra_op_threads=None, inter_op_threads=None):
+    """Число потоков TensorFlow в процессе; действует только до первой операции TF. 0 - по умолчанию TF"""
+    import tensorflow as tf
+    intra_op_threads = settings.TF_INTRA_OP_THREADS if intra_op_threads is None else intra_op_threads
+    inter_op_threads = settings.TF_INTER_OP_THREADS if inter_op_threads is None else inter_op_threads
+    tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+
+
+def active_models(limit=None):
+    """Модели, назначенные домам (ModelForHouse), начиная с обслуживающих больше домов"""
+    limit = settings.MODEL_CACHE_MAX_ENTRIES if limit is None else limit
+    return list(SavedModel.objects.annotate(houses=Count('modelforhouse')).filter(houses__gt=0)
+                .order_by('-houses', '-id')[:limit])
+
+
+def warmup(on_model=None):
+    """Загружает активные модели домов в model_cache и выполняет пробный predict каждой.
+
+    Первый predict модели Keras строит и трассирует функцию предсказания (сотни мс);
+    после прогрева первый настоящий запрос эту цену не платит. on_model() вызывается
+    после каждой модели (например, чтобы воркер gunicorn отметился у мастера).
+    """
+    from .model_cache import model_cache
+    started = time.perf_counter()
+    warmed = 0
+    for saved_model in active_models():
+        try:
+            predictor = model_cache.get(saved_model)
+            # Тот же тип и форма входа, что у predict/ (окно признаков float64), иначе функция трассируется заново
+            window = np.zeros((1, predictor.sequence_length, predictor.model.input_shape[-1]))
+            predictor.model.predict(window, verbose=0)
+            warmed += 1
+        except Exception as e:
+            print(f"Прогрев модели {saved_model.id}: {e}")
+        if on_model is not None:
+            on_model()
+    connections.close_all()
+    print(f"Прогрев моделей: {warmed} за {time.perf_counter() - started:.1f} с")
+    return warmed
@@ -0,0 +1,38 @@
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+
+
+def available_cpus():
+    """Ядра, доступные процессу (с учётом taskset/cpuset контейнера)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def init_worker(threads=None):
+    """Инициализация дочернего процесса пула: потоки BLAS и TensorFlow, настройка Django"""
+    if threads:
+        # До первого импорта numpy и до первой операции TensorFlow
+        os.environ['OMP_NUM_THREADS'] = str(threads)
+    import django
+    django.setup()
+    if threads:
+        from .warmup import configure_tensorflow
+        configure_tensorflow(intra_op_threads=threads, inter_op_threads=1)
+
+
+def worker_pool(processes, threads=None):
+    """Пул процессов для обучения моделей.
+
+    Процессы запускаются методом spawn: дочерний процесс не наследует
+    соединения с БД и состояние TensorFlow родителя. threads - потоков
+    TensorFlow на процесс; без ограничения каждый процесс занимает все ядра.
+    """
+    return ProcessPoolExecutor(
+        max_workers=processes,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=init_worker,
+        initargs=(threads,),
+    )
@@ -0,0 +1,57 @@
+"""
+Production-сервер: gunicorn -c gunicorn.conf.py main.wsgi:application
+
+Мастер загружает Django, модель прогноза и, при INFERENCE_ENGINE=keras, TensorFlow/Keras
+(preload_app) и запускает WEB_WORKERS воркеров, которые делят эти страницы памяти
+(copy-on-write). Каждый воркер до приёма запросов загружает модели домов и выполняет
+пробный predict (dashboards.warmup).
+
+Переменные окружения:
+    WEB_BIND             адрес, по умолчанию 0.0.0.0:8105
+    WEB_WORKERS          число воркеров, по умолчанию min(число ядер, 4)
+    WEB_THREADS          потоков на воркер (воркер gthread, если больше 1), по умолчанию 8
+    WEB_TIMEOUT          таймаут запроса, с, по умолчанию 120
+    EVENTS_MAX_STREAMS   потоков /events/ (SSE) на воркер, по умолчанию половина WEB_THREADS;
+                         с WEB_THREADS=1 (воркер sync) канал выключен
+    TF_INTRA_OP_THREADS  потоков TensorFlow на воркер, по умолчанию число ядер / число воркеров
+    TF_INTER_OP_THREADS  по умолчанию 1
+"""
+
+import os
+
+cpu_count = os.cpu_count() or 1
+
+bind = os.getenv('WEB_BIND', '0.0.0.0:8105')
+workers = int(os.getenv('WEB_WORKERS', min(cpu_count, 4)))
+threads = int(os.getenv('WEB_THREADS', 8))
+worker_class = 'gthread' if threads > 1 else 'sync'
+timeout = int(os.getenv('WEB_TIMEOUT', 120))
+preload_app = True
+accesslog = '-'
+
+# Поток /events/ не заканчивается и занимает поток воркера до закрытия страницы: ему отдаётся
+# не больше половины потоков. Воркер sync такой ответ занял бы целиком (и был бы убит по
+# timeout), поэтому с ним канал выключен и страницы опрашивают сервер
+os.environ.setdefault('EVENTS_MAX_STREAMS', str(threads // 2))
+
+# Ядра делятся между воркерами: иначе TensorFlow и BLAS в каждом воркере
+# создают пулы потоков по числу всех ядер. Задаётся до загрузки приложения
+os.environ.setdefault('TF_INTRA_OP_THREADS', str(max(1, cpu_count // workers)))
+os.environ.setdefault('TF_INTER_OP_THREADS', '1')
+os.environ.setdefault('OMP_NUM_THREADS', os.environ['TF_INTRA_OP_THREADS'])
+
+
+def when_ready(server):
+    # Мастер после загрузки приложения, до запуска воркеров
+    from dashboards.warmup import preload
+    preload()
+
+
+def post_fork(server, worker):
+    # Воркер до приёма запросов; notify не даёт мастеру счесть долгий прогрев зависанием
+    from django.conf import settings
+    from dashboards.warmup import configure_tensorflow, warmup
+    # С INFERENCE_ENGINE=numpy веб-воркеры не импортируют TensorFlow
+    if settings.INFERENCE_ENGINE == 'keras':
+        configure_tensorflow()
+    warmup(on_model=worker.notify)
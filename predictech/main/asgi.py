@@ -3,5 +3,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "main.settings")
+# Асинхронные представления и потоковая выдача без занятых потоков (uvicorn main.asgi:application)
+os.environ.setdefault("ROOT_URLCONF", "main.asgi_urls")
 
 application = get_asgi_application()
@@ -0,0 +1,23 @@
+"""
+URL configuration for ASGI (main.asgi).
+
+Same routes as main.urls; dashboards views are replaced with their async
+versions from dashboards.asgi_urls.
+"""
+
+from django.contrib import admin
+from django.urls import path, include
+from auth_users import urls as auth_users
+from dashboards import asgi_urls as dashboards_urls
+from django.conf import settings
+from django.conf.urls.static import static
+from django.contrib.staticfiles.urls import staticfiles_urlpatterns
+
+urlpatterns = [
+    path("", include(dashboards_urls.urlpatterns)),
+    path("admin/", admin.site.urls),
+    path("auth/", include(auth_users.urlpatterns)),
+] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+
+# Статика при DEBUG для серверов, отличных от runserver (gunicorn, uvicorn)
+urlpatterns += staticfiles_urlpatterns()
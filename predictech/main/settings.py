@@ -35,9 +35,12 @@ INSTALLED_APPS = [
     'admin_panel',
     'auth_users',
     'dashboards',
+    # Бенчмарки (manage.py benchmark); приложение не используется при обработке запросов
+    'benchmarks',
 ]
 
 MIDDLEWARE = [
+    "dashboards.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -52,7 +55,8 @@ TEMPLATE_CONTEXT_PROCESSORS = (
     "django.core.context_processors.request",
 )
 
-ROOT_URLCONF = "main.urls"
+# main.asgi задаёт main.asgi_urls: асинхронные версии представлений для ASGI-сервера
+ROOT_URLCONF = os.getenv('ROOT_URLCONF', "main.urls")
 
 SITE_ID = 1
 
@@ -139,5 +143,78 @@ MEDIA_ROOT = BASE_DIR / "media"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Размер порции bulk_create при пакетной записи показаний датчиков
+DETECTOR_DATA_BULK_BATCH_SIZE = int(os.getenv('DETECTOR_DATA_BULK_BATCH_SIZE', 1000))
+
+# Данные по умолчанию для detector_data_log/ и dahdl/ без параметра resolution: raw - исходные показания,
+# hour - часовые агрегаты DetectorDataHourly
+DETECTOR_DATA_RESOLUTION = os.getenv('DETECTOR_DATA_RESOLUTION', 'raw')
+
+# Кэш загруженных моделей прогноза аномалий в памяти процесса
+MODEL_CACHE_MAX_ENTRIES = int(os.getenv('MODEL_CACHE_MAX_ENTRIES', 8))
+MODEL_CACHE_MAX_BYTES = int(os.getenv('MODEL_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
+# Расчёт предсказаний моделей домов, загруженных в кэш: numpy - прямой проход LSTM на NumPy
+# (dashboards.inference), keras - model.predict TensorFlow
+INFERENCE_ENGINE = os.getenv('INFERENCE_ENGINE', 'numpy')
+
+# Процессы, где пороги датчиков не менялись, сверяют счётчик изменений порогов не чаще раза в столько секунд
+THRESHOLD_INDEX_RECHECK = float(os.getenv('THRESHOLD_INDEX_RECHECK', 5))
+
+# Обучение за TRAINING_STREAM_DAYS дней и больше идёт по частям в TRAINING_CHUNK_DAYS дней:
+# признаки пишутся во временные файлы в TRAINING_SPOOL_DIR (по умолчанию системный каталог)
+TRAINING_STREAM_DAYS = int(os.getenv('TRAINING_STREAM_DAYS', 90))
+TRAINING_CHUNK_DAYS = int(os.getenv('TRAINING_CHUNK_DAYS', 30))
+TRAINING_SPOOL_DIR = os.getenv('TRAINING_SPOOL_DIR') or None
+# Задача в работе без отметки воркера дольше стольких секунд считается прерванной
+# (её воркер остановлен) и помечается ошибкой
+TRAINING_JOB_TIMEOUT = float(os.getenv('TRAINING_JOB_TIMEOUT', 120))
+
+# Потоки TensorFlow в процессе (0 - по умолчанию TF, по числу ядер). gunicorn.conf.py
+# делит ядра между воркерами, если значения не заданы
+TF_INTRA_OP_THREADS = int(os.getenv('TF_INTRA_OP_THREADS', 0))
+TF_INTER_OP_THREADS = int(os.getenv('TF_INTER_OP_THREADS', 0))
+
+# Канал событий /events/ (SSE): длина очереди одного клиента и интервал пинга, с.
+# EVENTS_PG_NOTIFY (по умолчанию - если БД PostgreSQL) передаёт события между процессами
+EVENTS_QUEUE_SIZE = int(os.getenv('EVENTS_QUEUE_SIZE', 200))
+EVENTS_HEARTBEAT = int(os.getenv('EVENTS_HEARTBEAT', 15))
+# Не больше стольких потоков /events/ в процессе WSGI (каждый занимает поток сервера), сверх них
+# ответ 204 и страница переходит на опрос; 0 - канал выключен, по умолчанию без ограничения
+EVENTS_MAX_STREAMS = int(os.getenv('EVENTS_MAX_STREAMS') or -1)
+
+# Кэш вычисленных ответов (dahdl/, detector_data_log/ по датчику, risks/).
+# file - общий для процессов на одной машине (воркеры сервера, скоринг), locmem - в памяти процесса
+RESPONSE_CACHE_BACKEND = os.getenv('RESPONSE_CACHE_BACKEND', 'file')
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', 300))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 1000))
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "responses": {
+        "BACKEND": {
+            'locmem': "dashboards.response_cache.LocMemResponseCache",
+            'file': "dashboards.response_cache.FileResponseCache",
+        }[RESPONSE_CACHE_BACKEND],
+        "LOCATION": os.getenv('RESPONSE_CACHE_DIR', str(BASE_DIR / "cache" / "responses")) if RESPONSE_CACHE_BACKEND == 'file' else "responses",
+        "TIMEOUT": RESPONSE_CACHE_TIMEOUT,
+        "OPTIONS": {"MAX_ENTRIES": RESPONSE_CACHE_MAX_ENTRIES},
+    },
+}
+
+# Метрики /metrics: каталог файлов процессов (общий для воркеров сервера и обучения)
+# и интервал их записи, с. При развёртывании каталог можно очищать
+METRICS_DIR = os.getenv('METRICS_DIR', str(BASE_DIR / "cache" / "metrics"))
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 5))
+# Файл метрик процесса другого узла (контейнера с общим каталогом), не обновлявшийся дольше
+# стольких секунд, считается файлом завершившегося процесса и сливается в общий файл
+METRICS_STALE_AFTER = float(os.getenv('METRICS_STALE_AFTER', 3600))
+
+# Потоки для тяжёлых представлений (predict/, forecast/, dahdl/) при асинхронной обработке
+# запросов: ограничивают число одновременных расчётов в процессе
+OFFLOAD_THREADS = int(os.getenv('OFFLOAD_THREADS', 4))
+
 LOGIN_REDIRECT_URL = 'main'
 LOGOUT_REDIRECT_URL = 'main'
\ No newline at end of file
@@ -22,9 +22,13 @@ from auth_users import urls as auth_users
 from dashboards import urls as dashboards_urls
 from django.conf import settings
 from django.conf.urls.static import static
+from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 
 urlpatterns = [
     path("", include(dashboards_urls.urlpatterns)),
     path("admin/", admin.site.urls),
     path("auth/", include(auth_users.urlpatterns)),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+
+# Статика при DEBUG для серверов, отличных от runserver (gunicorn, uvicorn)
+urlpatterns += staticfiles_urlpatterns()
@@ -0,0 +1,62 @@
+// Общий канал событий сервера (SSE): одно соединение на страницу вместо опроса.
+// События приходят в document как CustomEvent 'predictech:<тип>' (house_alert, state_label,
+// detector_data, forecast, training_job); при недоступности канала - 'predictech:offline'.
+const LIVE_EVENTS = {
+    url: 'https://predictech.5d4.ru/events/',
+    types: ['house_alert', 'state_label', 'detector_data', 'forecast', 'training_job'],
+    source: null,
+    connected: false
+};
+
+function liveEventsAvailable() {
+    return typeof EventSource !== 'undefined';
+}
+
+function startLiveEvents() {
+    if (!liveEventsAvailable() || LIVE_EVENTS.source) {
+        if (!liveEventsAvailable()) {
+            document.dispatchEvent(new CustomEvent('predictech:offline'));
+        }
+        return;
+    }
+
+    const source = new EventSource(LIVE_EVENTS.url);
+    LIVE_EVENTS.source = source;
+
+    source.onopen = function() {
+        LIVE_EVENTS.connected = true;
+        document.dispatchEvent(new CustomEvent('predictech:online'));
+    };
+
+    // EventSource переподключается сам; страница на это время переходит на опрос.
+    // Если сервер отказал в канале (ответ 204), соединение закрыто и страница остаётся на опросе
+    source.onerror = function() {
+        const closed = source.readyState === EventSource.CLOSED;
+        if (LIVE_EVENTS.connected || closed) {
+            LIVE_EVENTS.connected = false;
+            document.dispatchEvent(new CustomEvent('predictech:offline'));
+        }
+        if (closed) {
+            LIVE_EVENTS.source = null;
+        }
+    };
+
+    LIVE_EVENTS.types.forEach(type => {
+        source.addEventListener(type, function(e) {
+            let event;
+            try {
+                event = JSON.parse(e.data);
+            } catch (error) {
+                console.log('Некорректное событие:', error.message);
+                return;
+            }
+            document.dispatchEvent(new CustomEvent(`predictech:${type}`, { detail: event }));
+        });
+    });
+}
+
+if (document.readyState === 'loading') {
+    document.addEventListener('DOMContentLoaded', startLiveEvents);
+} else {
+    startLiveEvents();
+}
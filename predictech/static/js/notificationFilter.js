@@ -64,7 +64,11 @@ function initNotificationFilter() {
         }
     });
     
-    setInterval(updateFilterCounts, 2000);
+    // Счётчики пересчитываются при изменении списка уведомлений, а не по таймеру
+    const notifications = document.getElementById('notifications-container');
+    if (notifications) {
+        new MutationObserver(updateFilterCounts).observe(notifications, { childList: true, subtree: true });
+    }
 }
 
 if (document.readyState === 'loading') {
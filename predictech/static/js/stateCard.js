@@ -382,9 +382,39 @@ document.addEventListener('DOMContentLoaded', function() {
     loadAlerts();
 });
 
-// Обновление каждые 5 минут
+// Новые тревоги приходят через канал событий (liveEvents.js); пачка событий
+// вызывает одну перезагрузку. Опрос раз в 5 минут включается, только пока канал недоступен
 
-setInterval(loadAlerts, 5 * 60 * 1000);
+let alertsReloadTimer = null;
+let alertsPollTimer = null;
+
+function scheduleAlertsReload() {
+    clearTimeout(alertsReloadTimer);
+    alertsReloadTimer = setTimeout(loadAlerts, 1000);
+}
+
+function startAlertsPolling() {
+    if (!alertsPollTimer) {
+        alertsPollTimer = setInterval(loadAlerts, 5 * 60 * 1000);
+    }
+}
+
+function stopAlertsPolling() {
+    clearInterval(alertsPollTimer);
+    alertsPollTimer = null;
+}
+
+document.addEventListener('predictech:house_alert', scheduleAlertsReload);
+document.addEventListener('predictech:online', function() {
+    stopAlertsPolling();
+    // События, пропущенные за время разрыва, подтягиваются одной загрузкой
+    scheduleAlertsReload();
+});
+document.addEventListener('predictech:offline', startAlertsPolling);
+
+if (typeof EventSource === 'undefined') {
+    startAlertsPolling();
+}
 
 
 
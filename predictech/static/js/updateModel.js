@@ -1,16 +1,21 @@
 // === Конфигурация ===
 const UPDATE_CONFIG = {
-    jsonUrl: 'https://predictech.5d4.ru/train_model/?house_id=2',
-    startDelay: 5500, // ms перед первым запросом
+    jobsUrl: 'https://predictech.5d4.ru/train_jobs/',
+    houseId: 2,
+    startDelay: 1000, // ms перед первым запросом
     checkInterval: 2000, // ms между проверками
-    maxAttempts: 30,
+    liveCheckInterval: 15000, // ms между проверками, пока прогресс приходит через канал событий
+    maxWait: 900000, // ms; обучение идёт в фоне, поэтому ждём дольше
     preloaderDuration: 20000 
 };
 
 // === Состояние ===
 let checkTimer = null;
 let attempts = 0;
+let checkStartTs = null;
 let modelShown = false;
+let jobId = null;
+let serverProgress = null;
 
 let preloaderActive = false;
 let preloaderRAF = null;
@@ -79,65 +84,119 @@ function handleClick(event, btnElement) {
 
     modelShown = false;
     attempts = 0;
+    jobId = null;
+    serverProgress = null;
 
-    console.log(`[UpdateManager] старт через ${UPDATE_CONFIG.startDelay} ms`);
+    submitJob().then(data => {
+        if (!data || data.status === "Error") {
+            showErrorModal(data);
+            resetButtons();
+            return;
+        }
+        jobId = data.job_id;
+        console.log(`[UpdateManager] задача ${jobId}, проверка через ${UPDATE_CONFIG.startDelay} ms`);
+        setTimeout(() => {
+            document.querySelectorAll('.btn-update').forEach(b => b.textContent = 'Проверка...');
+            startCheck();
+        }, UPDATE_CONFIG.startDelay);
+    }).catch(err => {
+        console.error('[UpdateManager] Ошибка постановки задачи:', err);
+        showErrorModal({ message: 'Ошибка загрузки данных' });
+        resetButtons();
+    });
+}
 
-    setTimeout(() => {
-        document.querySelectorAll('.btn-update').forEach(b => b.textContent = 'Проверка...');
-        startCheck();
-    }, UPDATE_CONFIG.startDelay);
+// === Постановка задачи обучения ===
+async function submitJob() {
+    const body = new URLSearchParams({ house_id: UPDATE_CONFIG.houseId });
+    const res = await fetch(UPDATE_CONFIG.jobsUrl, {
+        method: 'POST',
+        headers: { 'Accept': 'application/json' },
+        body,
+        cache: 'no-store'
+    });
+    return fastParseJSON(await res.text());
 }
 
 // === Запуск проверки ===
 function startCheck() {
     clearInterval(checkTimer);
     attempts = 0;
+    checkStartTs = Date.now();
     checkStatus(); // первый запуск сразу
-    checkTimer = setInterval(checkStatus, UPDATE_CONFIG.checkInterval);
+    scheduleCheck();
+}
+
+// Пока работает канал событий (liveEvents.js), опрос нужен только как страховка
+function scheduleCheck() {
+    clearInterval(checkTimer);
+    const live = typeof LIVE_EVENTS !== 'undefined' && LIVE_EVENTS.connected;
+    checkTimer = setInterval(checkStatus, live ? UPDATE_CONFIG.liveCheckInterval : UPDATE_CONFIG.checkInterval);
 }
 
+function isChecking() {
+    return jobId !== null && checkStartTs !== null && !modelShown && preloaderActive;
+}
+
+document.addEventListener('predictech:training_job', function(e) {
+    const event = e.detail;
+    if (!isChecking() || !event || !event.data || event.data.job_id !== jobId) return;
+    handleJobState(event.data);
+});
+document.addEventListener('predictech:online', function() { if (isChecking()) scheduleCheck(); });
+document.addEventListener('predictech:offline', function() { if (isChecking()) scheduleCheck(); });
+
 // === Запрос к серверу ===
 async function checkStatus() {
     attempts++;
-    console.log(`[UpdateManager] попытка ${attempts}/${UPDATE_CONFIG.maxAttempts}`);
+    console.log(`[UpdateManager] попытка ${attempts}`);
 
     try {
-        const res = await fetch(`${UPDATE_CONFIG.jsonUrl}&t=${Date.now()}`, {
+        const res = await fetch(`${UPDATE_CONFIG.jobsUrl}?job_id=${jobId}&t=${Date.now()}`, {
             headers: { 'Accept': 'application/json' },
             cache: 'no-store'
         });
 
         if (!res.ok) throw new Error(`HTTP ${res.status}`);
         const text = await res.text();
-        const data = fastParseJSON(text);
-
-        if (data && data.status === "Success" && !modelShown) {
-            modelShown = true;
-            clearInterval(checkTimer);
-            updatePageData(data);
-            saveToLocalStorage(data);
-            showSuccessModal(data);
-            resetButtons();
-        } else if (data && data.status === "Error") {
-            clearInterval(checkTimer);
-            showErrorModal(data);
-            resetButtons();
-        } else if (attempts >= UPDATE_CONFIG.maxAttempts) {
-            clearInterval(checkTimer);
-            showTimeoutModal();
-            resetButtons();
-        } else {
-            // пока ждем — ничего
-            console.log('[UpdateManager] ответ: ожидание, модель ещё не готова');
-        }
+        handleJobState(fastParseJSON(text));
     } catch (err) {
         console.error('[UpdateManager] Ошибка запроса:', err);
         clearInterval(checkTimer);
+        checkStartTs = null;
         showErrorModal({ message: 'Ошибка загрузки данных' });
         resetButtons();
     }
 }
 
+// === Обработка состояния задачи (ответ train_jobs или событие training_job) ===
+function handleJobState(data) {
+    if (modelShown || checkStartTs === null) return;
+    if (data && data.status === "Success") {
+        modelShown = true;
+        clearInterval(checkTimer);
+        checkStartTs = null;
+        updatePageData(data);
+        saveToLocalStorage(data);
+        showSuccessModal(data);
+        resetButtons();
+    } else if (data && (data.status === "Error" || data.status === "Cancelled")) {
+        clearInterval(checkTimer);
+        checkStartTs = null;
+        showErrorModal(data);
+        resetButtons();
+    } else if (Date.now() - checkStartTs >= UPDATE_CONFIG.maxWait) {
+        clearInterval(checkTimer);
+        checkStartTs = null;
+        showTimeoutModal();
+        resetButtons();
+    } else {
+        // пока ждем — показываем прогресс задачи
+        if (data && typeof data.progress === 'number') serverProgress = Math.round(data.progress * 100);
+        console.log(`[UpdateManager] ответ: ${data && data.stage || 'в очереди'}, ${serverProgress || 0}%`);
+    }
+}
+
 // === Парсер JSON с защитой от "грязного" ответа ===
 function fastParseJSON(text) {
     try {
@@ -280,7 +339,10 @@ function createPreloader() {
     function step(ts) {
         if (!preloaderStartTs) preloaderStartTs = ts;
         const elapsed = ts - preloaderStartTs;
-        const progress = Math.min(1, elapsed / UPDATE_CONFIG.preloaderDuration);
+        // Пока сервер не сообщил прогресс задачи, анимация идёт по времени (не выше 99%)
+        const progress = serverProgress !== null
+            ? Math.min(0.99, serverProgress / 100)
+            : Math.min(0.99, elapsed / UPDATE_CONFIG.preloaderDuration);
         preloaderPercent = Math.floor(progress * 100);
         updatePreloaderPercent(preloaderPercent);
         if (progress < 1 && preloaderActive) {